@@ -0,0 +1,118 @@
+"""
+Cold-start benchmark for the gtfs_pipeline CLI.
+
+Every sample runs in a fresh interpreter, mirroring what cron pays each time it
+launches ``ingest --feed-type realtime --once``. Reports the median wall time
+per scenario, the slowest imports from ``-X importtime`` and whether heavy
+modules (pandas, numpy, pyarrow) leaked into the real-time code path.
+
+Usage:
+    python benchmarks/import_time.py [--runs 10] [--max-ms 400]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow"]
+
+# Scenario name -> code executed in a fresh interpreter.
+SCENARIOS: Dict[str, str] = {
+    # What `ingest --feed-type realtime --once` imports and builds before its first request.
+    "ingest-realtime-once": (
+        "import sys, tempfile\n"
+        "from gtfs_pipeline import cli\n"
+        "from gtfs_pipeline.config import GTFSConfig\n"
+        "from gtfs_pipeline.database import DatabaseManager\n"
+        "from gtfs_pipeline.gtfs_ingest import GTFSIngest\n"
+        "config = GTFSConfig()\n"
+        "config.data_directory = tempfile.mkdtemp()\n"
+        "ingest = GTFSIngest(config, DatabaseManager(config.database, data_directory=config.data_directory))\n"
+        "assert 'pandas' not in sys.modules and 'pyarrow' not in sys.modules, 'GTFSIngest loaded pandas/pyarrow'\n"
+        # One trip_updates poll through the post-parse steps; no static version is registered yet.
+        "import asyncio\n"
+        "parsed = {'trip_updates': [], 'stop_time_updates': [], 'timestamp': 0}\n"
+        "asyncio.run(ingest.prepare_parsed(parsed, 'trip_updates', 'https://example.invalid/tu', 'bench'))\n"
+        "assert 'pandas' not in sys.modules and 'pyarrow' not in sys.modules, 'prepare_parsed loaded pandas/pyarrow'\n"
+    ),
+    "list-feeds": (
+        "from gtfs_pipeline import cli\n"
+        "cli.cli(['list-feeds'], standalone_mode=False)\n"
+    ),
+}
+
+
+def _run(code: str, extra_args: List[str]) -> Tuple[float, str]:
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return (time.perf_counter() - started) * 1000, result.stderr
+
+
+def _slowest_imports(importtime_log: str, top: int) -> List[Tuple[int, str]]:
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative.strip()), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per scenario")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports (cumulative) to list")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if the ingest-realtime-once median exceeds this many ms")
+    args = parser.parse_args()
+
+    exit_code = 0
+    for name, code in SCENARIOS.items():
+        samples = [_run(code, [])[0] for _ in range(args.runs)]
+        median = statistics.median(samples)
+        print(f"{name}: median {median:.1f} ms (min {min(samples):.1f}, max {max(samples):.1f}, n={args.runs})")
+
+        _, log = _run(code, ["-X", "importtime"])
+        for cumulative_us, module in _slowest_imports(log, args.top):
+            print(f"    {cumulative_us / 1000:8.1f} ms  {module}")
+
+        probe = code + "import sys\nprint('HEAVY:' + ','.join(m for m in %r if m in sys.modules))\n" % HEAVY_MODULES
+        output = subprocess.run(
+            [sys.executable, "-c", probe],
+            env=dict(os.environ, PYTHONPATH=str(SRC_DIR)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        leaked = next(
+            (line[len("HEAVY:"):] for line in output.splitlines() if line.startswith("HEAVY:")), ""
+        )
+        print(f"    heavy modules loaded: {leaked or 'none'}")
+
+        if name == "ingest-realtime-once":
+            if leaked:
+                exit_code = 1
+            if args.max_ms is not None and median > args.max_ms:
+                print(f"    FAIL: median {median:.1f} ms exceeds --max-ms {args.max_ms:.1f}")
+                exit_code = 1
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+GTFS-RT decode throughput: dict parsers versus the columnar decoder.
+
+Replays recorded protobuf snapshots (``data/raw/gtfs_rt_<feed_type>_*.pb`` as
+written with ``GTFS_RT_SAVE_PROTO=true``) through
+
+  * dict:         ``GTFSIngest.parse_gtfs_rt_data`` (one dict per entity)
+  * dict+json:    the dict path plus ``json.dumps`` as done for JSON storage
+  * dict+arrow:   the dict path plus conversion to the Parquet sink's table
+  * columnar:     ``columnar_decoder.decode_feed`` plus the sink's table
+
+and reports entities/second for each. Both Arrow paths are checked to produce
+identical tables. Without recordings, synthetic feeds are generated instead.
+
+Usage:
+    python benchmarks/rt_decode.py [--raw-dir data/raw] [--repeat 5] [--synthetic 2000]
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from google.transit import gtfs_realtime_pb2  # noqa: E402
+
+from gtfs_pipeline.columnar_decoder import decode_feed  # noqa: E402
+from gtfs_pipeline.config import GTFSConfig  # noqa: E402
+from gtfs_pipeline.gtfs_ingest import GTFSIngest  # noqa: E402
+from gtfs_pipeline.parquet_sink import RT_SCHEMAS, ParquetRTSink  # noqa: E402
+
+FEED_TYPES = ["trip_updates", "vehicle_positions"]
+_RAW_NAME = re.compile(r"^gtfs_rt_(trip_updates|vehicle_positions)_")
+_FETCHED_AT = datetime(2025, 11, 1, 12, 0, 0)
+
+
+def _recorded(raw_dir: Path) -> Dict[str, List[bytes]]:
+    payloads: Dict[str, List[bytes]] = {feed_type: [] for feed_type in FEED_TYPES}
+    for path in sorted(raw_dir.glob("gtfs_rt_*.pb")):
+        match = _RAW_NAME.match(path.name)
+        if match:
+            payloads[match.group(1)].append(path.read_bytes())
+    return payloads
+
+
+def _synthetic(entities: int, stops_per_trip: int = 20) -> Dict[str, List[bytes]]:
+    now = int(time.time())
+    vehicles = gtfs_realtime_pb2.FeedMessage()
+    trips = gtfs_realtime_pb2.FeedMessage()
+    for feed in (vehicles, trips):
+        feed.header.gtfs_realtime_version = "2.0"
+        feed.header.timestamp = now
+    for i in range(entities):
+        vehicle = vehicles.entity.add(id=str(i)).vehicle
+        vehicle.vehicle.id = f"veh{i}"
+        vehicle.trip.trip_id = f"trip{i}"
+        vehicle.trip.route_id = f"route{i % 40}"
+        vehicle.trip.start_date = "20251101"
+        vehicle.current_stop_sequence = i % 30
+        vehicle.timestamp = now - i % 60
+        vehicle.position.latitude = 36.7 + i * 1e-5
+        vehicle.position.longitude = 137.2 + i * 1e-5
+        vehicle.position.speed = 8.5
+
+        update = trips.entity.add(id=str(i)).trip_update
+        update.trip.trip_id = f"trip{i}"
+        update.trip.route_id = f"route{i % 40}"
+        update.trip.start_date = "20251101"
+        update.timestamp = now
+        for sequence in range(1, stops_per_trip + 1):
+            stop_time_update = update.stop_time_update.add(stop_sequence=sequence, stop_id=f"stop{sequence}")
+            stop_time_update.arrival.delay = 30 * (i % 5)
+            stop_time_update.arrival.time = now + 90 * sequence
+    return {
+        "trip_updates": [trips.SerializeToString()],
+        "vehicle_positions": [vehicles.SerializeToString()],
+    }
+
+
+def _entity_count(payloads: List[bytes]) -> int:
+    total = 0
+    for payload in payloads:
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(payload)
+        total += len(feed.entity)
+    return total
+
+
+def _arrow_tables(snapshot: Dict) -> Dict[str, object]:
+    tables = {}
+    for dataset, schema in RT_SCHEMAS.items():
+        records = snapshot.get(dataset)
+        if records is None:
+            continue
+        if isinstance(records, dict):
+            tables[dataset] = ParquetRTSink._columns_to_table(records, schema, _FETCHED_AT, snapshot["timestamp"])
+        elif isinstance(records, list):
+            tables[dataset] = ParquetRTSink._to_table(records, schema, _FETCHED_AT, snapshot["timestamp"])
+        else:
+            tables[dataset] = ParquetRTSink._batch_to_table(records, schema, _FETCHED_AT, snapshot["timestamp"])
+    return tables
+
+
+def _time(func: Callable[[bytes], object], payloads: List[bytes], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for payload in payloads:
+            func(payload)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--raw-dir", type=Path, default=Path("data/raw"), help="directory with recorded .pb files")
+    parser.add_argument("--repeat", type=int, default=5, help="passes per variant (best is reported)")
+    parser.add_argument("--synthetic", type=int, default=2000,
+                        help="entities per synthetic feed when no recordings are found")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    ingest = GTFSIngest(GTFSConfig(data_directory="/tmp/gtfs_rt_decode_bench"), db_manager=None)
+
+    payloads = _recorded(args.raw_dir) if args.raw_dir.is_dir() else {}
+    source = f"recordings in {args.raw_dir}"
+    if not any(payloads.values()):
+        payloads = _synthetic(args.synthetic)
+        source = f"synthetic feeds ({args.synthetic} entities each)"
+    print(f"Source: {source}")
+
+    exit_code = 0
+    for feed_type in FEED_TYPES:
+        feed_payloads = payloads.get(feed_type) or []
+        if not feed_payloads:
+            continue
+        entities = _entity_count(feed_payloads)
+
+        variants: List[Tuple[str, Callable[[bytes], object]]] = [
+            ("dict", lambda p: ingest.parse_gtfs_rt_data(p, feed_type)),
+            ("dict+json", lambda p: json.dumps(ingest.parse_gtfs_rt_data(p, feed_type), default=str)),
+            ("dict+arrow", lambda p: _arrow_tables(ingest.parse_gtfs_rt_data(p, feed_type))),
+            ("columnar", lambda p: _arrow_tables(decode_feed(p, feed_type))),
+        ]
+        print(f"{feed_type}: {len(feed_payloads)} snapshots, {entities} entities")
+        baseline = None
+        for name, func in variants:
+            elapsed = _time(func, feed_payloads, args.repeat)
+            rate = entities / elapsed if elapsed else float("inf")
+            baseline = baseline or rate
+            print(f"    {name:<11} {rate:>12,.0f} entities/s  ({rate / baseline:4.1f}x)")
+
+        for payload in feed_payloads:
+            expected = _arrow_tables(ingest.parse_gtfs_rt_data(payload, feed_type))
+            actual = _arrow_tables(decode_feed(payload, feed_type))
+            if any(not actual[dataset].equals(table) for dataset, table in expected.items()):
+                print("    MISMATCH: columnar tables differ from the dict path")
+                exit_code = 1
+                break
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
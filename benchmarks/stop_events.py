@@ -0,0 +1,163 @@
+"""
+Stop event extraction throughput: vectorised engine versus a per-vehicle loop.
+
+Generates a month of synthetic vehicle positions (trams shuttling along one
+line, polled every ``--poll`` seconds with jittered entity timestamps), runs
+
+  * vectorised:  ``stop_events.extract_stop_events`` over the whole month
+  * loop:        a straightforward per-group Python loop over the same rows
+                 (on the first ``--check-days`` days only; it is slow)
+
+and reports positions/second for each. Both are checked to produce the same
+events, and the median dwell and run times are compared with the simulated
+ones.
+
+Usage:
+    python benchmarks/stop_events.py [--days 30] [--vehicles 20] [--poll 20] [--check-days 1]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from gtfs_pipeline.stop_events import STOPPED_AT, extract_stop_events  # noqa: E402
+
+STOPS = 25
+DWELL = 25
+RUN = 90
+LAYOVER = 300
+SERVICE_START, SERVICE_END = 6 * 3600, 23 * 3600
+_FIRST_DAY = datetime(2025, 11, 1, tzinfo=timezone.utc)
+
+
+def _synthetic(days: int, vehicles: int, poll: int, seed: int = 1) -> pa.Table:
+    rng = np.random.default_rng(seed)
+    cycle = STOPS * DWELL + (STOPS - 1) * RUN + LAYOVER
+    polls = np.arange(SERVICE_START, SERVICE_END, poll)
+    day = np.repeat(np.arange(days), vehicles * len(polls))
+    vehicle = np.tile(np.repeat(np.arange(vehicles), len(polls)), days)
+    second = np.tile(polls, days * vehicles)
+
+    elapsed = second - SERVICE_START + vehicle * (cycle // vehicles)
+    trip, phase = elapsed // cycle, elapsed % cycle
+    segment = np.minimum(phase // (DWELL + RUN), STOPS - 1)
+    at_stop = (phase % (DWELL + RUN) < DWELL) | (segment == STOPS - 1)
+    sequence = np.where(at_stop, segment + 1, segment + 2)
+    status = np.where(at_stop, STOPPED_AT, 2)
+
+    epoch = _FIRST_DAY.timestamp() + day * 86400 + second + rng.integers(0, 4, len(second))
+    dates = np.array([(_FIRST_DAY + timedelta(days=int(d))).strftime("%Y%m%d") for d in range(days)], dtype=object)
+    vehicle_ids = np.array([f"veh{v}" for v in range(vehicles)], dtype=object)
+    return pa.table({
+        "vehicle_id": pa.array(vehicle_ids[vehicle], pa.string()),
+        "trip_id": pa.array(pd.Series(vehicle).astype(str).str.cat(pd.Series(trip).astype(str), sep="_"), pa.string()),
+        "start_date": pa.array(dates[day], pa.string()),
+        "current_stop_sequence": pa.array(sequence, pa.int32()),
+        "current_status": pa.array(status, pa.int8()),
+        "timestamp": pa.array(epoch.astype(np.int64), pa.int64()).cast(pa.timestamp("s", tz="UTC")),
+    })
+
+
+def _loop(table: pa.Table) -> pd.DataFrame:
+    """Reference implementation: walk each vehicle's observations in time order."""
+    frame = table.to_pandas()
+    frame["t"] = (frame["timestamp"] - pd.Timestamp(0, tz="UTC")).dt.total_seconds()
+    records: List[Dict] = []
+    for (vehicle_id, trip_id, start_date), obs in frame.groupby(["vehicle_id", "trip_id", "start_date"], sort=True):
+        obs = obs.sort_values("t", kind="stable").drop_duplicates("t", keep="last")
+        times = obs["t"].tolist()
+        sequences = obs["current_stop_sequence"].tolist()
+        stopped = (obs["current_status"] == STOPPED_AT).tolist()
+        stops = sorted(set(sequences))
+        rank = {s: i for i, s in enumerate(stops)}
+        events = {s: {"arrival": np.nan, "departure": np.nan, "stopped": False} for s in stops}
+        reached = departed = -2
+        for k, (t, s, st) in enumerate(zip(times, sequences, stopped)):
+            now_reached = max(reached, rank[s] if st else rank[s] - 1)
+            now_departed = max(departed, rank[s] - 1)
+            if st:
+                events[s]["stopped"] = True
+            if k:
+                for r in range(max(reached, -1) + 1, now_reached + 1):
+                    events[stops[r]]["arrival"] = (times[k - 1] + t) / 2
+                for r in range(max(departed, -1) + 1, now_departed + 1):
+                    events[stops[r]]["departure"] = (times[k - 1] + t) / 2
+            reached, departed = now_reached, now_departed
+        for i, s in enumerate(stops):
+            event = events[s]
+            following = events[stops[i + 1]] if i + 1 < len(stops) else None
+            records.append({
+                "vehicle_id": vehicle_id, "trip_id": trip_id, "start_date": start_date, "stop_sequence": s,
+                "arrival": event["arrival"], "departure": event["departure"],
+                "dwell_time": event["departure"] - event["arrival"] if event["stopped"] else np.nan,
+                "run_time": following["arrival"] - event["departure"] if following else np.nan,
+            })
+    return pd.DataFrame(records)
+
+
+def _seconds(values: pd.Series) -> np.ndarray:
+    return (values - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy()
+
+
+def _same(vectorised: pd.DataFrame, loop: pd.DataFrame) -> bool:
+    if len(vectorised) != len(loop):
+        return False
+    pairs = [
+        (_seconds(vectorised["arrival_time"]), loop["arrival"].to_numpy()),
+        (_seconds(vectorised["departure_time"]), loop["departure"].to_numpy()),
+        (vectorised["dwell_time"].to_numpy(), loop["dwell_time"].to_numpy()),
+        (vectorised["run_time"].to_numpy(), loop["run_time"].to_numpy()),
+    ]
+    keys_equal = (vectorised["stop_sequence"].to_numpy() == loop["stop_sequence"].to_numpy()).all()
+    return bool(keys_equal) and all(np.allclose(a, b, equal_nan=True) for a, b in pairs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30, help="days of synthetic positions")
+    parser.add_argument("--vehicles", type=int, default=20, help="vehicles in service")
+    parser.add_argument("--poll", type=int, default=20, help="seconds between polls")
+    parser.add_argument("--check-days", type=int, default=1, help="days also run through the reference loop")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    table = _synthetic(args.days, args.vehicles, args.poll)
+    print(f"Source: synthetic, {args.days} days x {args.vehicles} vehicles every {args.poll}s "
+          f"({table.num_rows:,} positions)")
+
+    started = time.perf_counter()
+    events = extract_stop_events(table)
+    elapsed = time.perf_counter() - started
+    print(f"    vectorised {table.num_rows / elapsed:>12,.0f} positions/s  "
+          f"({elapsed:.2f}s, {len(events):,} stop events)")
+    print(f"    median dwell {np.nanmedian(events['dwell_time']):.0f}s (simulated {DWELL}s), "
+          f"median run {np.nanmedian(events['run_time']):.0f}s (simulated {RUN}s)")
+
+    check_until = (_FIRST_DAY + timedelta(days=args.check_days)).strftime("%Y%m%d")
+    check = table.filter(pc.less(table.column("start_date"), check_until))
+    started = time.perf_counter()
+    expected = _loop(check)
+    loop_elapsed = time.perf_counter() - started
+    loop_rate = check.num_rows / loop_elapsed
+    print(f"    loop       {loop_rate:>12,.0f} positions/s  "
+          f"({loop_elapsed:.2f}s for {args.check_days} day(s); {table.num_rows / elapsed / loop_rate:.0f}x slower)")
+
+    if not _same(extract_stop_events(check), expected):
+        print("    MISMATCH: vectorised events differ from the reference loop")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,6 @@
 #!/bin/bash
 # One-off GTFS static ingestion helper.
-# Ensures only a single snapshot exists by clearing prior gtfs_static_*.json files.
+# Optionally clears prior static versions (data/silver/static/<feed>/<version>/) first.
 # NOTE: Do not use chmod 777 or 666.
 # Use proper ownership (chown) and safe permissions instead (chmod 755).
 
@@ -8,8 +8,8 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_DIR="$(dirname "$SCRIPT_DIR")"
-DATA_DIR="${DATA_DIR:-$PROJECT_DIR/data/raw}"
-CONTAINER_DATA_DIR="${CONTAINER_DATA_DIR:-/app/data/raw}"
+DATA_DIR="${DATA_DIR:-$PROJECT_DIR/data/silver/static}"
+CONTAINER_DATA_DIR="${CONTAINER_DATA_DIR:-/app/data/silver/static}"
 COMPOSE_FILE="${COMPOSE_FILE:-docker/docker-compose.yml}"
 CONTAINER_RUNTIME="${CONTAINER_RUNTIME:-docker}"
 COMPOSE_CMD_ENV="${COMPOSE_CMD:-}"
@@ -83,14 +83,14 @@ remove_via_container() {
             --user 0:0 \
             -v "${PROJECT_DIR}/data:/app/data${PODMAN_VOLUME_SUFFIX}" \
             "$INGEST_STATIC_IMAGE" \
-            sh -c "set -e; rm -f ${CONTAINER_DATA_DIR}/gtfs_static_*.json"; then
+            sh -c "set -e; rm -rf ${CONTAINER_DATA_DIR}/*/*"; then
             log "WARNING: Podman-based cleanup failed. Manual removal may be required."
         fi
     else
         if ! (
             cd "$PROJECT_DIR"
             "${COMPOSE_CMD_ARR[@]}" -f "$COMPOSE_FILE" run --rm --user 0:0 \
-                --entrypoint sh gtfs-ingest-static -c "set -e; rm -f ${CONTAINER_DATA_DIR}/gtfs_static_*.json"
+                --entrypoint sh gtfs-ingest-static -c "set -e; rm -rf ${CONTAINER_DATA_DIR}/*/*"
         ); then
             log "WARNING: Container-based cleanup failed. Manual removal may be required."
         fi
@@ -104,7 +104,7 @@ cleanup_snapshots() {
     fi
 
     mkdir -p "$DATA_DIR"
-    mapfile -t existing < <(find "$DATA_DIR" -maxdepth 1 -type f -name "gtfs_static_*.json" -printf "%p\n" 2>/dev/null || true)
+    mapfile -t existing < <(find "$DATA_DIR" -mindepth 2 -maxdepth 2 -type d -printf "%p\n" 2>/dev/null || true)
 
     if ((${#existing[@]} == 0)); then
         log "No prior GTFS static snapshots found."
@@ -114,7 +114,7 @@ cleanup_snapshots() {
     log "Removing existing GTFS static snapshots (host-side attempt)..."
     stubborn=()
     for file in "${existing[@]}"; do
-        if rm -f -- "$file"; then
+        if rm -rf -- "$file"; then
             log "  - deleted: $file"
         else
             log "  - unable to delete: $file"
@@ -128,7 +128,7 @@ cleanup_snapshots() {
 }
 
 snapshot_list() {
-    find "$DATA_DIR" -maxdepth 1 -type f -name "gtfs_static_*.json" -printf "%p\n" 2>/dev/null | sort
+    find "$DATA_DIR" -mindepth 3 -maxdepth 3 -type f -name "manifest.json" -printf "%p\n" 2>/dev/null | sort
 }
 
 ingest_static() {
@@ -171,8 +171,9 @@ verify_result() {
     done
 
     if ((${#new_snapshots[@]} == 0)); then
-        log "WARNING: No new GTFS static snapshots detected (files may have been overwritten)."
-        return 1
+        # The static registry skips bundles whose content has not changed.
+        log "No new GTFS static version: feeds unchanged, existing versions reused."
+        return 0
     fi
 
     if ((${#new_snapshots[@]} == 1)); then
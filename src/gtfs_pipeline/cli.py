@@ -2,16 +2,16 @@
 Command Line Interface for GTFS-RT pipeline.
 """
 
-import asyncio
+import os
+import signal
 import sys
+import time
 from pathlib import Path
 from typing import Optional
 
 import click
 
 from .config import GTFSConfig
-from .database import DatabaseManager
-from .gtfs_ingest import GTFSIngest
 from .utils import setup_logging
 
 
@@ -35,33 +35,73 @@ def cli(ctx, config: Optional[str], log_level: str):
 @click.option('--feed-type', type=click.Choice(['trip_updates', 'vehicle_positions', 'realtime', 'gtfs_static', 'all']),
               default='all', help='Type of feed to ingest')
 @click.option('--once', is_flag=True, help='Run ingestion once instead of continuously')
-@click.option('--interval', type=int, default=60, help='Interval in seconds for continuous ingestion')
+@click.option('--interval', type=int, default=60,
+              help='Interval in seconds for continuous ingestion (with --once: the cron period)')
+@click.option('--daemon', is_flag=True,
+              help='Run as a long-lived real-time ingestion daemon (wall-clock aligned, SIGTERM drains)')
+@click.option('--align/--no-align', default=True,
+              help='Align daemon cycles to wall-clock multiples of --interval')
 @click.pass_context
-def ingest(ctx, feed_type: str, once: bool, interval: int):
+def ingest(ctx, feed_type: str, once: bool, interval: int, daemon: bool, align: bool):
     """Ingest GTFS-RT data from configured feeds."""
     config = ctx.obj['config']
+
+    if daemon and (once or feed_type in ['gtfs_static', 'all']):
+        click.echo(
+            "--daemon runs continuous real-time ingestion; use --feed-type realtime, "
+            "trip_updates or vehicle_positions without --once.",
+            err=True,
+        )
+        sys.exit(2)
     
+    # Heavy modules (asyncio, aiohttp, protobuf bindings) load only for commands that ingest.
+    import asyncio
+
+    from .database import DatabaseManager
+    from .gtfs_ingest import GTFSIngest
+
     async def run_ingestion():
-        db_manager = DatabaseManager(config.database)
+        db_manager = DatabaseManager(config.database, data_directory=config.data_directory)
         try:
             await db_manager.initialize()
             
             # Create ingestion instance
             async with GTFSIngest(config, db_manager) as ingest_instance:
-                if once:
-                    # Run once
+                if not once:
+                    # Finish the in-flight cycle, flush the write-behind buffer and exit cleanly
+                    # on SIGTERM/SIGINT in every continuous mode.
+                    loop = asyncio.get_running_loop()
+                    for sig in (signal.SIGTERM, signal.SIGINT):
+                        loop.add_signal_handler(sig, ingest_instance.request_stop)
+                if daemon:
+                    feed_types = None if feed_type == 'realtime' else [feed_type]
+                    click.echo(
+                        f"Starting real-time ingestion daemon for {feed_type} "
+                        f"with {interval}s intervals (pid {os.getpid()})..."
+                    )
+                    await ingest_instance.continuous_realtime_ingestion(
+                        interval=interval,
+                        feed_types=feed_types,
+                        align_to_wall_clock=align,
+                    )
+                    click.echo("Real-time ingestion daemon stopped")
+                elif once:
+                    # A cron run must not retry into the next launch; leave a fifth of the period for storage.
+                    deadline = time.monotonic() + 0.8 * interval
                     if feed_type == 'gtfs_static':
                         results = await ingest_instance.ingest_gtfs_static()
                         successful = sum(1 for success in results.values() if success)
                         total = len(results)
                         click.echo(f"GTFS Static ingestion completed: {successful}/{total} feeds successful")
                     elif feed_type in ['trip_updates', 'vehicle_positions']:
-                        results = await ingest_instance.ingest_realtime_feeds(feed_types=[feed_type])
+                        results = await ingest_instance.ingest_realtime_feeds(
+                            feed_types=[feed_type], deadline=deadline
+                        )
                         successful = sum(1 for success in results.values() if success)
                         total = len(results)
                         click.echo(f"{feed_type} ingestion completed: {successful}/{total} feeds successful")
                     elif feed_type == 'realtime':
-                        results = await ingest_instance.ingest_realtime_feeds()
+                        results = await ingest_instance.ingest_realtime_feeds(deadline=deadline)
                         successful = sum(1 for success in results.values() if success)
                         total = len(results)
                         click.echo(f"Real-time ingestion completed: {successful}/{total} feeds successful")
@@ -108,6 +148,108 @@ def ingest(ctx, feed_type: str, once: bool, interval: int):
     asyncio.run(run_ingestion())
 
 
+@cli.command()
+@click.argument('sources', nargs=-1, type=click.Path(exists=True, path_type=Path))
+@click.option('--feed-type', type=click.Choice(['trip_updates', 'vehicle_positions', 'realtime']),
+              default='realtime', help='Type of feed to replay')
+@click.option('--feed-name', 'feed_names', multiple=True, help='Only replay these feed names (repeatable)')
+@click.option('--since', help='First poll to replay (YYYYMMDD or YYYYMMDD_HHMMSS, inclusive)')
+@click.option('--until', help='Last poll to replay (YYYYMMDD or YYYYMMDD_HHMMSS, inclusive)')
+@click.option('--workers', type=int, default=None,
+              help='Decode processes (default: one per CPU, 0: decode in a thread)')
+@click.option('--speed', type=float, default=0.0,
+              help='Replay speed relative to archive time (0 = as fast as possible)')
+@click.pass_context
+def replay(ctx, sources, feed_type: str, feed_names, since: Optional[str], until: Optional[str],
+           workers: Optional[int], speed: float):
+    """Re-ingest archived GTFS-RT .pb snapshots (default source: <data>/raw)."""
+    config = ctx.obj['config']
+
+    import asyncio
+
+    from .database import DatabaseManager
+    from .replay import ReplayEngine, discover_snapshots
+
+    feed_types = None if feed_type == 'realtime' else [feed_type]
+    snapshots = discover_snapshots(
+        sources or [Path(config.data_directory) / "raw"],
+        feed_types=feed_types,
+        feed_names=feed_names or None,
+        since=since,
+        until=until,
+    )
+    if not snapshots:
+        click.echo("No archived GTFS-RT snapshots found", err=True)
+        sys.exit(1)
+    click.echo(
+        f"Replaying {len(snapshots)} snapshots "
+        f"({snapshots[0].timestamp} .. {snapshots[-1].timestamp})..."
+    )
+
+    async def run_replay():
+        db_manager = DatabaseManager(config.database, data_directory=config.data_directory)
+        try:
+            await db_manager.initialize()
+            engine = ReplayEngine(config, db_manager, workers=workers, speed=speed)
+            return await engine.replay(snapshots)
+        finally:
+            await db_manager.close()
+
+    try:
+        stats = asyncio.run(run_replay())
+    except KeyboardInterrupt:
+        click.echo("\nReplay stopped by user")
+        sys.exit(1)
+    except Exception as e:
+        click.echo(f"Error during replay: {e}", err=True)
+        sys.exit(1)
+    click.echo(stats.report())
+    if stats.failed:
+        sys.exit(1)
+
+
+@cli.command()
+@click.option('--dry-run', is_flag=True, help='Report what would be compacted and deleted without changing files')
+@click.pass_context
+def compact(ctx, dry_run: bool):
+    """Compact closed days of raw data and delete data past its retention period."""
+    config = ctx.obj['config']
+
+    from .retention import RetentionJob
+
+    click.echo(
+        f"Compacting {config.data_directory} (raw retention {config.raw_data_retention_days} days, "
+        f"processed retention {config.processed_data_retention_days} days)..."
+    )
+    try:
+        report = RetentionJob(config, dry_run=dry_run).run()
+    except Exception as e:
+        click.echo(f"Error during compaction: {e}", err=True)
+        sys.exit(1)
+    click.echo(report.report())
+
+
+@cli.command()
+@click.option('--full', is_flag=True, help='Discard the silver datasets and rebuild them from all bronze files')
+@click.pass_context
+def build_silver(ctx, full: bool):
+    """Build the silver layer from bronze files not processed yet."""
+    config = ctx.obj['config']
+
+    from .silver import SilverBuilder
+
+    builder = SilverBuilder(config)
+    if full:
+        click.echo("Discarding silver datasets for a full rebuild...")
+        builder.reset()
+    try:
+        report = builder.run()
+    except Exception as e:
+        click.echo(f"Error building silver layer: {e}", err=True)
+        sys.exit(1)
+    click.echo(report.report())
+
+
 @cli.command()
 @click.pass_context
 def list_feeds(ctx):
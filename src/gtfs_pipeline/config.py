@@ -4,6 +4,7 @@ Configuration module for GTFS-RT pipeline.
 
 import json
 import os
+import warnings
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict, List, Optional
@@ -44,10 +45,18 @@ class GTFSConfig:
     })
     
     # Request settings
-    request_delay: float = 20.0  # seconds between requests
+    request_delay: Optional[float] = None  # deprecated and ignored; use per_host_request_spacing
     timeout: int = 30  # seconds
     max_retries: int = 3
-    retry_delay: float = 5.0  # seconds
+    retry_delay: float = 5.0  # seconds (base of the exponential backoff)
+    retry_max_delay: float = 60.0  # seconds
+    retry_budget_per_cycle: int = 6  # retries shared by all feeds of one real-time cycle
+    
+    # Connection pool and fetch scheduling
+    max_concurrent_requests_per_host: int = 4
+    per_host_request_spacing: float = 0.0  # minimum seconds between request starts to one host
+    keepalive_timeout: float = 75.0  # seconds an idle pooled connection is kept
+    dns_cache_ttl: int = 300  # seconds
     
     # Data storage settings
     data_directory: str = "/app/data"
@@ -65,9 +74,28 @@ class GTFSConfig:
     
     # Processing settings
     batch_size: int = 1000
+    static_stop_times_chunksize: Optional[int] = 200_000  # rows per stop_times chunk (None = single read)
     max_concurrent_requests: int = 5
+    parse_executor: str = "thread"  # where feed decoding runs: "thread", "process" or "inline"
+    parse_workers: Optional[int] = None  # pool size (None = executor default)
+    write_behind: bool = True  # buffer parsed snapshots and store them in batches
+    write_buffer_max_batch: int = 500  # snapshots per storage flush
+    write_buffer_max_age: float = 60.0  # seconds the oldest buffered snapshot may wait
+    write_buffer_max_pending: int = 2000  # buffered snapshots at which ingestion waits for storage
+    schedule_delays: bool = True  # fill missing stop time delays from predicted times and the schedule index
+    vehicle_delta: bool = False  # store only vehicles that changed since the previous poll
+    vehicle_keyframe_interval: float = 600.0  # seconds between full vehicle snapshots in delta mode
     enable_compression: bool = True
 
+    def __post_init__(self):
+        if self.request_delay is not None:
+            # Requests are scheduled by FetchScheduler; this setting never reached it.
+            warnings.warn(
+                "GTFSConfig.request_delay is deprecated and ignored; set per_host_request_spacing instead",
+                DeprecationWarning,
+                stacklevel=3,
+            )
+
 
 # Default configuration instance
 DEFAULT_CONFIG = GTFSConfig()
@@ -3,41 +3,129 @@ Database management module for GTFS-RT pipeline.
 """
 
 import asyncio
+import functools
 import json
 import logging
 import os
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
-
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
 from urllib.parse import urlparse
 
 from .config import DatabaseConfig
 
+if TYPE_CHECKING:  # pandas is only needed by callers storing static tables
+    import pandas as pd
+
 
 class DatabaseManager:
     """
     Database manager for GTFS-RT data storage and retrieval.
     """
     
-    def __init__(self, config: DatabaseConfig):
+    def __init__(self, config: DatabaseConfig, data_directory: str = "/app/data"):
         """
         Initialize database manager.
         
         Args:
             config: Database configuration
+            data_directory: Root directory for raw and bronze artifacts
         """
         # Feature flags let us deploy raw artifact persistence safely.
         self.save_raw_proto = os.getenv("GTFS_RT_SAVE_PROTO", "0") == "1"
         self.save_raw_static_zip = os.getenv("GTFS_STATIC_SAVE_ZIP", "0") == "1"
+        # "json" keeps one document per poll, "parquet" appends rows to bronze datasets,
+        # "postgres" copies rows into partitioned PostgreSQL tables, "sqlite" inserts
+        # RT and static rows into one embedded database file.
+        self.rt_storage_format = os.getenv("GTFS_RT_STORAGE_FORMAT", "json").lower()
+        # Optional connection URI for "postgres"; falls back to DatabaseConfig fields.
+        self.postgres_dsn = os.getenv("GTFS_PG_DSN") or None
+        self.sqlite_path = os.getenv("GTFS_SQLITE_PATH") or None
+        # "files" keeps one .pb per poll, "segments" appends to rolling segment files.
+        self.raw_archive_format = os.getenv("GTFS_RT_RAW_ARCHIVE", "files").lower()
+        self.raw_segment_granularity = os.getenv("GTFS_RT_RAW_SEGMENT", "day").lower()
+        self.raw_archive_compression = os.getenv("GTFS_RT_RAW_COMPRESSION", "").lower() or None
         self.config = config
+        self.data_directory = Path(data_directory)
+        self.raw_dir = self.data_directory / "raw"
+        self.bronze_dir = self.data_directory / "bronze"
+        self.static_dir = self.data_directory / "silver" / "static"
         self.logger = logging.getLogger(__name__)
+        self.parquet_sink = None
+        self.postgres_sink = None
+        self.sqlite_sink = None
+        self.raw_archive = None
+        # Blocking file writes run on one dedicated thread: off the event loop,
+        # in submission order, and never concurrently with each other.
+        self._io_executor: Optional[ThreadPoolExecutor] = None
     
     async def initialize(self):
         """Initialize database connection and create tables if needed."""
-        self.logger.info("Database manager initialized (placeholder)")
+        if self.rt_storage_format == "parquet":
+            from .parquet_sink import ParquetRTSink
+
+            self.parquet_sink = ParquetRTSink(self.bronze_dir)
+            self.logger.info(f"GTFS-RT Parquet sink enabled under {self.bronze_dir}")
+        elif self.rt_storage_format == "postgres":
+            from .postgres_sink import PostgresRTSink
+
+            self.postgres_sink = PostgresRTSink(self.config, dsn=self.postgres_dsn)
+            await self.postgres_sink.open()
+            self.logger.info(
+                f"GTFS-RT PostgreSQL sink enabled ({self.config.host}:{self.config.port}/{self.config.database})"
+                if self.postgres_dsn is None else "GTFS-RT PostgreSQL sink enabled (GTFS_PG_DSN)"
+            )
+        elif self.rt_storage_format == "sqlite":
+            from .sqlite_sink import SQLiteSink
+
+            path = Path(self.sqlite_path) if self.sqlite_path else self.data_directory / "gtfs.sqlite"
+            self.sqlite_sink = await self._run_io(SQLiteSink, path)
+            self.logger.info(f"GTFS-RT SQLite sink enabled at {path}")
+        elif self.rt_storage_format != "json":
+            raise ValueError(f"Unknown GTFS_RT_STORAGE_FORMAT: {self.rt_storage_format}")
+        if self.raw_archive_format not in ("files", "segments"):
+            raise ValueError(f"Unknown GTFS_RT_RAW_ARCHIVE: {self.raw_archive_format}")
+        if self.save_raw_proto and self.raw_archive_format == "segments":
+            from .raw_archive import SegmentArchive
+
+            self.raw_archive = SegmentArchive(
+                self.raw_dir / "segments",
+                granularity=self.raw_segment_granularity,
+                compression=self.raw_archive_compression,
+            )
+            self.logger.info(f"GTFS-RT raw segment archive enabled under {self.raw_archive.root}")
+        self.logger.info(f"Database manager initialized ({self.rt_storage_format})")
+
+    @property
+    def columnar(self) -> bool:
+        """Whether the active sink takes Arrow record batches (see ``columnar_decoder``)."""
+        return any(sink is not None for sink in (self.parquet_sink, self.postgres_sink, self.sqlite_sink))
+
+    async def end_cycle(self) -> None:
+        """Mark the end of an ingestion cycle; commits the SQLite cycle transaction."""
+        if self.sqlite_sink is not None:
+            try:
+                rows = await self._run_io(self.sqlite_sink.commit)
+                self.logger.info(f"SQLite cycle committed: {rows} rows")
+            except Exception as e:
+                self.logger.error(f"Error committing SQLite cycle: {e}")
     
+    async def flush_aged(self) -> None:
+        """Write Parquet buffers older than the flush interval; called once per ingestion cycle."""
+        if self.parquet_sink is not None:
+            try:
+                await self._run_io(self.parquet_sink.flush_aged)
+            except Exception as e:
+                self.logger.error(f"Error flushing aged Parquet buffers: {e}")
+
+    async def _run_io(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking storage call on the I/O thread."""
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gtfs-io")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor, functools.partial(func, *args, **kwargs))
+
     def store_gtfs_rt_raw(
         self,
         raw_bytes: bytes,
@@ -45,9 +133,13 @@ class DatabaseManager:
         timestamp: str,
         feed_name: Optional[str] = None,
     ) -> None:
-        raw_dir = Path("/app/data/raw")
-        raw_dir.mkdir(parents=True, exist_ok=True)
         label = feed_name or feed_type
+        if self.raw_archive is not None:
+            segment = self.raw_archive.append(feed_type, label, timestamp, raw_bytes)
+            self.logger.info("GTFS-RT protobuf appended to segment: %s", segment)
+            return
+        raw_dir = self.raw_dir
+        raw_dir.mkdir(parents=True, exist_ok=True)
         filename = f"gtfs_rt_{feed_type}_{label}_{timestamp}.pb"
         target = raw_dir / filename
         with open(target, "wb") as fh:
@@ -56,7 +148,7 @@ class DatabaseManager:
 
 
     def store_gtfs_static_raw(self, raw_bytes: bytes, timestamp: str, feed_name: Optional[str] = None) -> None:
-        raw_dir = Path("/app/data/raw")
+        raw_dir = self.raw_dir
         raw_dir.mkdir(parents=True, exist_ok=True)
         suffix = f"_{feed_name}" if feed_name else ""
         filename = f"gtfs_static{suffix}_{timestamp}.zip"
@@ -66,6 +158,39 @@ class DatabaseManager:
         self.logger.info("GTFS Static ZIP saved: %s", target)
 
 
+    async def record_seen_again(
+        self,
+        feed_type: str,
+        timestamp: str,
+        reason: str,
+        feed_name: Optional[str] = None,
+        header_timestamp: Optional[int] = None,
+        digest: Optional[str] = None,
+    ) -> None:
+        """
+        Append a one-line marker for a poll whose snapshot was already stored.
+
+        Markers keep the poll time series complete without duplicating payloads.
+        """
+        marker = {
+            'timestamp': timestamp,
+            'feed_type': feed_type,
+            'feed_name': feed_name,
+            'reason': reason,
+            'header_timestamp': header_timestamp,
+            'digest': digest,
+        }
+        try:
+            await self._run_io(self._append_marker, marker)
+        except Exception as e:
+            self.logger.warning(f"Could not record seen-again marker for {feed_type}: {e}")
+
+    def _append_marker(self, marker: Dict[str, Any]) -> None:
+        marker_dir = self.raw_dir / "markers"
+        marker_dir.mkdir(parents=True, exist_ok=True)
+        with open(marker_dir / f"seen_again_{marker['timestamp'][:8]}.jsonl", "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(marker) + "\n")
+
     async def store_gtfs_rt_data(
         self,
         data: Dict,
@@ -89,32 +214,57 @@ class DatabaseManager:
         feed_type = data.get('feed_type', 'unknown')
         if self.save_raw_proto and raw_bytes and timestamp:
             # Persist raw protobuf so we can reprocess or audit original payloads later.
-            self.store_gtfs_rt_raw(raw_bytes, feed_type, timestamp, feed_name=feed_name)
+            await self._run_io(self.store_gtfs_rt_raw, raw_bytes, feed_type, timestamp, feed_name=feed_name)
 
         # Log the data structure for debugging
         if 'trip_updates' in data:
-            self.logger.info(f"Trip updates: {len(data['trip_updates'])} records")
+            stop_time_updates = data.get('stop_time_updates', {})
+            stop_rows = len(stop_time_updates.get('trip_id', [])) \
+                if isinstance(stop_time_updates, dict) else len(stop_time_updates)
+            self.logger.info(
+                f"Trip updates: {len(data['trip_updates'])} records, {stop_rows} stop time updates"
+            )
         elif 'vehicle_positions' in data:
             self.logger.info(f"Vehicle positions: {len(data['vehicle_positions'])} records")
 
+        # Generate timestamp (JST - container timezone is set to Asia/Tokyo)
+        timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+        label = feed_name or self._slug_from_url(feed_url)
+
+        if self.parquet_sink is not None:
+            try:
+                rows = await self._run_io(self.parquet_sink.append_snapshot, data, timestamp, label)
+                self.logger.info(f"GTFS-RT data appended to bronze Parquet: {rows} rows ({label})")
+            except Exception as e:
+                self.logger.error(f"Error appending GTFS-RT data to Parquet: {e}")
+                return False
+            return True
+
+        if self.sqlite_sink is not None:
+            try:
+                rows = await self._run_io(self.sqlite_sink.append_snapshot, data, timestamp, label)
+                self.logger.info(f"GTFS-RT data inserted into SQLite: {rows} rows ({label})")
+            except Exception as e:
+                self.logger.error(f"Error inserting GTFS-RT data into SQLite: {e}")
+                return False
+            return True
+
+        if self.postgres_sink is not None:
+            try:
+                rows = await self.postgres_sink.append_snapshot(data, timestamp, label)
+                self.logger.info(f"GTFS-RT data copied to PostgreSQL: {rows} rows ({label})")
+            except Exception as e:
+                self.logger.error(f"Error copying GTFS-RT data to PostgreSQL: {e}")
+                return False
+            return True
+
         # Save to raw data directory
         try:
-            import json
-            from pathlib import Path
-            
-            # Create raw data directory if it doesn't exist
-            raw_dir = Path("/app/data/raw")
-            raw_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Generate filename with timestamp (JST - container timezone is set to Asia/Tokyo)
-            timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
-            label = feed_name or self._slug_from_url(feed_url)
             filename = f"gtfs_rt_{feed_type}_{label}_{timestamp}.json"
-            filepath = raw_dir / filename
+            filepath = self.raw_dir / filename
 
-            # Save data to file
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, default=str, ensure_ascii=False)
+            # Serialise and save on the I/O thread
+            await self._run_io(self._write_json, data, filepath)
             
             self.logger.info(f"GTFS-RT data saved to: {filepath}")
             
@@ -124,9 +274,54 @@ class DatabaseManager:
         
         return True
 
+    async def store_gtfs_rt_batch(self, snapshots: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Store many GTFS-RT snapshots as one storage flush.
+
+        PostgreSQL receives the whole batch in one transaction (one ``COPY`` per
+        dataset); other sinks store snapshot by snapshot, and the batch ends
+        with ``end_cycle`` so SQLite commits it as one transaction.
+        
+        Args:
+            snapshots: Keyword arguments of ``store_gtfs_rt_data``, one dict per snapshot
+            
+        Returns:
+            Success flag per snapshot, in input order
+        """
+        if self.postgres_sink is None:
+            results = [await self.store_gtfs_rt_data(**snapshot) for snapshot in snapshots]
+            await self.end_cycle()
+            return results
+
+        batch = []
+        for snapshot in snapshots:
+            data = snapshot['data']
+            timestamp = snapshot.get('timestamp') or datetime.now().strftime('%Y%m%d_%H%M%S')
+            feed_name = snapshot.get('feed_name')
+            raw_bytes = snapshot.get('raw_bytes')
+            if self.save_raw_proto and raw_bytes:
+                await self._run_io(
+                    self.store_gtfs_rt_raw, raw_bytes, data.get('feed_type', 'unknown'), timestamp,
+                    feed_name=feed_name,
+                )
+            batch.append((data, timestamp, feed_name or self._slug_from_url(snapshot['feed_url'])))
+        try:
+            rows = await self.postgres_sink.append_snapshots(batch)
+            self.logger.info(f"GTFS-RT batch copied to PostgreSQL: {rows} rows from {len(batch)} snapshots")
+        except Exception as e:
+            self.logger.error(f"Error copying GTFS-RT batch to PostgreSQL: {e}")
+            return [False] * len(batch)
+        return [True] * len(batch)
+
+    def _write_json(self, data: Dict, filepath: Path) -> None:
+        # Create raw data directory if it doesn't exist
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, default=str, ensure_ascii=False)
+
     async def store_gtfs_static_data(
         self,
-        data: Dict[str, pd.DataFrame],
+        data: Dict[str, "pd.DataFrame"],
         feed_url: str,
         raw_bytes: Optional[bytes] = None,
         timestamp: Optional[str] = None,
@@ -148,7 +343,7 @@ class DatabaseManager:
 
         if self.save_raw_static_zip and raw_bytes and timestamp:
             # Persist raw ZIP so we can rehydrate or audit GTFS static inputs.
-            self.store_gtfs_static_raw(raw_bytes, timestamp, feed_name=feed_name)
+            await self._run_io(self.store_gtfs_static_raw, raw_bytes, timestamp, feed_name=feed_name)
 
         # Log the data structure for debugging
         for table_name, df in data.items():
@@ -158,44 +353,59 @@ class DatabaseManager:
                 # Log first few rows for debugging
                 self.logger.debug(f"  Sample data:\n{df.head()}")
         
-        # Save to raw data directory
+        # Materialise the version as sorted, memory-mappable columnar tables
         try:
-            import json
-            from pathlib import Path
+            from .static_store import write_static_version
 
-            # Create raw data directory if it doesn't exist
-            raw_dir = Path("/app/data/raw")
-            raw_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Generate filename with timestamp (JST - container timezone is set to Asia/Tokyo)
+            # Version id is the fetch timestamp (JST - container timezone is set to Asia/Tokyo)
             timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
-            label = feed_name or self._slug_from_url(feed_url)
-            filename = f"gtfs_static_{label}_{timestamp}.json"
-            filepath = raw_dir / filename
-            
-            # Convert DataFrames to dictionaries for JSON serialization
-            json_data = {
+            manifest_path = self.static_artifact_path(feed_url, timestamp, feed_name)
+            metadata = {
                 'feed_url': feed_url,
                 'feed_name': feed_name,
-                'timestamp': timestamp,
-                'tables': {}
+                'version_id': timestamp,
             }
+            feed_info = data.get('feed_info')
+            if feed_info is not None and len(feed_info) and 'feed_version' in feed_info.columns:
+                metadata['feed_version'] = feed_info['feed_version'].iloc[0]
+            await self._run_io(write_static_version, manifest_path.parent, data, metadata=metadata)
             
-            for table_name, df in data.items():
-                json_data['tables'][table_name] = df.to_dict('records')
-            
-            # Save data to file
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, indent=2, default=str, ensure_ascii=False)
-            
-            self.logger.info(f"GTFS Static data saved to: {filepath}")
+            self.logger.info(f"GTFS Static data saved to: {manifest_path.parent}")
+
+            # Schedule index, service calendar and shape index are built once per version here,
+            # so RT polls only memory-map them.
+            builders = []
+            if 'stop_times' in data:
+                from .schedule_index import load_schedule_index
+                builders.append(('schedule index', load_schedule_index))
+            if 'calendar' in data or 'calendar_dates' in data:
+                from .service_calendar import load_service_calendar
+                builders.append(('service calendar', load_service_calendar))
+            if 'shapes' in data:
+                from .shape_index import load_shape_index
+                builders.append(('shape index', load_shape_index))
+            for artifact_name, build in builders:
+                try:
+                    await self._run_io(build, manifest_path.parent, True)
+                except Exception as e:
+                    self.logger.warning(f"Could not build {artifact_name} for {manifest_path.parent}: {e}")
+
+            if self.sqlite_sink is not None:
+                label = feed_name or self._slug_from_url(feed_url)
+                rows = await self._run_io(self.sqlite_sink.replace_static, label, timestamp, data)
+                self.logger.info(f"GTFS Static data inserted into SQLite: {rows} rows ({label})")
             
         except Exception as e:
-            self.logger.error(f"Error saving GTFS Static data to file: {e}")
+            self.logger.error(f"Error saving GTFS Static data: {e}")
             return False
         
         return True
 
+    def static_artifact_path(self, feed_url: str, timestamp: str, feed_name: Optional[str] = None) -> Path:
+        """Manifest of the materialised static tables for one ingested version."""
+        label = feed_name or self._slug_from_url(feed_url)
+        return self.static_dir / label / timestamp / "manifest.json"
+
     @staticmethod
     def _slug_from_url(feed_url: str) -> str:
         parsed = urlparse(feed_url)
@@ -206,4 +416,20 @@ class DatabaseManager:
     
     async def close(self):
         """Close database connections."""
-        self.logger.info("Database connections closed (placeholder)")
+        if self.parquet_sink is not None:
+            await self._run_io(self.parquet_sink.close)
+            self.parquet_sink = None
+        if self.postgres_sink is not None:
+            await self.postgres_sink.close()
+            self.postgres_sink = None
+        if self.sqlite_sink is not None:
+            await self._run_io(self.sqlite_sink.close)
+            self.sqlite_sink = None
+        if self.raw_archive is not None:
+            await self._run_io(self.raw_archive.close)
+            self.raw_archive = None
+        if self._io_executor is not None:
+            # Waits for queued writes to land on disk.
+            self._io_executor.shutdown(wait=True)
+            self._io_executor = None
+        self.logger.info("Database connections closed")
@@ -0,0 +1,197 @@
+"""
+HTTP validator cache and snapshot de-duplication for GTFS-RT feeds.
+
+Remembers the ``ETag``, ``Last-Modified`` and content hash of the last payload
+seen for every feed URL so the next poll can be sent as a conditional GET and
+unchanged responses can be short-circuited before parsing and storage. A small
+per-feed LRU additionally catches snapshots seen a few polls ago or re-served
+with different bytes but the same ``header.timestamp``.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Mapping, Optional
+
+
+@dataclass
+class FeedValidators:
+    """Validators and hit/miss counters for a single feed URL."""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    not_modified_hits: int = 0
+    identical_body_hits: int = 0
+    misses: int = 0
+
+
+@dataclass
+class FeedValidatorCache:
+    """
+    Per-feed validator cache persisted as JSON between runs.
+    """
+    path: Optional[Path] = None
+    feeds: Dict[str, FeedValidators] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def load(cls, path: Path) -> "FeedValidatorCache":
+        """Load a cache file, starting empty when it is missing or unreadable."""
+        cache = cls(path=Path(path))
+        try:
+            with open(cache.path, "r", encoding="utf-8") as fh:
+                stored = json.load(fh)
+            cache.feeds = {url: FeedValidators(**values) for url, values in stored.items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            cache.logger.warning(f"Ignoring unreadable validator cache {cache.path}: {e}")
+        return cache
+
+    def save(self) -> None:
+        """Persist validators so short-lived runs keep benefiting from them."""
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({url: asdict(v) for url, v in self.feeds.items()}, fh)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            self.logger.warning(f"Could not save validator cache {self.path}: {e}")
+
+    def request_headers(self, feed_url: str) -> Dict[str, str]:
+        """Return conditional request headers for ``feed_url``."""
+        validators = self.feeds.get(feed_url)
+        headers: Dict[str, str] = {}
+        if validators is None:
+            return headers
+        if validators.etag:
+            headers["If-None-Match"] = validators.etag
+        if validators.last_modified:
+            headers["If-Modified-Since"] = validators.last_modified
+        return headers
+
+    def record_not_modified(self, feed_url: str) -> None:
+        """Count a 304 response."""
+        self.feeds.setdefault(feed_url, FeedValidators()).not_modified_hits += 1
+
+    def record_response(self, feed_url: str, headers: Mapping[str, str], body: bytes) -> bool:
+        """
+        Update validators from a 200 response.
+
+        Args:
+            feed_url: URL of the feed
+            headers: Response headers
+            body: Response payload
+
+        Returns:
+            True if the body differs from the previously seen payload
+        """
+        validators = self.feeds.setdefault(feed_url, FeedValidators())
+        validators.etag = headers.get("ETag") or validators.etag
+        validators.last_modified = headers.get("Last-Modified") or validators.last_modified
+
+        content_hash = hashlib.blake2b(body, digest_size=16).hexdigest()
+        if content_hash == validators.content_hash:
+            validators.identical_body_hits += 1
+            return False
+
+        validators.content_hash = content_hash
+        validators.misses += 1
+        return True
+
+    def invalidate(self, feed_url: str) -> None:
+        """Forget validators so the next poll downloads and processes the feed again."""
+        validators = self.feeds.get(feed_url)
+        if validators is not None:
+            validators.etag = None
+            validators.last_modified = None
+            validators.content_hash = None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return hit/miss counters per feed URL."""
+        return {
+            url: {
+                "not_modified_hits": v.not_modified_hits,
+                "identical_body_hits": v.identical_body_hits,
+                "misses": v.misses,
+            }
+            for url, v in self.feeds.items()
+        }
+
+
+@dataclass
+class SnapshotDeduplicator:
+    """
+    Bounded per-feed LRU of recently ingested snapshots.
+
+    A snapshot is a duplicate when either its raw-byte digest or its non-zero
+    ``header.timestamp`` matches one of the last ``capacity`` snapshots of the
+    same feed.
+    """
+    path: Optional[Path] = None
+    capacity: int = 32
+    feeds: Dict[str, "OrderedDict[str, int]"] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def load(cls, path: Path, capacity: int = 32) -> "SnapshotDeduplicator":
+        """Load remembered snapshots, starting empty when the file is missing."""
+        dedup = cls(path=Path(path), capacity=capacity)
+        try:
+            with open(dedup.path, "r", encoding="utf-8") as fh:
+                stored = json.load(fh)
+            dedup.feeds = {
+                key: OrderedDict((digest, int(ts)) for digest, ts in entries[-capacity:])
+                for key, entries in stored.items()
+            }
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            dedup.logger.warning(f"Ignoring unreadable snapshot index {dedup.path}: {e}")
+        return dedup
+
+    def save(self) -> None:
+        """Persist the LRU so cron-launched runs share it."""
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({key: list(entries.items()) for key, entries in self.feeds.items()}, fh)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            self.logger.warning(f"Could not save snapshot index {self.path}: {e}")
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """Fast, non-cryptographic-strength fingerprint of a payload."""
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def is_duplicate(self, feed_key: str, digest: str, header_timestamp: int) -> bool:
+        """Return True if the snapshot was already ingested for ``feed_key``."""
+        entries = self.feeds.get(feed_key)
+        if not entries:
+            return False
+        if digest in entries:
+            entries.move_to_end(digest)
+            return True
+        return bool(header_timestamp) and header_timestamp in entries.values()
+
+    def remember(self, feed_key: str, digest: str, header_timestamp: int) -> None:
+        """Record a snapshot that has been parsed and stored."""
+        entries = self.feeds.setdefault(feed_key, OrderedDict())
+        entries[digest] = header_timestamp
+        entries.move_to_end(digest)
+        while len(entries) > self.capacity:
+            entries.popitem(last=False)
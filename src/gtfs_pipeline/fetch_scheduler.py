@@ -0,0 +1,93 @@
+"""
+Fetch scheduling for GTFS feed downloads.
+
+Bounds how many requests are in flight globally and per upstream host, and
+optionally spaces request starts to the same host, while letting requests to
+different hosts overlap freely. The tuned ``TCPConnector`` keeps connections
+alive between polls and caches DNS lookups.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .config import GTFSConfig
+
+
+def build_connector(config: GTFSConfig) -> aiohttp.TCPConnector:
+    """Create the shared connection pool for all feed requests."""
+    return aiohttp.TCPConnector(
+        limit=config.max_concurrent_requests,
+        limit_per_host=config.max_concurrent_requests_per_host,
+        ttl_dns_cache=config.dns_cache_ttl,
+        keepalive_timeout=config.keepalive_timeout,
+    )
+
+
+class FetchScheduler:
+    """
+    Global and per-host concurrency limits for feed fetches.
+
+    Must be created inside the running event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_per_host: int,
+        min_host_spacing: float = 0.0,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrent: Maximum requests in flight across all hosts
+            max_per_host: Maximum requests in flight to a single host
+            min_host_spacing: Minimum seconds between request starts to the same host
+        """
+        self.max_per_host = max(1, max_per_host)
+        self.min_host_spacing = max(0.0, min_host_spacing)
+        self.logger = logging.getLogger(__name__)
+        self._global = asyncio.Semaphore(max(1, max_concurrent))
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+        self._last_start: Dict[str, float] = {}
+
+    @classmethod
+    def from_config(cls, config: GTFSConfig) -> "FetchScheduler":
+        return cls(
+            max_concurrent=config.max_concurrent_requests,
+            max_per_host=config.max_concurrent_requests_per_host,
+            min_host_spacing=config.per_host_request_spacing,
+        )
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        """
+        Hold a request slot for ``url`` for the duration of the block.
+
+        The per-host slot is acquired first so a busy host never pins global
+        slots that requests to other hosts could use.
+        """
+        host = urlparse(url).netloc
+        host_semaphore = self._hosts.setdefault(host, asyncio.Semaphore(self.max_per_host))
+        async with host_semaphore:
+            await self._respect_spacing(host)
+            async with self._global:
+                yield
+
+    async def _respect_spacing(self, host: str) -> None:
+        if not self.min_host_spacing:
+            return
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._last_start.get(host, 0.0) + self.min_host_spacing - time.monotonic()
+            if wait > 0:
+                self.logger.debug(f"Spacing requests to {host}: waiting {wait:.2f}s")
+                await asyncio.sleep(wait)
+            self._last_start[host] = time.monotonic()
@@ -6,22 +6,138 @@ processing the protobuf data, and storing it in a structured format for analysis
 """
 
 import asyncio
+import functools
 import logging
+import math
+import multiprocessing
 import time
-import zipfile
-import io
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 import aiohttp
-import pandas as pd
 from google.transit import gtfs_realtime_pb2
 
 from .config import GTFSConfig
 from .database import DatabaseManager
+from .feed_cache import FeedValidatorCache, SnapshotDeduplicator
+from .fetch_scheduler import FetchScheduler, build_connector
+from .retry import RETRYABLE_STATUSES, RetryableStatus, RetryBudget, RetryPolicy, parse_retry_after, retry_async
+from .static_registry import StaticFeedRegistry, StaticFeedVersion, read_feed_version, static_content_hash
 from .utils import setup_logging
+from .write_buffer import PendingSnapshot, WriteBehindBuffer
+
+if TYPE_CHECKING:  # pandas is only imported on the static code path
+    import pandas as pd
+    from multidict import CIMultiDict
+
+    from .schedule_index import ScheduleIndexCache
+    from .vehicle_delta import VehicleDeltaEncoder
+
+
+# Columns of the per-stop prediction table emitted alongside trip updates.
+STOP_TIME_UPDATE_COLUMNS = [
+    'trip_id', 'start_date', 'route_id', 'stop_sequence', 'stop_id',
+    'arrival_delay', 'arrival_time', 'departure_delay', 'departure_time',
+    'schedule_relationship', 'timestamp',
+]
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Decode a protobuf varint starting at ``pos``; returns (value, next position)."""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+# Read FeedMessage.header.timestamp without decoding the (large) entity list.
+def peek_header_timestamp(data: bytes) -> int:
+    """
+    Return ``header.timestamp`` of a serialised FeedMessage, or 0 if unavailable.
+
+    Only the top-level wire format is walked until field 1 (the header) is found;
+    the header slice alone is then parsed with the generated bindings.
+    """
+    pos = 0
+    try:
+        while pos < len(data):
+            key, pos = _read_varint(data, pos)
+            field_number, wire_type = key >> 3, key & 0x07
+            if wire_type == 2:
+                length, pos = _read_varint(data, pos)
+                if field_number == 1:
+                    header = gtfs_realtime_pb2.FeedHeader()
+                    header.ParseFromString(data[pos:pos + length])
+                    return header.timestamp
+                pos += length
+            elif wire_type == 0:
+                _, pos = _read_varint(data, pos)
+            elif wire_type == 1:
+                pos += 8
+            elif wire_type == 5:
+                pos += 4
+            else:
+                return 0
+    except Exception:
+        return 0
+    return 0
+
+
+
+def decode_rt_payload(data: bytes, feed_type: str, columnar: bool = False) -> Dict:
+    """
+    Decode a GTFS-RT payload; module-level so it can run in a worker process.
+
+    Args:
+        data: Raw protobuf data
+        feed_type: Type of feed (trip_updates, vehicle_positions)
+        columnar: Return Arrow record batches (``columnar_decoder``) instead of dicts
+
+    Returns:
+        Parsed data dictionary
+
+    Raises:
+        ValueError: For an unknown feed type; protobuf decode errors propagate
+    """
+    if columnar:
+        from .columnar_decoder import decode_feed
+
+        return decode_feed(data, feed_type)
+    if feed_type not in ("trip_updates", "vehicle_positions"):
+        raise ValueError(f"Unknown feed type: {feed_type}")
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(data)
+    if feed_type == "trip_updates":
+        return GTFSIngest._parse_trip_updates(feed)
+    return GTFSIngest._parse_vehicle_positions(feed)
+
+
+def build_parse_executor(config: GTFSConfig) -> Optional[Executor]:
+    """
+    Create the pool that runs CPU-bound decode work off the event loop.
+
+    Returns:
+        A thread or process pool per ``config.parse_executor``, or None for "inline"
+    """
+    kind = config.parse_executor.lower()
+    if kind == "inline":
+        return None
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=config.parse_workers, thread_name_prefix="gtfs-parse")
+    if kind == "process":
+        # spawn: forking a process that runs an event loop and open sockets is unsafe.
+        return ProcessPoolExecutor(
+            max_workers=config.parse_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    raise ValueError(f"Unknown parse_executor: {config.parse_executor}")
 
 
 class GTFSIngest:
@@ -42,22 +158,100 @@ class GTFSIngest:
         self.db_manager = db_manager
         self.logger = setup_logging(__name__)
         self.session: Optional[aiohttp.ClientSession] = None
+        self.scheduler: Optional[FetchScheduler] = None
+        self.retry_policy = RetryPolicy(
+            max_retries=config.max_retries,
+            base_delay=config.retry_delay,
+            max_delay=config.retry_max_delay,
+        )
+        self._stop_event: Optional[asyncio.Event] = None
+        self.parse_executor: Optional[Executor] = None
+        self.write_buffer: Optional[WriteBehindBuffer] = None
+        # Loaded on context entry: the saved state belongs to the run that will save it again.
+        self.vehicle_delta: Optional["VehicleDeltaEncoder"] = None
+        self.validator_cache = FeedValidatorCache.load(
+            Path(config.data_directory) / "state" / "rt_validators.json"
+        )
+        self.snapshot_dedup = SnapshotDeduplicator.load(
+            Path(config.data_directory) / "state" / "rt_snapshots.json"
+        )
+        self.static_registry = StaticFeedRegistry.load(
+            Path(config.data_directory) / "state" / "static_registry.json"
+        )
+        # Built on the first trip_updates join, so runs that never join skip NumPy/pandas/pyarrow.
+        self.schedule_indexes: Optional["ScheduleIndexCache"] = None
         
     # Open the shared HTTP session when the async context starts.
     async def __aenter__(self):
         """Async context manager entry."""
+        # One pooled, keep-alive connector shared by every poll of this process.
         self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=30),
+            connector=build_connector(self.config),
+            timeout=aiohttp.ClientTimeout(total=self.config.timeout),
             headers={'User-Agent': 'GTFS-RT-Ingest/1.0'}
         )
+        self.scheduler = FetchScheduler.from_config(self.config)
+        self.parse_executor = build_parse_executor(self.config)
+        if self.config.vehicle_delta:
+            from .vehicle_delta import VehicleDeltaEncoder
+
+            # Persisted so cron-launched --once runs continue each other's deltas.
+            self.vehicle_delta = VehicleDeltaEncoder.load(
+                Path(self.config.data_directory) / "state" / "vehicle_delta.json",
+                self.config.vehicle_keyframe_interval,
+            )
+        if self.config.write_behind and self.db_manager is not None:
+            self.write_buffer = WriteBehindBuffer(
+                self.db_manager,
+                max_batch=self.config.write_buffer_max_batch,
+                max_age=self.config.write_buffer_max_age,
+                max_pending=self.config.write_buffer_max_pending,
+            )
+            self.write_buffer.start()
+        # Created inside the running loop (required on Python < 3.10).
+        self._stop_event = asyncio.Event()
         return self
         
     # Ensure the HTTP session gets closed on context teardown.
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
+        if self.write_buffer is not None:
+            # Drain before the caller closes storage; nothing accepted is lost on SIGTERM.
+            await self.write_buffer.close()
+            self.write_buffer = None
         if self.session:
             await self.session.close()
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown(wait=True)
+            self.parse_executor = None
+        self.validator_cache.save()
+        self.snapshot_dedup.save()
+        if self.vehicle_delta is not None:
+            self.vehicle_delta.save()
+        for feed_url, counters in self.validator_cache.stats().items():
+            self.logger.info(f"Validator cache {feed_url}: {counters}")
     
+    # Ask continuous loops to finish the in-flight cycle and return.
+    def request_stop(self) -> None:
+        """Request a graceful stop; safe to call from a signal handler."""
+        if self._stop_event is not None and not self._stop_event.is_set():
+            self.logger.info("Stop requested; draining the current ingestion cycle")
+            self._stop_event.set()
+
+    @property
+    def stop_requested(self) -> bool:
+        return self._stop_event is not None and self._stop_event.is_set()
+
+    async def _sleep_unless_stopped(self, seconds: float) -> None:
+        """Sleep for ``seconds`` but wake immediately when a stop is requested."""
+        if self._stop_event is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
     # Pull GTFS-RT protobuf payload from the upstream endpoint.
     async def fetch_gtfs_rt_data(self, feed_url: str) -> Optional[bytes]:
         """
@@ -69,27 +263,112 @@ class GTFSIngest:
         Returns:
             Raw protobuf data or None if fetch failed
         """
+        data, _ = await self._fetch_rt(feed_url, conditional=False)
+        return data
+
+    # Pull GTFS-RT payload only when upstream changed since the previous poll.
+    async def fetch_gtfs_rt_data_if_modified(
+        self,
+        feed_url: str,
+        deadline: Optional[float] = None,
+        retry_budget: Optional[RetryBudget] = None,
+    ) -> Tuple[Optional[bytes], bool]:
+        """
+        Fetch GTFS-RT data with a conditional GET against the validator cache.
+        
+        Args:
+            feed_url: URL of the GTFS-RT feed
+            deadline: Optional ``time.monotonic()`` value after which no retry starts
+            retry_budget: Optional retry budget shared across the cycle
+            
+        Returns:
+            Tuple of (raw protobuf data, unchanged). ``unchanged`` is True when the
+            server answered 304 or returned the same body as the previous poll, in
+            which case data is None. Data is also None when the fetch failed.
+        """
+        return await self._fetch_rt(
+            feed_url, conditional=True, deadline=deadline, retry_budget=retry_budget
+        )
+
+    async def _fetch_rt(
+        self,
+        feed_url: str,
+        conditional: bool,
+        deadline: Optional[float] = None,
+        retry_budget: Optional[RetryBudget] = None,
+    ) -> Tuple[Optional[bytes], bool]:
+        """Shared request path for plain and conditional GTFS-RT fetches."""
         try:
             self.logger.info(f"Fetching GTFS-RT data from: {feed_url}")
+            headers = self.validator_cache.request_headers(feed_url) if conditional else {}
             
-            async with self.session.get(feed_url) as response:
-                if response.status == 200:
-                    data = await response.read()
-                    self.logger.info(f"Successfully fetched {len(data)} bytes")
-                    return data
-                else:
-                    self.logger.error(f"HTTP {response.status} error fetching {feed_url}")
-                    return None
+            status, data, response_headers = await self._get_with_retry(
+                feed_url, headers, deadline=deadline, retry_budget=retry_budget
+            )
+            if status == 304 and conditional:
+                self.validator_cache.record_not_modified(feed_url)
+                self.logger.info(f"Not modified since last poll: {feed_url}")
+                return None, True
+            if status == 200:
+                self.logger.info(f"Successfully fetched {len(data)} bytes")
+                if conditional and not self.validator_cache.record_response(
+                    feed_url, response_headers, data
+                ):
+                    self.logger.info(f"Payload identical to last poll: {feed_url}")
+                    return None, True
+                return data, False
+            else:
+                self.logger.error(f"HTTP {status} error fetching {feed_url}")
+                return None, False
                     
+        except RetryableStatus as e:
+            self.logger.error(f"HTTP {e.status} error fetching {feed_url} (retries exhausted)")
+            return None, False
         except asyncio.TimeoutError:
             self.logger.error(f"Timeout fetching {feed_url}")
-            return None
+            return None, False
         except Exception as e:
             self.logger.error(f"Error fetching {feed_url}: {e}")
-            return None
+            return None, False
+
+    # Issue one GET under the fetch scheduler, retrying transient failures.
+    async def _get_with_retry(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        deadline: Optional[float] = None,
+        retry_budget: Optional[RetryBudget] = None,
+    ) -> Tuple[int, bytes, "CIMultiDict[str]"]:
+        """
+        GET ``url`` with backoff on timeouts, connection errors and transient statuses.
+
+        Returns:
+            Tuple of (status, body, response headers); the body is empty unless status is 200
+        """
+        async def attempt(remaining: Optional[float]) -> Tuple[int, bytes, "CIMultiDict[str]"]:
+            timeout = self.config.timeout if remaining is None else min(self.config.timeout, remaining)
+            async with self.scheduler.slot(url), self.session.get(
+                url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                if response.status in RETRYABLE_STATUSES:
+                    raise RetryableStatus(
+                        response.status, parse_retry_after(response.headers.get('Retry-After'))
+                    )
+                body = await response.read() if response.status == 200 else b""
+                return response.status, body, response.headers.copy()
+
+        return await retry_async(
+            attempt,
+            self.retry_policy,
+            retry_on=(asyncio.TimeoutError, aiohttp.ClientError, RetryableStatus),
+            deadline=deadline,
+            budget=retry_budget,
+            description=url,
+            logger=self.logger,
+        )
     
     # Download the GTFS static bundle and unfold the core tables.
-    async def fetch_gtfs_static_data(self, feed_url: str) -> Optional[Tuple[Dict[str, pd.DataFrame], bytes]]:
+    async def fetch_gtfs_static_data(self, feed_url: str) -> Optional[Tuple[Dict[str, "pd.DataFrame"], bytes]]:
         """
         Fetch and parse GTFS Static data from a given URL.
         
@@ -99,44 +378,89 @@ class GTFSIngest:
         Returns:
             Tuple of (parsed tables, raw ZIP bytes) or None if fetch failed
         """
+        zip_data, _, _ = await self.download_gtfs_static_zip(feed_url)
+        if zip_data is None:
+            return None
+
+        try:
+            return self.parse_gtfs_static_zip(zip_data), zip_data
+        except Exception as e:
+            self.logger.error(f"Error parsing GTFS Static data from {feed_url}: {e}")
+            return None
+
+    # Download the raw GTFS static ZIP, optionally as a conditional GET.
+    async def download_gtfs_static_zip(
+        self,
+        feed_url: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[Optional[bytes], bool, Dict[str, str]]:
+        """
+        Download a GTFS Static ZIP without parsing it.
+        
+        Args:
+            feed_url: URL of the GTFS Static feed (ZIP file)
+            headers: Optional conditional request headers
+            
+        Returns:
+            Tuple of (raw ZIP bytes, not_modified, response validators). ZIP bytes are
+            None when the server answered 304 or the download failed.
+        """
         try:
             self.logger.info(f"Fetching GTFS Static data from: {feed_url}")
             
-            async with self.session.get(feed_url) as response:
-                if response.status == 200:
-                    zip_data = await response.read()
-                    self.logger.info(f"Successfully fetched {len(zip_data)} bytes of GTFS Static data")
-                    
-                    # Parse ZIP file
-                    gtfs_data = {}
-                    with zipfile.ZipFile(io.BytesIO(zip_data)) as zip_file:
-                        # Read common GTFS files
-                        gtfs_files = [
-                            'agency.txt', 'stops.txt', 'routes.txt', 'trips.txt', 
-                            'stop_times.txt', 'calendar.txt', 'calendar_dates.txt'
-                        ]
-                        
-                        for file_name in gtfs_files:
-                            if file_name in zip_file.namelist():
-                                try:
-                                    with zip_file.open(file_name) as file:
-                                        df = pd.read_csv(file)
-                                        gtfs_data[file_name.replace('.txt', '')] = df
-                                        self.logger.info(f"Loaded {file_name}: {len(df)} records")
-                                except Exception as e:
-                                    self.logger.warning(f"Error reading {file_name}: {e}")
-                    
-                    return gtfs_data, zip_data
-                else:
-                    self.logger.error(f"HTTP {response.status} error fetching {feed_url}")
-                    return None
+            status, zip_data, response_headers = await self._get_with_retry(feed_url, headers or {})
+            validators = {
+                'etag': response_headers.get('ETag'),
+                'last_modified': response_headers.get('Last-Modified'),
+            }
+            if status == 304:
+                self.logger.info(f"GTFS Static feed not modified: {feed_url}")
+                return None, True, validators
+            if status == 200:
+                self.logger.info(f"Successfully fetched {len(zip_data)} bytes of GTFS Static data")
+                return zip_data, False, validators
+            else:
+                self.logger.error(f"HTTP {status} error fetching {feed_url}")
+                return None, False, validators
                     
+        except RetryableStatus as e:
+            self.logger.error(f"HTTP {e.status} error fetching {feed_url} (retries exhausted)")
+            return None, False, {}
         except asyncio.TimeoutError:
             self.logger.error(f"Timeout fetching {feed_url}")
-            return None
+            return None, False, {}
         except Exception as e:
             self.logger.error(f"Error fetching GTFS Static data from {feed_url}: {e}")
-            return None
+            return None, False, {}
+
+    # Unfold the core GTFS tables from a downloaded ZIP.
+    def parse_gtfs_static_zip(self, zip_data: bytes) -> Dict[str, "pd.DataFrame"]:
+        """Stream ZIP members through the typed GTFS schema."""
+        from .static_loader import load_gtfs_static
+
+        return load_gtfs_static(zip_data, chunked_tables=self._static_chunked_tables())
+
+    # Same as parse_gtfs_static_zip, but on the parse executor.
+    async def parse_gtfs_static_zip_offloaded(self, zip_data: bytes) -> Dict[str, "pd.DataFrame"]:
+        """Parse a static ZIP on the parse executor so the event loop keeps polling."""
+        from .static_loader import load_gtfs_static
+
+        return await self._offload(
+            load_gtfs_static, zip_data, chunked_tables=self._static_chunked_tables()
+        )
+
+    def _static_chunked_tables(self) -> Dict[str, int]:
+        chunked_tables = {}
+        if self.config.static_stop_times_chunksize:
+            chunked_tables['stop_times'] = self.config.static_stop_times_chunksize
+        return chunked_tables
+
+    async def _offload(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``func`` on the parse executor (inline when none is configured)."""
+        call = functools.partial(func, *args, **kwargs)
+        if self.parse_executor is None:
+            return call()
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, call)
     
     # Route raw GTFS-RT bytes to the correct parser for the feed type.
     def parse_gtfs_rt_data(self, data: bytes, feed_type: str) -> Dict:
@@ -167,10 +491,63 @@ class GTFSIngest:
             self.logger.error(f"Error parsing GTFS-RT data: {e}")
             return {}
     
+    # Decode raw GTFS-RT bytes straight into Arrow record batches.
+    def parse_gtfs_rt_columnar(self, data: bytes, feed_type: str) -> Dict:
+        """
+        Parse GTFS-RT protobuf data into record batches without per-entity dicts.
+        
+        Args:
+            data: Raw protobuf data
+            feed_type: Type of feed (trip_updates, vehicle_positions)
+            
+        Returns:
+            Parsed data dictionary whose dataset entries are ``pyarrow.RecordBatch``
+            objects (see ``columnar_decoder``), or an empty dict on failure
+        """
+        try:
+            from .columnar_decoder import decode_feed
+
+            return decode_feed(data, feed_type)
+        except Exception as e:
+            self.logger.error(f"Error decoding GTFS-RT data: {e}")
+            return {}
+    
+    # Decode on the parse executor so a large feed never stalls other fetches.
+    async def parse_gtfs_rt_data_offloaded(
+        self,
+        data: bytes,
+        feed_type: str,
+        columnar: bool = False,
+    ) -> Dict:
+        """
+        Parse GTFS-RT protobuf data on the parse executor.
+        
+        Args:
+            data: Raw protobuf data
+            feed_type: Type of feed (trip_updates, vehicle_positions)
+            columnar: Decode into record batches (see ``parse_gtfs_rt_columnar``)
+            
+        Returns:
+            Parsed data dictionary, or an empty dict on failure
+        """
+        try:
+            return await self._offload(decode_rt_payload, data, feed_type, columnar)
+        except Exception as e:
+            self.logger.error(f"Error parsing GTFS-RT data: {e}")
+            return {}
+    
     # Normalise trip update entities into dictionaries ready for persistence.
-    def _parse_trip_updates(self, feed: gtfs_realtime_pb2.FeedMessage) -> Dict:
-        """Parse trip updates from GTFS-RT feed."""
+    @staticmethod
+    def _parse_trip_updates(feed: gtfs_realtime_pb2.FeedMessage) -> Dict:
+        """
+        Parse trip updates from GTFS-RT feed.
+
+        Besides one record per trip, every ``stop_time_update`` is flattened into
+        the columnar ``stop_time_updates`` table (column name -> list of values)
+        during the same pass over the feed.
+        """
         trip_updates = []
+        stop_time_updates: Dict[str, List] = {column: [] for column in STOP_TIME_UPDATE_COLUMNS}
         
         for entity in feed.entity:
             if entity.HasField('trip_update'):
@@ -186,16 +563,38 @@ class GTFSIngest:
                     'delay': trip_update.delay if trip_update.HasField('delay') else None,
                 }
                 trip_updates.append(update_data)
+                
+                for stop_time_update in trip_update.stop_time_update:
+                    stop_time_updates['trip_id'].append(update_data['trip_id'])
+                    stop_time_updates['start_date'].append(update_data['start_date'])
+                    stop_time_updates['route_id'].append(update_data['route_id'])
+                    stop_time_updates['stop_sequence'].append(
+                        stop_time_update.stop_sequence if stop_time_update.HasField('stop_sequence') else None
+                    )
+                    stop_time_updates['stop_id'].append(stop_time_update.stop_id or None)
+                    for event_name in ('arrival', 'departure'):
+                        has_event = stop_time_update.HasField(event_name)
+                        event = getattr(stop_time_update, event_name)
+                        stop_time_updates[f'{event_name}_delay'].append(
+                            event.delay if has_event and event.HasField('delay') else None
+                        )
+                        stop_time_updates[f'{event_name}_time'].append(
+                            event.time if has_event and event.HasField('time') else None
+                        )
+                    stop_time_updates['schedule_relationship'].append(stop_time_update.schedule_relationship)
+                    stop_time_updates['timestamp'].append(update_data['timestamp'])
         
         return {
             'feed_type': 'trip_updates',
             'timestamp': feed.header.timestamp,
             'gtfs_realtime_version': feed.header.gtfs_realtime_version,
-            'trip_updates': trip_updates
+            'trip_updates': trip_updates,
+            'stop_time_updates': stop_time_updates,
         }
     
     # Normalise vehicle position entities into downstream-friendly records.
-    def _parse_vehicle_positions(self, feed: gtfs_realtime_pb2.FeedMessage) -> Dict:
+    @staticmethod
+    def _parse_vehicle_positions(feed: gtfs_realtime_pb2.FeedMessage) -> Dict:
         """Parse vehicle positions from GTFS-RT feed."""
         vehicle_positions = []
         
@@ -235,6 +634,8 @@ class GTFSIngest:
         feed_type: str,
         feed_name: Optional[str] = None,
         timestamp_override: Optional[str] = None,
+        deadline: Optional[float] = None,
+        retry_budget: Optional[RetryBudget] = None,
     ) -> bool:
         """
         Ingest a single GTFS-RT feed.
@@ -243,46 +644,195 @@ class GTFSIngest:
             feed_url: URL of the GTFS-RT feed
             feed_type: Type of feed (trip_updates, vehicle_positions)
             timestamp_override: Optional timestamp string (YYYYMMDD_HHMMSS) shared across feeds
+            deadline: Optional ``time.monotonic()`` value after which no fetch retry starts
+            retry_budget: Optional retry budget shared across the cycle
             
         Returns:
             True if ingestion was successful, False otherwise
         """
         try:
-            # Fetch data
-            raw_data = await self.fetch_gtfs_rt_data(feed_url)
+            # Fetch data; unchanged feeds cost one round trip and nothing else
+            raw_data, unchanged = await self.fetch_gtfs_rt_data_if_modified(
+                feed_url, deadline=deadline, retry_budget=retry_budget
+            )
+            timestamp = timestamp_override or datetime.now().strftime('%Y%m%d_%H%M%S')
+            if unchanged:
+                await self.db_manager.record_seen_again(
+                    feed_type, timestamp, "not_modified", feed_name=feed_name
+                )
+                return True
             if not raw_data:
                 return False
-            timestamp = timestamp_override or datetime.now().strftime('%Y%m%d_%H%M%S')
+
+            # Skip snapshots already ingested a few polls ago (same bytes or header timestamp)
+            feed_key = f"{feed_type}:{feed_url}"
+            digest = self.snapshot_dedup.digest(raw_data)
+            header_timestamp = peek_header_timestamp(raw_data)
+            if self.snapshot_dedup.is_duplicate(feed_key, digest, header_timestamp):
+                self.logger.info(
+                    f"Duplicate {feed_type} snapshot (header timestamp {header_timestamp}) from {feed_url}"
+                )
+                await self.db_manager.record_seen_again(
+                    feed_type,
+                    timestamp,
+                    "duplicate",
+                    feed_name=feed_name,
+                    header_timestamp=header_timestamp,
+                    digest=digest,
+                )
+                return True
             
-            # Parse protobuf data
-            parsed_data = self.parse_gtfs_rt_data(raw_data, feed_type)
+            # Parse protobuf data off the event loop (columnar when the sink takes Arrow batches)
+            parsed_data = await self.parse_gtfs_rt_data_offloaded(
+                raw_data, feed_type, columnar=self.db_manager.columnar
+            )
             if not parsed_data:
+                self.validator_cache.invalidate(feed_url)
                 return False
-            parsed_data['feed_url'] = feed_url
-            if feed_name:
-                parsed_data['feed_name'] = feed_name
+            await self.prepare_parsed(parsed_data, feed_type, feed_url, feed_name)
             
+            store_kwargs = {
+                'data': parsed_data,
+                'feed_url': feed_url,
+                'raw_bytes': raw_data,
+                'timestamp': timestamp,
+                'feed_name': feed_name,
+            }
+            if self.write_buffer is not None:
+                # Stored by the next write-behind flush; dedup/validator bookkeeping follows its outcome.
+                await self.write_buffer.put(
+                    PendingSnapshot(
+                        store_kwargs,
+                        on_stored=functools.partial(
+                            self.snapshot_dedup.remember, feed_key, digest, header_timestamp
+                        ),
+                        on_failed=functools.partial(self._store_failed, feed_key, feed_url),
+                    )
+                )
+                name_suffix = f" ({feed_name})" if feed_name else ""
+                self.logger.info(f"Queued {feed_type}{name_suffix} from {feed_url} for storage")
+                return True
+
             # Store in database
-            success = await self.db_manager.store_gtfs_rt_data(
-                parsed_data,
-                feed_url,
-                raw_bytes=raw_data,
-                timestamp=timestamp,
-                feed_name=feed_name,
-            )
+            success = await self.db_manager.store_gtfs_rt_data(**store_kwargs)
             
             if success:
+                self.snapshot_dedup.remember(feed_key, digest, header_timestamp)
                 name_suffix = f" ({feed_name})" if feed_name else ""
                 self.logger.info(f"Successfully ingested {feed_type}{name_suffix} from {feed_url}")
             else:
                 name_suffix = f" ({feed_name})" if feed_name else ""
                 self.logger.error(f"Failed to store {feed_type}{name_suffix} data from {feed_url}")
+                self._store_failed(feed_key, feed_url)
             
             return success
             
         except Exception as e:
             self.logger.error(f"Error ingesting {feed_type} from {feed_url}: {e}")
+            self._store_failed(f"{feed_type}:{feed_url}", feed_url)
             return False
+
+    async def prepare_parsed(
+        self,
+        parsed_data: Dict,
+        feed_type: str,
+        feed_url: str,
+        feed_name: Optional[str] = None,
+        now: Optional[float] = None,
+        timestamp: Optional[str] = None,
+    ) -> Dict:
+        """
+        Everything between parsing a snapshot and storing it; shared by live ingestion and replay.
+
+        Args:
+            parsed_data: Parsed snapshot, updated in place
+            feed_type: Type of feed (trip_updates, vehicle_positions)
+            feed_url: URL of the GTFS-RT feed
+            feed_name: Feed label
+            now: Unix time of the poll for delta keyframes (defaults to now)
+            timestamp: Poll timestamp (YYYYMMDD_HHMMSS); trip updates are joined to the static
+                version current at that time instead of the latest one
+
+        Returns:
+            ``parsed_data``
+        """
+        parsed_data['feed_url'] = feed_url
+        if feed_name:
+            parsed_data['feed_name'] = feed_name
+        if self.config.schedule_delays and feed_name and feed_type == 'trip_updates':
+            # Resolved before the join: the schedule index pulls in NumPy/pandas/pyarrow.
+            if timestamp:
+                version = self.static_registry.version_at(feed_name, timestamp)
+            else:
+                version = self.static_registry.current(feed_name)
+            if version is not None:
+                await self._join_schedule_offloaded(feed_name, parsed_data, version)
+        if self.vehicle_delta is not None and feed_type == 'vehicle_positions':
+            # Only vehicles that changed since the previous poll (plus periodic keyframes) are stored.
+            self.vehicle_delta.encode(f"{feed_type}:{feed_url}", parsed_data, now=now)
+        return parsed_data
+
+    async def _join_schedule_offloaded(
+        self, feed_name: str, parsed_data: Dict, version: StaticFeedVersion
+    ) -> None:
+        """Run the schedule join on the parse executor (inline when none is configured)."""
+        if isinstance(self.parse_executor, ProcessPoolExecutor):
+            # The join updates parsed_data in place and reads this process's index cache,
+            # so it cannot be shipped to a worker process; it runs on a thread instead.
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._join_schedule, feed_name, parsed_data, version
+            )
+            return
+        await self._offload(self._join_schedule, feed_name, parsed_data, version)
+
+    def _join_schedule(self, feed_name: str, parsed_data: Dict, version: StaticFeedVersion) -> None:
+        """
+        Join a trip update snapshot to a static version of the feed (runs on the parse executor).
+
+        Fills delays the feed left out from its predicted times and records in
+        ``unscheduled_trips`` how many dated trips do not run on their start date.
+        """
+        try:
+            if self.schedule_indexes is None:
+                from .schedule_index import ScheduleIndexCache
+
+                self.schedule_indexes = ScheduleIndexCache(self.static_registry)
+            index = self.schedule_indexes.get(feed_name, version)
+            if index is None:
+                return
+            from .schedule_index import fill_stop_time_delays
+
+            if parsed_data.get('stop_time_updates'):
+                parsed_data['stop_time_updates'] = fill_stop_time_delays(index, parsed_data['stop_time_updates'])
+
+            calendar = self.schedule_indexes.calendar(feed_name, version)
+            trips = parsed_data.get('trip_updates')
+            if calendar is None or not trips:
+                return
+            if hasattr(trips, 'column'):
+                trip_ids, start_dates = trips.column('trip_id').to_pylist(), trips.column('start_date').to_pylist()
+            else:
+                trip_ids = [trip['trip_id'] for trip in trips]
+                start_dates = [trip['start_date'] for trip in trips]
+            # Trips without a start_date cannot be checked against the calendar.
+            dated = [(t, d) for t, d in zip(trip_ids, start_dates) if d]
+            trip_ids, start_dates = [t for t, _ in dated], [d for _, d in dated]
+            unscheduled = int((~calendar.scheduled_mask(index, trip_ids, start_dates)).sum())
+            parsed_data['unscheduled_trips'] = unscheduled
+            if unscheduled:
+                self.logger.info(
+                    f"{unscheduled} of {len(trip_ids)} trip updates ({feed_name}) are not scheduled on their start date"
+                )
+        except Exception as e:
+            self.logger.warning(f"Schedule join failed for {feed_name}: {e}")
+
+    def _store_failed(self, feed_key: str, feed_url: str) -> None:
+        """Undo per-feed state that assumed a snapshot would be stored."""
+        # Never let a failed store be mistaken for "already ingested" next poll.
+        self.validator_cache.invalidate(feed_url)
+        if self.vehicle_delta is not None:
+            # The stored deltas now have a gap; restart the feed with a keyframe.
+            self.vehicle_delta.reset(feed_key)
     
     # Handle the static GTFS bundle ingestion once per run.
     async def ingest_gtfs_static(self) -> Dict[str, bool]:
@@ -301,15 +851,58 @@ class GTFSIngest:
         return results
 
     async def _ingest_single_static(self, feed_name: str, feed_url: str) -> bool:
-        """Fetch and persist a single GTFS Static feed."""
+        """Fetch and persist a single GTFS Static feed, skipping unchanged bundles."""
         self.logger.info(f"Fetching GTFS Static data ({feed_name}) from: {feed_url}")
 
-        fetch_result = await self.fetch_gtfs_static_data(feed_url)
-        if not fetch_result:
+        current = self.static_registry.current(feed_name)
+        headers: Dict[str, str] = {}
+        if current is not None and current.feed_url == feed_url and Path(current.artifact).exists():
+            if current.etag:
+                headers['If-None-Match'] = current.etag
+            if current.last_modified:
+                headers['If-Modified-Since'] = current.last_modified
+
+        raw_zip, not_modified, validators = await self.download_gtfs_static_zip(feed_url, headers=headers)
+        if not_modified and not headers:
+            # A 304 to an unconditional request (e.g. from a cache) leaves no version to reuse.
+            self.logger.warning(
+                f"GTFS Static ({feed_name}) answered 304 without a stored version; downloading again"
+            )
+            raw_zip, not_modified, validators = await self.download_gtfs_static_zip(
+                feed_url, headers={'Cache-Control': 'no-cache'}
+            )
+            if not_modified:
+                self.logger.error(f"GTFS Static ({feed_name}) keeps answering 304 with no stored version")
+                return False
+        if not_modified:
+            self.logger.info(
+                f"GTFS Static ({feed_name}) unchanged (HTTP 304); reusing version "
+                f"{current.version_id} at {current.artifact}"
+            )
+            return True
+        if raw_zip is None:
             self.logger.error(f"Failed to fetch GTFS Static data ({feed_name}) from {feed_url}")
             return False
 
-        gtfs_data, raw_zip = fetch_result
+        content_hash = static_content_hash(raw_zip)
+        feed_version = read_feed_version(raw_zip)
+        unchanged = self.static_registry.find_unchanged(feed_name, content_hash)
+        if unchanged is not None:
+            self.logger.info(
+                f"GTFS Static ({feed_name}) content unchanged (feed_version={feed_version}); "
+                f"reusing version {unchanged.version_id} at {unchanged.artifact}"
+            )
+            # Keep the newest validators so the next run can use a conditional GET.
+            unchanged.etag = validators.get('etag')
+            unchanged.last_modified = validators.get('last_modified')
+            self.static_registry.register(unchanged)
+            return True
+
+        try:
+            gtfs_data = await self.parse_gtfs_static_zip_offloaded(raw_zip)
+        except Exception as e:
+            self.logger.error(f"Error parsing GTFS Static data ({feed_name}) from {feed_url}: {e}")
+            return False
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
         success = await self.db_manager.store_gtfs_static_data(
@@ -321,20 +914,44 @@ class GTFSIngest:
         )
 
         if success:
-            self.logger.info(f"Successfully ingested GTFS Static data ({feed_name}) from {feed_url}")
+            self.static_registry.register(
+                StaticFeedVersion(
+                    feed_name=feed_name,
+                    feed_url=feed_url,
+                    content_hash=content_hash,
+                    version_id=timestamp,
+                    artifact=str(self.db_manager.static_artifact_path(feed_url, timestamp, feed_name)),
+                    feed_version=feed_version,
+                    etag=validators.get('etag'),
+                    last_modified=validators.get('last_modified'),
+                )
+            )
+            self.logger.info(
+                f"Successfully ingested GTFS Static data ({feed_name}, feed_version={feed_version}) "
+                f"from {feed_url}"
+            )
         else:
             self.logger.error(f"Failed to store GTFS Static data ({feed_name}) from {feed_url}")
 
         return success
 
     # Pull only the configured real-time feeds.
-    async def ingest_realtime_feeds(self, feed_types: Optional[List[str]] = None) -> Dict[str, bool]:
+    async def ingest_realtime_feeds(
+        self,
+        feed_types: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, bool]:
         """
         Ingest configured GTFS-RT feeds.
 
+        All feeds of the cycle share one retry budget, so a struggling upstream
+        cannot multiply the cycle's request volume.
+
         Args:
             feed_types: Optional list of feed types to ingest. When omitted, all configured
                         feed types are ingested.
+            deadline: Optional ``time.monotonic()`` value after which no fetch retry starts
+                      (typically the start of the next cycle).
 
         Returns:
             Dictionary mapping feed URLs to success status.
@@ -343,8 +960,9 @@ class GTFSIngest:
         selected_feed_types = set(feed_types) if feed_types else set(self.config.feeds.keys())
 
         tasks: List[asyncio.Task] = []
-        feed_order: List[Tuple[str, str]] = []
+        feed_order: List[Tuple[str, str, str]] = []
         cycle_timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        retry_budget = RetryBudget(self.config.retry_budget_per_cycle)
 
         for feed_type, feed_urls in self.config.feeds.items():
             if feed_type not in selected_feed_types:
@@ -359,6 +977,8 @@ class GTFSIngest:
                             feed_type,
                             feed_name=feed_name,
                             timestamp_override=cycle_timestamp,
+                            deadline=deadline,
+                            retry_budget=retry_budget,
                         )
                     )
                 )
@@ -367,6 +987,10 @@ class GTFSIngest:
             return results
 
         task_results = await asyncio.gather(*tasks, return_exceptions=True)
+        if self.write_buffer is None:
+            await self.db_manager.end_cycle()
+        # Partitions that received nothing this cycle are flushed by age here, not on append.
+        await self.db_manager.flush_aged()
 
         for (feed_type, feed_url, feed_name), task_result in zip(feed_order, task_results):
             if isinstance(task_result, Exception):
@@ -405,15 +1029,20 @@ class GTFSIngest:
         interval: int = 60,
         feed_types: Optional[List[str]] = None,
         include_static_on_first_cycle: bool = False,
+        align_to_wall_clock: bool = False,
     ) -> None:
         """
         Run continuous ingestion loop for GTFS real-time feeds.
 
+        The loop returns after the in-flight cycle once ``request_stop`` is called.
+
         Args:
             interval: Seconds to wait between ingestion cycles.
             feed_types: Optional list of feed types to ingest (defaults to all configured).
             include_static_on_first_cycle: When True, fetch GTFS static data before the first
                                            real-time ingestion cycle.
+            align_to_wall_clock: When True, cycles start on multiples of ``interval``
+                                 seconds of wall-clock time (e.g. :00, :20, :40).
         """
         selected = ", ".join(feed_types) if feed_types else "all configured real-time"
         self.logger.info(
@@ -421,7 +1050,10 @@ class GTFSIngest:
         )
 
         first_cycle = True
-        while True:
+        if align_to_wall_clock:
+            await self._sleep_unless_stopped(self._seconds_to_boundary(interval))
+
+        while not self.stop_requested:
             try:
                 cycle_started = time.monotonic()
                 cycle_results: Dict[str, bool] = {}
@@ -429,21 +1061,31 @@ class GTFSIngest:
                 if include_static_on_first_cycle and first_cycle:
                     cycle_results.update(await self.ingest_gtfs_static())
 
-                realtime_results = await self.ingest_realtime_feeds(feed_types=feed_types)
+                realtime_results = await self.ingest_realtime_feeds(
+                    feed_types=feed_types, deadline=cycle_started + interval
+                )
                 cycle_results.update(realtime_results)
 
                 successful = sum(1 for success in cycle_results.values() if success)
                 total = len(cycle_results)
+                elapsed = time.monotonic() - cycle_started
                 self.logger.info(
-                    f"Real-time ingestion cycle completed: {successful}/{total} feeds successful"
+                    f"Real-time ingestion cycle completed: {successful}/{total} feeds successful "
+                    f"in {elapsed:.3f}s"
                 )
 
                 first_cycle = False
-                elapsed = time.monotonic() - cycle_started
-                sleep_for = max(0.0, interval - elapsed)
-                if sleep_for > 0:
+                if align_to_wall_clock:
+                    sleep_for = self._seconds_to_boundary(interval)
+                else:
+                    sleep_for = max(0.0, interval - elapsed)
+                if elapsed > interval:
+                    self.logger.warning(
+                        f"Real-time cycle overran the {interval}s interval ({elapsed:.2f}s)"
+                    )
+                if sleep_for > 0 and not self.stop_requested:
                     self.logger.info(f"Waiting {sleep_for:.2f} seconds until next real-time cycle...")
-                    await asyncio.sleep(sleep_for)
+                    await self._sleep_unless_stopped(sleep_for)
 
             except KeyboardInterrupt:
                 self.logger.info("Continuous real-time ingestion stopped by user")
@@ -451,7 +1093,15 @@ class GTFSIngest:
             except Exception as e:
                 self.logger.error(f"Error in continuous real-time ingestion cycle: {e}")
                 self.logger.info(f"Waiting {interval} seconds before retry...")
-                await asyncio.sleep(interval)
+                await self._sleep_unless_stopped(interval)
+
+        self.logger.info("Continuous real-time ingestion stopped")
+
+    @staticmethod
+    def _seconds_to_boundary(interval: float) -> float:
+        """Seconds until the next wall-clock multiple of ``interval``."""
+        now = time.time()
+        return (math.floor(now / interval) + 1) * interval - now
     
     # Keep ingesting on a schedule until cancelled.
     async def continuous_ingestion(self, interval: int = 60) -> None:
@@ -463,7 +1113,7 @@ class GTFSIngest:
         """
         self.logger.info(f"Starting continuous ingestion with {interval}s intervals")
         
-        while True:
+        while not self.stop_requested:
             try:
                 self.logger.info("Starting ingestion cycle")
                 results = await self.ingest_all_feeds()
@@ -473,7 +1123,7 @@ class GTFSIngest:
                 
                 # Wait for next cycle
                 self.logger.info(f"Waiting {interval} seconds until next cycle...")
-                await asyncio.sleep(interval)
+                await self._sleep_unless_stopped(interval)
                 
             except KeyboardInterrupt:
                 self.logger.info("Continuous ingestion stopped by user")
@@ -481,17 +1131,21 @@ class GTFSIngest:
             except Exception as e:
                 self.logger.error(f"Error in continuous ingestion cycle: {e}")
                 self.logger.info(f"Waiting {interval} seconds before retry...")
-                await asyncio.sleep(interval)
+                await self._sleep_unless_stopped(interval)
 
 # Provide a CLI-style entry point when the module is executed directly.
 async def main():
     """Main function for running GTFS-RT ingestion."""
     config = GTFSConfig()
-    db_manager = DatabaseManager(config.database)
+    db_manager = DatabaseManager(config.database, data_directory=config.data_directory)
+    await db_manager.initialize()
     
-    async with GTFSIngest(config, db_manager) as ingest:
-        results = await ingest.ingest_all_feeds()
-        print(f"Ingestion completed: {sum(results.values())}/{len(results)} feeds successful")
+    try:
+        async with GTFSIngest(config, db_manager) as ingest:
+            results = await ingest.ingest_all_feeds()
+            print(f"Ingestion completed: {sum(results.values())}/{len(results)} feeds successful")
+    finally:
+        await db_manager.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,329 @@
+"""
+Columnar Parquet sink for GTFS-RT snapshots.
+
+Rows from every poll are appended to typed, compressed Parquet datasets under
+``<data_directory>/bronze`` partitioned by feed name and service date:
+
+    bronze/<dataset>/feed=<feed_name>/date=<YYYY-MM-DD>/part-<opened>-<pid>-<seq>.parquet
+
+Each partition buffers rows in memory until a row-count or age threshold is
+reached, at which point the buffer is written as one complete file. A crash
+therefore loses at most one flush window, never a whole day. Files are written
+under a hidden ``.inprogress`` name and renamed once complete so readers never
+see a file without footer; ``retention`` merges a closed day's files into one.
+"""
+
+import itertools
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+_UTC_SECONDS = pa.timestamp("s", tz="UTC")
+
+# Columns shared by every RT dataset; ``fetched_at`` is the local (JST) cycle time.
+_COMMON_FIELDS = [
+    pa.field("fetched_at", pa.timestamp("s")),
+    pa.field("feed_timestamp", _UTC_SECONDS),
+]
+
+RT_SCHEMAS: Dict[str, pa.Schema] = {
+    "trip_updates": pa.schema(_COMMON_FIELDS + [
+        pa.field("trip_id", pa.string()),
+        pa.field("route_id", pa.string()),
+        pa.field("direction_id", pa.int8()),
+        pa.field("start_time", pa.string()),
+        pa.field("start_date", pa.string()),
+        pa.field("vehicle_id", pa.string()),
+        pa.field("timestamp", _UTC_SECONDS),
+        pa.field("delay", pa.int32()),
+    ]),
+    "vehicle_positions": pa.schema(_COMMON_FIELDS + [
+        pa.field("vehicle_id", pa.string()),
+        pa.field("trip_id", pa.string()),
+        pa.field("route_id", pa.string()),
+        pa.field("direction_id", pa.int8()),
+        pa.field("start_time", pa.string()),
+        pa.field("start_date", pa.string()),
+        pa.field("current_stop_sequence", pa.int32()),
+        pa.field("current_status", pa.int8()),
+        pa.field("timestamp", _UTC_SECONDS),
+        pa.field("latitude", pa.float32()),
+        pa.field("longitude", pa.float32()),
+        pa.field("bearing", pa.float32()),
+        pa.field("speed", pa.float32()),
+        # Set by ``vehicle_delta`` in delta mode (0 keyframe, 1 changed, 2 removed); null otherwise.
+        pa.field("delta_kind", pa.int8()),
+    ]),
+    "stop_time_updates": pa.schema(_COMMON_FIELDS + [
+        pa.field("trip_id", pa.string()),
+        pa.field("start_date", pa.string()),
+        pa.field("route_id", pa.string()),
+        pa.field("stop_sequence", pa.int32()),
+        pa.field("stop_id", pa.string()),
+        pa.field("arrival_delay", pa.int32()),
+        pa.field("arrival_time", _UTC_SECONDS),
+        pa.field("departure_delay", pa.int32()),
+        pa.field("departure_time", _UTC_SECONDS),
+        pa.field("schedule_relationship", pa.int8()),
+        pa.field("timestamp", _UTC_SECONDS),
+    ]),
+}
+
+
+def snapshot_tables(data: Dict[str, Any], fetched_at: datetime) -> Dict[str, pa.Table]:
+    """
+    Convert one parsed GTFS-RT snapshot into typed tables of ``RT_SCHEMAS``.
+
+    Args:
+        data: Parsed snapshot as returned by ``GTFSIngest.parse_gtfs_rt_data`` or
+              ``columnar_decoder.decode_feed``; each dataset is a list of records,
+              a column name -> values mapping or a record batch
+        fetched_at: Cycle time (local) stored in every row
+
+    Returns:
+        Non-empty tables keyed by dataset name
+    """
+    tables: Dict[str, pa.Table] = {}
+    for dataset, schema in RT_SCHEMAS.items():
+        records = data.get(dataset)
+        if not records:
+            continue
+        if isinstance(records, pa.RecordBatch):
+            table = ParquetRTSink._batch_to_table(records, schema, fetched_at, data.get("timestamp"))
+        elif isinstance(records, dict):
+            table = ParquetRTSink._columns_to_table(records, schema, fetched_at, data.get("timestamp"))
+        else:
+            table = ParquetRTSink._to_table(records, schema, fetched_at, data.get("timestamp"))
+        if table.num_rows:
+            tables[dataset] = table
+    return tables
+
+
+class _PartitionWriter:
+    """In-memory buffer of one partition, written out as one file per flush."""
+
+    def __init__(self, directory: Path, schema: pa.Schema, compression: str):
+        self.directory = directory
+        self.schema = schema
+        self.compression = compression
+        self.buffer: List[pa.Table] = []
+        self.buffered_rows = 0
+        self.opened: Optional[datetime] = None
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+        self.files_written = 0
+
+    def append(self, table: pa.Table) -> None:
+        if not self.buffer:
+            self.opened = datetime.now()
+        self.buffer.append(table)
+        self.buffered_rows += table.num_rows
+
+    def flush(self, sequence: int) -> Optional[Path]:
+        """Write the buffer as one finished file; returns its path (None when empty)."""
+        path = None
+        if self.buffer:
+            table = pa.concat_tables(self.buffer)
+            name = f"part-{self.opened:%Y%m%d_%H%M%S}-{os.getpid()}-{sequence}.parquet"
+            path = self.directory / name
+            # Dot prefix hides the partial file from pyarrow dataset discovery.
+            tmp_path = path.with_name(f".{name}.inprogress")
+            pq.write_table(table, str(tmp_path), row_group_size=max(table.num_rows, 1),
+                           compression=self.compression)
+            os.replace(tmp_path, path)
+            self.rows_written += table.num_rows
+            self.files_written += 1
+        self.buffer = []
+        self.buffered_rows = 0
+        self.last_flush = time.monotonic()
+        return path
+
+
+class ParquetRTSink:
+    """
+    Append GTFS-RT rows into date/feed-partitioned Parquet datasets.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        row_group_rows: int = 50_000,
+        flush_interval: float = 300.0,
+        compression: str = "zstd",
+    ):
+        """
+        Initialize the sink.
+
+        Args:
+            root: Bronze directory that holds one sub-directory per dataset
+            row_group_rows: Buffered rows per partition that trigger a flush to a new file
+            flush_interval: Seconds after which a partition buffer is flushed regardless of size
+            compression: Parquet compression codec
+        """
+        self.root = Path(root)
+        self.row_group_rows = row_group_rows
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.logger = logging.getLogger(__name__)
+        self._writers: Dict[Tuple[str, str, str], _PartitionWriter] = {}
+        # Keeps names unique when one partition flushes twice within a second.
+        self._sequence = itertools.count()
+
+    def append_snapshot(
+        self,
+        data: Dict[str, Any],
+        timestamp: str,
+        feed_name: str,
+    ) -> int:
+        """
+        Append the rows of one parsed GTFS-RT snapshot.
+
+        Args:
+            data: Parsed snapshot as returned by ``GTFSIngest.parse_gtfs_rt_data`` or
+                  ``columnar_decoder.decode_feed``; each dataset is a list of records,
+                  a column name -> values mapping or a record batch
+            timestamp: Cycle timestamp (YYYYMMDD_HHMMSS, local time)
+            feed_name: Feed label used as partition key
+
+        Returns:
+            Number of rows appended across all datasets
+        """
+        fetched_at = datetime.strptime(timestamp, "%Y%m%d_%H%M%S")
+        appended = 0
+        for dataset, table in snapshot_tables(data, fetched_at).items():
+            self.append_table(dataset, feed_name, fetched_at, table)
+            appended += table.num_rows
+        return appended
+
+    def append_table(
+        self,
+        dataset: str,
+        feed_name: str,
+        fetched_at: datetime,
+        table: pa.Table,
+    ) -> None:
+        """Append an already typed table to the partition for ``fetched_at``."""
+        partition = self._partition_writer(dataset, feed_name, fetched_at.strftime("%Y-%m-%d"))
+        partition.append(table)
+        self._maybe_flush(partition)
+
+    def flush(self) -> None:
+        """Write every buffered partition to a finished file."""
+        for partition in self._writers.values():
+            self._flush(partition)
+
+    def flush_aged(self) -> None:
+        """Flush partitions buffered for ``flush_interval``, including ones that stopped receiving rows."""
+        for partition in self._writers.values():
+            if partition.buffer and time.monotonic() - partition.last_flush >= self.flush_interval:
+                self._flush(partition)
+
+    def close(self) -> None:
+        """Flush every partition and forget them."""
+        for key, partition in list(self._writers.items()):
+            try:
+                self._flush(partition)
+                if partition.rows_written:
+                    self.logger.info(
+                        f"Parquet partition closed: {partition.directory} "
+                        f"({partition.rows_written} rows in {partition.files_written} files)"
+                    )
+            except Exception as e:
+                self.logger.error(f"Error closing Parquet partition {partition.directory}: {e}")
+            del self._writers[key]
+
+    def _partition_writer(self, dataset: str, feed_name: str, date: str) -> _PartitionWriter:
+        key = (dataset, feed_name, date)
+        partition = self._writers.get(key)
+        if partition is not None:
+            return partition
+
+        # A new service date for this feed means the previous day's buffer is complete.
+        for stale_key in [k for k in self._writers if k[:2] == key[:2]]:
+            self._flush(self._writers.pop(stale_key))
+
+        directory = self.root / dataset / f"feed={feed_name}" / f"date={date}"
+        directory.mkdir(parents=True, exist_ok=True)
+        partition = _PartitionWriter(directory, RT_SCHEMAS[dataset], self.compression)
+        self._writers[key] = partition
+        return partition
+
+    def _flush(self, partition: _PartitionWriter) -> None:
+        rows = partition.buffered_rows
+        path = partition.flush(next(self._sequence))
+        if path is not None:
+            self.logger.debug(f"Wrote {rows} rows to {path}")
+
+    def _maybe_flush(self, partition: _PartitionWriter) -> None:
+        age = time.monotonic() - partition.last_flush
+        if partition.buffered_rows >= self.row_group_rows or age >= self.flush_interval:
+            self._flush(partition)
+
+    @staticmethod
+    def _to_table(
+        records: List[Dict[str, Any]],
+        schema: pa.Schema,
+        fetched_at: datetime,
+        feed_timestamp: Optional[int],
+    ) -> pa.Table:
+        columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+        for record in records:
+            position = record.get("position") or {}
+            for name in schema.names:
+                if name in ("latitude", "longitude", "bearing", "speed"):
+                    columns[name].append(position.get(name))
+                elif name == "fetched_at":
+                    columns[name].append(fetched_at)
+                elif name == "feed_timestamp":
+                    columns[name].append(feed_timestamp or None)
+                elif name == "timestamp":
+                    # Protobuf reports an unset timestamp as 0.
+                    columns[name].append(record.get(name) or None)
+                else:
+                    columns[name].append(record.get(name))
+        return pa.Table.from_pydict(columns, schema=schema)
+
+    @staticmethod
+    def _columns_to_table(
+        columns: Dict[str, List[Any]],
+        schema: pa.Schema,
+        fetched_at: datetime,
+        feed_timestamp: Optional[int],
+    ) -> pa.Table:
+        num_rows = len(next(iter(columns.values()), []))
+        arrays = {name: [None] * num_rows for name in schema.names}
+        arrays.update(columns)
+        arrays["fetched_at"] = [fetched_at] * num_rows
+        arrays["feed_timestamp"] = [feed_timestamp or None] * num_rows
+        if "timestamp" in arrays:
+            arrays["timestamp"] = [value or None for value in arrays["timestamp"]]
+        return pa.Table.from_pydict({name: arrays[name] for name in schema.names}, schema=schema)
+
+    @staticmethod
+    def _batch_to_table(
+        batch: pa.RecordBatch,
+        schema: pa.Schema,
+        fetched_at: datetime,
+        feed_timestamp: Optional[int],
+    ) -> pa.Table:
+        num_rows = batch.num_rows
+        common = {
+            "fetched_at": pa.array([fetched_at] * num_rows, schema.field("fetched_at").type),
+            "feed_timestamp": pa.array(
+                [feed_timestamp or None] * num_rows, pa.int64()
+            ).cast(schema.field("feed_timestamp").type),
+        }
+        arrays = [
+            common[name] if name in common
+            else batch.column(name) if name in batch.schema.names
+            else pa.nulls(num_rows, schema.field(name).type)
+            for name in schema.names
+        ]
+        return pa.Table.from_arrays(arrays, schema=schema)
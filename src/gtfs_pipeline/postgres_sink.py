@@ -0,0 +1,179 @@
+"""
+PostgreSQL sink for GTFS-RT snapshots.
+
+Rows go into one table per dataset (``trip_updates``, ``stop_time_updates``,
+``vehicle_positions``) in the ``gtfs_rt`` schema. Columns mirror
+``parquet_sink.RT_SCHEMAS`` plus ``feed_name``; every table is range
+partitioned by ``fetched_at`` with one partition per day, created on first
+use, so time-bounded queries only touch the days they need and a day can be
+removed by dropping its partition (the ``compact`` retention job does not). Snapshots are written with one ``COPY`` per dataset inside a
+single transaction on a pooled asyncpg connection, one snapshot at a time or
+a whole write-behind batch at once.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import asyncpg
+import pyarrow as pa
+
+from .config import DatabaseConfig
+from .parquet_sink import RT_SCHEMAS, snapshot_tables
+
+
+_PG_TYPES = {
+    pa.string(): "text",
+    pa.int8(): "smallint",
+    pa.int32(): "integer",
+    pa.float32(): "real",
+    pa.timestamp("s"): "timestamp",
+    pa.timestamp("s", tz="UTC"): "timestamptz",
+}
+
+# Secondary indexes per dataset; created on the parent and inherited by every partition.
+INDEXES: Dict[str, List[Tuple[str, ...]]] = {
+    "trip_updates": [("route_id", "trip_id", "fetched_at"), ("feed_name", "fetched_at")],
+    "stop_time_updates": [("trip_id", "start_date", "stop_sequence"), ("stop_id", "fetched_at")],
+    "vehicle_positions": [("route_id", "trip_id", "fetched_at"), ("vehicle_id", "fetched_at")],
+}
+
+
+def table_ddl(schema_name: str, dataset: str) -> List[str]:
+    """Statements creating the partitioned parent table of ``dataset`` and its indexes."""
+    columns = ["feed_name text NOT NULL"] + [
+        f"{field.name} {_PG_TYPES[field.type]}" for field in RT_SCHEMAS[dataset]
+    ]
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS {schema_name}.{dataset} ({', '.join(columns)}) "
+        f"PARTITION BY RANGE (fetched_at)"
+    ]
+    # Tables created before a column was added to RT_SCHEMAS (e.g. ``delta_kind``) gain it here.
+    statements.extend(
+        f"ALTER TABLE {schema_name}.{dataset} ADD COLUMN IF NOT EXISTS {field.name} {_PG_TYPES[field.type]}"
+        for field in RT_SCHEMAS[dataset]
+    )
+    for columns in INDEXES[dataset]:
+        name = f"{dataset}_{'_'.join(columns)}_idx"
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {schema_name}.{dataset} ({', '.join(columns)})"
+        )
+    return statements
+
+
+def partition_ddl(schema_name: str, dataset: str, day: date) -> str:
+    """Statement creating the daily partition of ``dataset`` for ``day``."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {schema_name}.{dataset}_{day:%Y%m%d} "
+        f"PARTITION OF {schema_name}.{dataset} "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+class PostgresRTSink:
+    """
+    Append GTFS-RT rows into daily-partitioned PostgreSQL tables.
+    """
+
+    def __init__(self, config: DatabaseConfig, dsn: Optional[str] = None, schema_name: str = "gtfs_rt"):
+        """
+        Initialize the sink.
+
+        Args:
+            config: Connection and pool settings
+            dsn: Optional connection URI overriding host/port/database/credentials
+            schema_name: PostgreSQL schema holding the tables
+        """
+        self.config = config
+        self.dsn = dsn
+        self.schema_name = schema_name
+        self.logger = logging.getLogger(__name__)
+        self.pool: Optional[asyncpg.Pool] = None
+        self._partitions: Set[Tuple[str, date]] = set()
+
+    async def open(self) -> None:
+        """Create the connection pool and the parent tables."""
+        self.pool = await asyncpg.create_pool(
+            dsn=self.dsn,
+            host=None if self.dsn else self.config.host,
+            port=None if self.dsn else self.config.port,
+            database=None if self.dsn else self.config.database,
+            user=None if self.dsn else self.config.username,
+            password=None if self.dsn else (self.config.password or None),
+            min_size=min(2, self.config.pool_size),
+            max_size=self.config.pool_size + self.config.max_overflow,
+        )
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema_name}")
+                for dataset in RT_SCHEMAS:
+                    for statement in table_ddl(self.schema_name, dataset):
+                        await conn.execute(statement)
+
+    async def _ensure_partition(self, conn: asyncpg.Connection, dataset: str, day: date) -> None:
+        if (dataset, day) in self._partitions:
+            return
+        try:
+            await conn.execute(partition_ddl(self.schema_name, dataset, day))
+        except asyncpg.exceptions.DuplicateTableError:
+            pass  # created concurrently by another writer
+        self._partitions.add((dataset, day))
+
+    async def append_snapshot(self, data: Dict[str, Any], timestamp: str, feed_name: str) -> int:
+        """
+        Append the rows of one parsed GTFS-RT snapshot.
+
+        Args:
+            data: Parsed snapshot (records, column mapping or record batch per dataset)
+            timestamp: Cycle timestamp (YYYYMMDD_HHMMSS, local time)
+            feed_name: Feed label stored in every row
+
+        Returns:
+            Number of rows appended across all datasets
+        """
+        return await self.append_snapshots([(data, timestamp, feed_name)])
+
+    async def append_snapshots(self, snapshots: Sequence[Tuple[Dict[str, Any], str, str]]) -> int:
+        """
+        Append many snapshots with one ``COPY`` per dataset in a single transaction.
+
+        Args:
+            snapshots: ``(data, timestamp, feed_name)`` tuples as for ``append_snapshot``
+
+        Returns:
+            Number of rows appended across all datasets
+        """
+        if self.pool is None:
+            raise RuntimeError("PostgresRTSink.open() has not been called")
+        records: Dict[str, List[Tuple[Any, ...]]] = {}
+        days: Set[Tuple[str, date]] = set()
+        for data, timestamp, feed_name in snapshots:
+            fetched_at = datetime.strptime(timestamp, "%Y%m%d_%H%M%S")
+            for dataset, table in snapshot_tables(data, fetched_at).items():
+                columns = [table.column(name).to_pylist() for name in table.column_names]
+                records.setdefault(dataset, []).extend((feed_name,) + row for row in zip(*columns))
+                days.add((dataset, fetched_at.date()))
+        if not records:
+            return 0
+
+        appended = 0
+        async with self.pool.acquire() as conn:
+            for dataset, day in sorted(days):
+                await self._ensure_partition(conn, dataset, day)
+            # All rows of the batch land together or not at all.
+            async with conn.transaction():
+                for dataset, rows in records.items():
+                    await conn.copy_records_to_table(
+                        dataset,
+                        schema_name=self.schema_name,
+                        columns=["feed_name"] + RT_SCHEMAS[dataset].names,
+                        records=rows,
+                    )
+                    appended += len(rows)
+        return appended
+
+    async def close(self) -> None:
+        """Close the connection pool."""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
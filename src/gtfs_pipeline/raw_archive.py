@@ -0,0 +1,277 @@
+"""
+Append-only segment archive for raw GTFS-RT protobuf payloads.
+
+Instead of one ``.pb`` file per poll and feed, payloads are appended to one
+segment file per feed and day (or hour):
+
+    raw/segments/<feed_type>/<feed_name>/<YYYYMMDD>.seg       # daily
+    raw/segments/<feed_type>/<feed_name>/<YYYYMMDD_HH>.seg    # hourly
+
+Each record is a fixed header (magic, poll timestamp, flags, stored and raw
+length) followed by the payload, optionally zstd-compressed on its own so any
+record can be decoded without its neighbours. A sidecar ``.idx`` file holds
+one fixed-size ``(timestamp, offset)`` entry per record, so a time range is
+found by binary search instead of a scan. The index is only a cache: a record
+missing from it (e.g. after a crash between the two writes) is recovered by
+scanning the segment tail, and a torn trailing record is cut off before the
+next append.
+"""
+
+import bisect
+import logging
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+
+_MAGIC = b"GRT1"
+_RECORD_HEADER = struct.Struct("<4s15sBII")  # magic, timestamp, flags, stored length, raw length
+_INDEX_ENTRY = struct.Struct("<15sQ")  # timestamp, record offset
+_FLAG_ZSTD = 0x01
+
+GRANULARITIES = {"day": 8, "hour": 11}  # segment key = timestamp prefix of this length
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    """Location of one archived payload."""
+    timestamp: str  # YYYYMMDD_HHMMSS, as used by live ingestion
+    offset: int
+
+
+@dataclass(frozen=True)
+class Segment:
+    """One segment file of the archive."""
+    path: Path
+    feed_type: str
+    feed_name: str
+    key: str  # YYYYMMDD or YYYYMMDD_HH
+
+    def covers(self, since: Optional[str], until: Optional[str]) -> bool:
+        """Whether any timestamp in [since, until] can fall into this segment."""
+        if since and self.key < since[:len(self.key)]:
+            return False
+        if until and self.key > until[:len(self.key)]:
+            return False
+        return True
+
+
+def _zstd():
+    # pyarrow ships a zstd codec; only loaded when compression is used.
+    import pyarrow as pa
+
+    return pa.Codec("zstd")
+
+
+def _index_path(segment_path: Path) -> Path:
+    return segment_path.with_suffix(".idx")
+
+
+def _scan(fh: BinaryIO, start: int, end: int) -> Tuple[List[IndexEntry], int]:
+    """Walk complete records in ``[start, end)``; returns them and where the last one ends."""
+    entries: List[IndexEntry] = []
+    offset = start
+    while offset + _RECORD_HEADER.size <= end:
+        fh.seek(offset)
+        magic, timestamp, _, stored_length, _ = _RECORD_HEADER.unpack(fh.read(_RECORD_HEADER.size))
+        record_end = offset + _RECORD_HEADER.size + stored_length
+        if magic != _MAGIC or record_end > end:
+            break
+        entries.append(IndexEntry(timestamp.decode("ascii"), offset))
+        offset = record_end
+    return entries, offset
+
+
+def _load_index(segment_path: Path) -> Tuple[List[IndexEntry], int]:
+    """
+    Read a segment's index, recovering records the index does not know about.
+
+    Returns:
+        Index entries in file order, and the end offset of the last complete record
+    """
+    entries: List[IndexEntry] = []
+    index_path = _index_path(segment_path)
+    if index_path.exists():
+        raw = index_path.read_bytes()
+        usable = len(raw) - len(raw) % _INDEX_ENTRY.size
+        entries = [
+            IndexEntry(timestamp.decode("ascii"), offset)
+            for timestamp, offset in _INDEX_ENTRY.iter_unpack(raw[:usable])
+        ]
+    size = segment_path.stat().st_size
+    with open(segment_path, "rb") as fh:
+        if entries:
+            # Trust the index up to its last entry, then scan whatever follows it.
+            last = entries[-1].offset
+            fh.seek(last)
+            header = fh.read(_RECORD_HEADER.size)
+            if len(header) == _RECORD_HEADER.size and header[:4] == _MAGIC:
+                entries.pop()
+                tail, end = _scan(fh, last, size)
+                return entries + tail, end if tail else last
+            entries = []
+        tail, end = _scan(fh, 0, size)
+    return tail, end
+
+
+def read_index(segment_path: Path) -> List[IndexEntry]:
+    """Return the ``(timestamp, offset)`` entries of a segment in file order."""
+    return _load_index(Path(segment_path))[0]
+
+
+def read_record(segment_path: Path, offset: int) -> bytes:
+    """Read and decompress the payload of the record starting at ``offset``."""
+    with open(segment_path, "rb") as fh:
+        fh.seek(offset)
+        magic, _, flags, stored_length, raw_length = _RECORD_HEADER.unpack(fh.read(_RECORD_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"No archive record at {segment_path}:{offset}")
+        payload = fh.read(stored_length)
+    if flags & _FLAG_ZSTD:
+        return _zstd().decompress(payload, decompressed_size=raw_length).to_pybytes()
+    return payload
+
+
+def parse_segment_path(path: Path) -> Optional[Segment]:
+    """Return the segment described by ``.../<feed_type>/<feed_name>/<key>.seg``."""
+    path = Path(path)
+    if path.suffix != ".seg" or len(path.stem) not in GRANULARITIES.values():
+        return None
+    return Segment(path=path, feed_type=path.parent.parent.name, feed_name=path.parent.name, key=path.stem)
+
+
+class SegmentArchive:
+    """
+    Writer and time-range reader for a segment archive rooted at ``root``.
+
+    Writes are not thread-safe; ``DatabaseManager`` funnels them through its
+    single I/O thread.
+    """
+
+    def __init__(self, root: Path, granularity: str = "day", compression: Optional[str] = None):
+        """
+        Args:
+            root: Archive root (``<data_directory>/raw/segments``)
+            granularity: "day" or "hour" segments
+            compression: None or "zstd" (per record)
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown segment granularity: {granularity}")
+        if compression not in (None, "zstd"):
+            raise ValueError(f"Unknown archive compression: {compression}")
+        self.root = Path(root)
+        self.granularity = granularity
+        self.compression = compression
+        self.logger = logging.getLogger(__name__)
+        self._codec = _zstd() if compression == "zstd" else None
+        # (feed_type, feed_name) -> (segment path, segment handle, index handle)
+        self._open: Dict[Tuple[str, str], Tuple[Path, BinaryIO, BinaryIO]] = {}
+
+    def segment_path(self, feed_type: str, feed_name: str, timestamp: str) -> Path:
+        key = timestamp[:GRANULARITIES[self.granularity]]
+        return self.root / feed_type / feed_name / f"{key}.seg"
+
+    def _handles(self, feed_type: str, feed_name: str, timestamp: str) -> Tuple[BinaryIO, BinaryIO]:
+        path = self.segment_path(feed_type, feed_name, timestamp)
+        current = self._open.get((feed_type, feed_name))
+        if current is not None and current[0] == path:
+            return current[1], current[2]
+        if current is not None:
+            # Rolled over to a new segment.
+            current[1].close()
+            current[2].close()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entries: List[IndexEntry] = []
+        end = 0
+        if path.exists():
+            entries, end = _load_index(path)
+        segment = open(path, "ab")
+        segment.truncate(end)  # drop a torn record left by a crash
+        segment.seek(end)  # tell() still reports the pre-truncate size otherwise
+        # Rewrite the index so it matches the segment exactly before appending.
+        index = open(_index_path(path), "wb")
+        index.write(b"".join(_INDEX_ENTRY.pack(e.timestamp.encode("ascii"), e.offset) for e in entries))
+        index.flush()
+        self._open[(feed_type, feed_name)] = (path, segment, index)
+        return segment, index
+
+    def append(self, feed_type: str, feed_name: str, timestamp: str, payload: bytes) -> Path:
+        """
+        Append one payload to its segment.
+
+        Args:
+            feed_type: Type of feed (trip_updates, vehicle_positions)
+            feed_name: Feed label
+            timestamp: Poll timestamp (YYYYMMDD_HHMMSS)
+            payload: Raw protobuf bytes
+
+        Returns:
+            Path of the segment written to
+        """
+        segment, index = self._handles(feed_type, feed_name, timestamp)
+        flags = 0
+        stored = payload
+        if self._codec is not None:
+            stored = self._codec.compress(payload, asbytes=True)
+            flags |= _FLAG_ZSTD
+        offset = segment.tell()
+        segment.write(_RECORD_HEADER.pack(_MAGIC, timestamp.encode("ascii"), flags, len(stored), len(payload)))
+        segment.write(stored)
+        segment.flush()
+        index.write(_INDEX_ENTRY.pack(timestamp.encode("ascii"), offset))
+        index.flush()
+        return self._open[(feed_type, feed_name)][0]
+
+    def close(self) -> None:
+        for _, segment, index in self._open.values():
+            segment.close()
+            index.close()
+        self._open.clear()
+
+    def segments(
+        self,
+        feed_type: Optional[str] = None,
+        feed_name: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[Segment]:
+        """List segments that may hold polls in [since, until], oldest first."""
+        found = []
+        for path in self.root.glob(f"{feed_type or '*'}/{feed_name or '*'}/*.seg"):
+            segment = parse_segment_path(path)
+            if segment is not None and segment.covers(since, until):
+                found.append(segment)
+        return sorted(found, key=lambda s: (s.key, s.feed_type, s.feed_name))
+
+    def read(
+        self,
+        feed_type: str,
+        feed_name: str,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> Iterator[Tuple[str, bytes]]:
+        """
+        Yield ``(timestamp, payload)`` for one feed's polls in [since, until].
+
+        Bounds are ``YYYYMMDD`` or ``YYYYMMDD_HHMMSS`` prefixes, both inclusive.
+        """
+        for segment in self.segments(feed_type, feed_name, since, until):
+            for entry in entries_in_range(read_index(segment.path), since, until):
+                yield entry.timestamp, read_record(segment.path, entry.offset)
+
+
+def entries_in_range(
+    entries: List[IndexEntry],
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> List[IndexEntry]:
+    """Select the entries of one segment index within [since, until] by binary search."""
+    # Live polls append in time order; compaction may add older polls later.
+    entries = sorted(entries, key=lambda entry: entry.timestamp)
+    timestamps = [entry.timestamp for entry in entries]
+    start = bisect.bisect_left(timestamps, since) if since else 0
+    # Pad the upper bound so "20251101" includes every poll of that day.
+    stop = bisect.bisect_right(timestamps, until + "\x7f") if until else len(entries)
+    return entries[start:stop]
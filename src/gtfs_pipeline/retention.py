@@ -0,0 +1,354 @@
+"""
+Compaction and retention for the raw and processed data directories.
+
+Run once per day (or more often); each run
+
+  * rolls per-poll files of closed days under ``<data_directory>/raw`` into
+    compressed daily partitions: ``.pb`` payloads into the zstd segment archive
+    (``raw_archive``) and JSON snapshots into
+    ``raw/compacted/<feed_type>/<feed_name>/<YYYYMMDD>.jsonl.gz``;
+  * merges the Parquet files of closed bronze ``date=`` partitions (one per
+    flush window of the sink) into one file per partition;
+  * deletes raw data older than ``raw_data_retention_days`` (per-poll files,
+    segments, compacted JSON, seen-again markers and static ZIPs);
+  * deletes bronze and silver Parquet ``date=`` partitions older than
+    ``processed_data_retention_days``.
+
+The job is incremental: after compaction the flat ``raw`` directory only
+holds the current day's polls, partitioned data is expired by directory and
+file *name* without walking the files inside, and the cutoffs already applied
+are remembered in ``state/retention.json`` so partition sweeps are skipped
+until the cutoff moves on.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import GTFSConfig
+from .raw_archive import SegmentArchive, read_index
+
+
+_POLL_FILE = re.compile(
+    r"^gtfs_rt_(trip_updates|vehicle_positions)_(.+)_(\d{8})_\d{6}\.(pb|json)$"
+)
+_STATIC_ZIP = re.compile(r"^gtfs_static(?:_.+)?_(\d{8})_\d{6}\.zip$")
+_MARKER_FILE = re.compile(r"^seen_again_(\d{8})\.jsonl$")
+_PARTITION_DAY = re.compile(r"^(\d{8})(?:_\d{2})?\.")
+# Parquet footer key of a merged bronze file: JSON list of the file names merged into it.
+_COMPACTED_FROM = b"gtfs_pipeline.compacted_from"
+
+
+@dataclass
+class CompactionReport:
+    """What one run compacted and deleted."""
+    compacted_files: int = 0
+    compacted_bytes_in: int = 0
+    compacted_bytes_out: int = 0
+    deleted_files: int = 0
+    deleted_bytes: int = 0
+    dry_run: bool = False
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.deleted_bytes + self.compacted_bytes_in - self.compacted_bytes_out
+
+    def report(self) -> str:
+        """Human-readable summary."""
+        verb = "Would reclaim" if self.dry_run else "Reclaimed"
+        return "\n".join([
+            f"Compacted {self.compacted_files} files "
+            f"({self.compacted_bytes_in / 1e6:,.1f} MB -> {self.compacted_bytes_out / 1e6:,.1f} MB)",
+            f"Deleted {self.deleted_files} expired files/partitions ({self.deleted_bytes / 1e6:,.1f} MB)",
+            f"{verb} {self.reclaimed_bytes / 1e6:,.1f} MB",
+        ])
+
+
+def _tree_size(path: Path) -> Tuple[int, int]:
+    """Return (files, bytes) under ``path``."""
+    if path.is_file():
+        return 1, path.stat().st_size
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+class RetentionJob:
+    """
+    Compact closed days and expire data past the configured retention.
+    """
+
+    def __init__(self, config: GTFSConfig, today: Optional[str] = None, dry_run: bool = False):
+        """
+        Args:
+            config: Supplies ``data_directory`` and the retention periods
+            today: Local date (YYYYMMDD) treated as the open day; defaults to now
+            dry_run: Report what would be compacted and deleted without touching files
+        """
+        self.config = config
+        self.data_directory = Path(config.data_directory)
+        self.raw_dir = self.data_directory / "raw"
+        self.bronze_dir = self.data_directory / "bronze"
+        self.silver_dir = self.data_directory / "silver"
+        self.state_path = self.data_directory / "state" / "retention.json"
+        self.today = today or datetime.now().strftime("%Y%m%d")
+        self.dry_run = dry_run
+        self.logger = logging.getLogger(__name__)
+        self.report = CompactionReport(dry_run=dry_run)
+
+    def _cutoff(self, days: int) -> str:
+        """Oldest day (YYYYMMDD) still retained."""
+        return (datetime.strptime(self.today, "%Y%m%d") - timedelta(days=days)).strftime("%Y%m%d")
+
+    def _load_state(self) -> Dict[str, str]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable retention state {self.state_path}: {e}")
+            return {}
+
+    def _save_state(self, state: Dict[str, str]) -> None:
+        if self.dry_run:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        tmp_path.replace(self.state_path)
+
+    def _delete(self, path: Path) -> None:
+        files, size = _tree_size(path)
+        self.report.deleted_files += files
+        self.report.deleted_bytes += size
+        self.logger.info(f"Expired {path} ({size} bytes)")
+        if self.dry_run:
+            return
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+    def run(self) -> CompactionReport:
+        """Compact, expire and return the report."""
+        state = self._load_state()
+        raw_cutoff = self._cutoff(self.config.raw_data_retention_days)
+        processed_cutoff = self._cutoff(self.config.processed_data_retention_days)
+
+        self._sweep_raw_files(raw_cutoff)
+        self._compact_bronze(processed_cutoff)
+        if state.get("raw_expired_before") != raw_cutoff:
+            self._expire_partitions(self.raw_dir / "segments", raw_cutoff)
+            self._expire_partitions(self.raw_dir / "compacted", raw_cutoff)
+            self._expire_markers(raw_cutoff)
+            state["raw_expired_before"] = raw_cutoff
+        if state.get("processed_expired_before") != processed_cutoff:
+            self._expire_date_partitions(processed_cutoff)
+            state["processed_expired_before"] = processed_cutoff
+
+        self._save_state(state)
+        return self.report
+
+    # Top level of raw/: per-poll files and static ZIPs.
+    def _sweep_raw_files(self, cutoff: str) -> None:
+        if not self.raw_dir.is_dir():
+            return
+        pb_groups: Dict[Tuple[str, str, str], List[Path]] = defaultdict(list)
+        json_groups: Dict[Tuple[str, str, str], List[Path]] = defaultdict(list)
+        with os.scandir(self.raw_dir) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                poll = _POLL_FILE.match(entry.name)
+                static = _STATIC_ZIP.match(entry.name) if poll is None else None
+                day = poll.group(3) if poll else static.group(1) if static else None
+                if day is None:
+                    continue
+                path = Path(entry.path)
+                if day < cutoff:
+                    self._delete(path)
+                elif poll and day < self.today:
+                    groups = pb_groups if poll.group(4) == "pb" else json_groups
+                    groups[(poll.group(1), poll.group(2), day)].append(path)
+
+        if pb_groups:
+            self._compact_payloads(pb_groups)
+        for key, paths in sorted(json_groups.items()):
+            self._compact_json(key, paths)
+
+    def _compact_payloads(self, groups: Dict[Tuple[str, str, str], List[Path]]) -> None:
+        """Append closed days' ``.pb`` files to daily zstd segments, then delete them."""
+        archive = SegmentArchive(self.raw_dir / "segments", granularity="day", compression="zstd")
+        try:
+            for (feed_type, feed_name, day), paths in sorted(groups.items()):
+                segment_path = archive.segment_path(feed_type, feed_name, day)
+                # A crash between append and unlink must not duplicate payloads on the next run.
+                archived = {e.timestamp for e in read_index(segment_path)} if segment_path.exists() else set()
+                size_before = self._segment_size(segment_path)
+                for path in sorted(paths):
+                    timestamp = path.stem[-15:]
+                    size = path.stat().st_size
+                    self.report.compacted_files += 1
+                    self.report.compacted_bytes_in += size
+                    if self.dry_run:
+                        continue
+                    if timestamp not in archived:
+                        archive.append(feed_type, feed_name, timestamp, path.read_bytes())
+                    path.unlink()
+                if not self.dry_run:
+                    archive.close()
+                    self.report.compacted_bytes_out += self._segment_size(segment_path) - size_before
+                self.logger.info(f"Compacted {len(paths)} payloads into {segment_path}")
+        finally:
+            archive.close()
+
+    @staticmethod
+    def _segment_size(segment_path: Path) -> int:
+        return sum(p.stat().st_size for p in (segment_path, segment_path.with_suffix(".idx")) if p.exists())
+
+    def _compact_json(self, key: Tuple[str, str, str], paths: List[Path]) -> None:
+        """Append a closed day's JSON snapshots to one gzip JSON-lines file, then delete them."""
+        feed_type, feed_name, day = key
+        target = self.raw_dir / "compacted" / feed_type / feed_name / f"{day}.jsonl.gz"
+        size_in = sum(path.stat().st_size for path in paths)
+        self.report.compacted_files += len(paths)
+        self.report.compacted_bytes_in += size_in
+        if self.dry_run:
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        size_before = target.stat().st_size if target.exists() else 0
+        # Each run appends one gzip member; gzip readers concatenate members transparently.
+        with gzip.open(target, "at", encoding="utf-8") as out:
+            for path in sorted(paths):
+                with open(path, "r", encoding="utf-8") as fh:
+                    snapshot = json.load(fh)
+                record = {
+                    "timestamp": path.stem[-15:],
+                    "feed_type": feed_type,
+                    "feed_name": feed_name,
+                    "snapshot": snapshot,
+                }
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        for path in paths:
+            path.unlink()
+        self.report.compacted_bytes_out += target.stat().st_size - size_before
+        self.logger.info(f"Compacted {len(paths)} JSON snapshots into {target}")
+
+    def _compact_bronze(self, cutoff: str) -> None:
+        """Merge the files of each closed bronze ``date=`` partition into one file."""
+        if not self.bronze_dir.is_dir():
+            return
+        silver_files = self._silver_tracked_files()
+        if silver_files is None:
+            return
+        # pyarrow is only needed once there is bronze data to merge.
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        from .parquet_sink import RT_SCHEMAS
+
+        today = f"{self.today[:4]}-{self.today[4:6]}-{self.today[6:]}"
+        for partition in sorted(self.bronze_dir.glob("*/feed=*/date=*")):
+            dataset, feed_name = partition.parent.parent.name, partition.parent.name[len("feed="):]
+            day = partition.name[len("date="):]
+            if dataset not in RT_SCHEMAS or day >= today or day.replace("-", "") < cutoff:
+                continue
+            # The silver builder remembers these files by name; merging them would make it read the rows again.
+            if silver_files.get(dataset, {}).get(feed_name, {}).get(day):
+                continue
+            paths = sorted(partition.glob("*.parquet"))
+            if len(paths) < 2:
+                continue
+
+            # A crash after writing a merged file but before deleting its inputs leaves them behind.
+            merged = set()
+            for path in paths:
+                metadata = pq.read_schema(path).metadata or {}
+                if _COMPACTED_FROM in metadata:
+                    merged.update(json.loads(metadata[_COMPACTED_FROM]))
+            leftovers = [path for path in paths if path.name in merged]
+            for path in leftovers:
+                self._delete(path)
+            paths = [path for path in paths if path.name not in merged]
+            if len(paths) < 2:
+                continue
+
+            size_in = sum(path.stat().st_size for path in paths)
+            self.report.compacted_files += len(paths)
+            self.report.compacted_bytes_in += size_in
+            if self.dry_run:
+                continue
+            schema = RT_SCHEMAS[dataset]
+            # The explicit schema reads files written before newer columns existed.
+            table = ds.dataset([str(p) for p in paths], schema=schema, format="parquet").to_table()
+            names = [path.name for path in paths]
+            digest = hashlib.sha1("\n".join(names).encode("utf-8")).hexdigest()[:16]
+            target = partition / f"part-{day.replace('-', '')}-compacted-{digest}.parquet"
+            tmp_path = target.with_name(f".{target.name}.inprogress")
+            table = table.replace_schema_metadata({_COMPACTED_FROM: json.dumps(names).encode("utf-8")})
+            pq.write_table(table, str(tmp_path), compression="zstd")
+            os.replace(tmp_path, target)
+            for path in paths:
+                path.unlink()
+            self.report.compacted_bytes_out += target.stat().st_size
+            self.logger.info(f"Compacted {len(paths)} bronze files into {target}")
+
+    def _silver_tracked_files(self) -> Optional[Dict[str, Dict[str, Dict[str, List[str]]]]]:
+        """Bronze file names per dataset, feed and day that ``state/silver.json`` still tracks (None if unknown)."""
+        try:
+            with open(self.data_directory / "state" / "silver.json", "r", encoding="utf-8") as fh:
+                state = json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            # Unknown progress: leave every partition as it is rather than risk re-reads.
+            self.logger.warning(f"Not compacting bronze: unreadable silver state ({e})")
+            return None
+        return {
+            dataset: {feed_name: feed_state.get("files", {}) for feed_name, feed_state in feeds.items()}
+            for dataset, feeds in state.items()
+        }
+
+    # Partitioned data: expire by name only.
+    def _expire_partitions(self, root: Path, cutoff: str) -> None:
+        """Delete ``<root>/<feed_type>/<feed_name>/<YYYYMMDD>[_HH].*`` files older than ``cutoff``."""
+        if not root.is_dir():
+            return
+        for path in root.glob("*/*/*"):
+            match = _PARTITION_DAY.match(path.name)
+            if match and match.group(1) < cutoff:
+                self._delete(path)
+
+    def _expire_markers(self, cutoff: str) -> None:
+        marker_dir = self.raw_dir / "markers"
+        if not marker_dir.is_dir():
+            return
+        for path in marker_dir.iterdir():
+            match = _MARKER_FILE.match(path.name)
+            if match and match.group(1) < cutoff:
+                self._delete(path)
+
+    def _expire_date_partitions(self, cutoff: str) -> None:
+        """Delete bronze and silver RT ``date=YYYY-MM-DD`` partitions older than ``cutoff``."""
+        # silver/static/<feed>/<version> has no date= level and is not matched.
+        for root in (self.bronze_dir, self.silver_dir):
+            if not root.is_dir():
+                continue
+            for partition in root.glob("*/feed=*/date=*"):
+                day = partition.name[len("date="):].replace("-", "")
+                if partition.is_dir() and day < cutoff:
+                    self._delete(partition)
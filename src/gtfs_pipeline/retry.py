@@ -0,0 +1,146 @@
+"""
+Retry policy for feed fetches.
+
+Exponential backoff with jitter, ``Retry-After`` support, a per-cycle retry
+budget shared by all feeds, and an absolute deadline so retries for one poll
+never run into the next one.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+
+T = TypeVar("T")
+
+# Upstream responses worth another attempt.
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class RetryableStatus(Exception):
+    """HTTP response whose status indicates a transient upstream problem."""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RetryDeadlineExceeded(asyncio.TimeoutError):
+    """No time left before the deadline for another attempt."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class RetryPolicy:
+    """Backoff parameters: ``base_delay * 2**attempt`` capped at ``max_delay``."""
+    max_retries: int = 3
+    base_delay: float = 5.0
+    max_delay: float = 60.0
+    jitter: float = 0.5  # fraction of the delay that is randomised
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Delay before retry number ``attempt + 1``.
+
+        A server-provided ``Retry-After`` takes precedence over the computed
+        backoff (still capped at ``max_delay``).
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.base_delay * (2 ** attempt), self.max_delay)
+        spread = delay * self.jitter
+        return delay - spread + random.uniform(0, spread)
+
+
+class RetryBudget:
+    """Retries shared by all fetches of one ingestion cycle."""
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+
+    def consume(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+async def retry_async(
+    attempt: Callable[[Optional[float]], Awaitable[T]],
+    policy: RetryPolicy,
+    retry_on: Tuple[Type[BaseException], ...],
+    deadline: Optional[float] = None,
+    budget: Optional[RetryBudget] = None,
+    description: str = "request",
+    logger: Optional[logging.Logger] = None,
+) -> T:
+    """
+    Run ``attempt`` until it succeeds or retrying is no longer allowed.
+
+    Args:
+        attempt: Coroutine factory receiving the seconds left before ``deadline``
+                 (None when unbounded) so it can cap its own timeout
+        policy: Backoff parameters
+        retry_on: Exception types that trigger a retry
+        deadline: Absolute ``time.monotonic()`` value after which no attempt starts
+        budget: Optional shared retry budget
+        description: Label used in log messages
+        logger: Logger for retry messages
+
+    Returns:
+        The result of the first successful attempt
+
+    Raises:
+        The last retryable exception once retries, budget or time run out, or
+        RetryDeadlineExceeded when the deadline passed before an attempt.
+    """
+    logger = logger or logging.getLogger(__name__)
+    attempt_number = 0
+    while True:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise RetryDeadlineExceeded(f"Deadline reached before fetching {description}")
+
+        try:
+            return await attempt(remaining)
+        except retry_on as e:
+            error = e
+
+        if attempt_number >= policy.max_retries:
+            raise error
+        # Deadline first: a retry that could not start must not use up the shared budget.
+        delay = policy.backoff(attempt_number, getattr(error, "retry_after", None))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            logger.warning(f"No time left before the next cycle to retry {description} ({error!r})")
+            raise error
+        if budget is not None and not budget.consume():
+            logger.warning(f"Retry budget exhausted; not retrying {description} ({error!r})")
+            raise error
+
+        attempt_number += 1
+        logger.warning(
+            f"Retrying {description} in {delay:.2f}s "
+            f"(attempt {attempt_number}/{policy.max_retries}) after {error!r}"
+        )
+        await asyncio.sleep(delay)
@@ -0,0 +1,530 @@
+"""
+Precomputed schedule index for joining GTFS-RT updates to static stop_times.
+
+For one static version the index holds ``stop_times`` as flat NumPy arrays
+sorted by ``(trip, stop_sequence)``, so every trip is one contiguous slice:
+
+    trip_ids[t]                      trip_id of trip ``t`` (sorted)
+    trip_start[t]:trip_start[t + 1]  its rows in the stop arrays
+    stop_code / stop_sequence / arrival / departure   one entry per stop time
+
+plus route -> trips and stop -> stop-time-rows lookup tables. Trip lookups are
+a dictionary hit; matching a whole ``stop_time_updates`` table to scheduled
+times is one ``searchsorted`` over packed ``(trip, stop_sequence)`` keys.
+
+The index is built once per static version and cached next to its tables as
+memory-mappable Arrow IPC files:
+
+    silver/static/<feed_name>/<version_id>/schedule_index/
+        index.json  trips.arrow  stop_times.arrow  routes.arrow  stops.arrow
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+
+from .static_registry import StaticFeedRegistry, StaticFeedVersion
+from .static_store import MANIFEST_NAME, StaticVersion
+
+if TYPE_CHECKING:
+    from .service_calendar import ServiceCalendar
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR_NAME = "schedule_index"
+INDEX_FORMAT = 1
+
+# Scheduled times and sequences missing from the feed.
+MISSING = -1
+
+
+def _codes(values: pd.Series, categories: Optional[np.ndarray] = None):
+    """Integer codes of ``values`` (-1 for null/unknown) and the sorted categories used."""
+    values = values.astype("object").where(values.notna(), None)
+    if categories is None:
+        categories = np.array(sorted({str(v) for v in values if v is not None}), dtype=object)
+    codes = pd.Categorical(values.map(lambda v: None if v is None else str(v)), categories=categories).codes
+    return codes.astype(np.int32), categories
+
+
+def _int_column(values: pd.Series, dtype=np.int32) -> np.ndarray:
+    return pd.to_numeric(values, errors="coerce").fillna(MISSING).to_numpy(dtype=dtype)
+
+
+def _csr(keys: np.ndarray, size: int):
+    """Group row numbers by ``keys`` (0 <= key < size): returns ``(start, rows)``."""
+    rows = np.argsort(keys, kind="stable").astype(np.int64)
+    start = np.searchsorted(keys[rows], np.arange(size + 1)).astype(np.int64)
+    return start, rows
+
+
+class ScheduleIndex:
+    """
+    Array-backed schedule of one static version.
+    """
+
+    def __init__(
+        self,
+        trip_ids: np.ndarray,
+        trip_start: np.ndarray,
+        trip_route: np.ndarray,
+        trip_service: np.ndarray,
+        trip_direction: np.ndarray,
+        stop_code: np.ndarray,
+        stop_sequence: np.ndarray,
+        arrival: np.ndarray,
+        departure: np.ndarray,
+        route_ids: np.ndarray,
+        stop_ids: np.ndarray,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        self.trip_ids = trip_ids
+        self.trip_start = trip_start
+        self.trip_route = trip_route
+        self.trip_service = trip_service
+        self.trip_direction = trip_direction
+        self.stop_code = stop_code
+        self.stop_sequence = stop_sequence
+        self.arrival = arrival
+        self.departure = departure
+        self.route_ids = route_ids
+        self.stop_ids = stop_ids
+        self.metadata: Dict[str, Any] = dict(metadata or {})
+
+        self._trip_pos = {trip_id: i for i, trip_id in enumerate(trip_ids)}
+        self._route_pos = {route_id: i for i, route_id in enumerate(route_ids)}
+        self._stop_pos = {stop_id: i for i, stop_id in enumerate(stop_ids)}
+        trip_of_row = np.repeat(np.arange(len(trip_ids), dtype=np.int64), np.diff(trip_start))
+        # Sorted because rows are ordered by (trip, stop_sequence).
+        self._row_key = (trip_of_row << 32) | (stop_sequence.astype(np.int64) & 0xFFFFFFFF)
+        self._route_start, self._route_trips = _csr(trip_route, len(route_ids))
+        self._stop_start, self._stop_rows = _csr(stop_code, len(stop_ids))
+
+    @property
+    def timezone(self) -> Optional[str]:
+        """``agency_timezone`` of the feed (service days are local to it)."""
+        return self.metadata.get("agency_timezone")
+
+    def __len__(self) -> int:
+        return len(self.stop_sequence)
+
+    def trip(self, trip_id: str) -> Optional[slice]:
+        """Rows of ``trip_id`` in the stop arrays, or None for an unknown trip."""
+        t = self._trip_pos.get(trip_id)
+        if t is None:
+            return None
+        return slice(int(self.trip_start[t]), int(self.trip_start[t + 1]))
+
+    def stop_times(self, trip_id: str) -> Optional[Dict[str, np.ndarray]]:
+        """Scheduled stops of ``trip_id`` (``stop_id``, ``stop_sequence``, ``arrival``, ``departure``)."""
+        rows = self.trip(trip_id)
+        if rows is None:
+            return None
+        return {
+            "stop_id": self.stop_ids[self.stop_code[rows]],
+            "stop_sequence": self.stop_sequence[rows],
+            "arrival": self.arrival[rows],
+            "departure": self.departure[rows],
+        }
+
+    def service_ids_of(self, trip_ids: Sequence[Optional[str]]) -> List[Optional[str]]:
+        """service_id of each trip (None for unknown trips)."""
+        positions = [self._trip_pos.get(trip_id) for trip_id in trip_ids]
+        return [None if t is None else self.trip_service[t] for t in positions]
+
+    def trips_for_route(self, route_id: str) -> np.ndarray:
+        """trip_ids of ``route_id``."""
+        r = self._route_pos.get(route_id)
+        if r is None:
+            return self.trip_ids[:0]
+        return self.trip_ids[self._route_trips[self._route_start[r]:self._route_start[r + 1]]]
+
+    def rows_at_stop(self, stop_id: str) -> np.ndarray:
+        """Rows of the stop arrays that serve ``stop_id``."""
+        s = self._stop_pos.get(stop_id)
+        if s is None:
+            return self._stop_rows[:0]
+        return self._stop_rows[self._stop_start[s]:self._stop_start[s + 1]]
+
+    def trips_at_stop(self, stop_id: str) -> np.ndarray:
+        """trip_ids that serve ``stop_id``."""
+        rows = self.rows_at_stop(stop_id)
+        return self.trip_ids[np.unique(np.searchsorted(self.trip_start, rows, side="right") - 1)]
+
+    def locate(
+        self,
+        trip_ids: Sequence[Optional[str]],
+        stop_sequences: Sequence[Optional[int]],
+        stop_ids: Optional[Sequence[Optional[str]]] = None,
+    ) -> np.ndarray:
+        """
+        Rows of the stop arrays matching each ``(trip_id, stop_sequence)``.
+
+        Updates without a stop_sequence fall back to the trip's first stop with
+        the same ``stop_id``.
+
+        Returns:
+            Row per input (``MISSING`` where the trip or stop is not scheduled)
+        """
+        n = len(trip_ids)
+        trips = np.full(n, MISSING, dtype=np.int64)
+        unique, inverse = np.unique(np.array([t or "" for t in trip_ids], dtype=object), return_inverse=True)
+        unique_pos = np.array([self._trip_pos.get(t, MISSING) for t in unique], dtype=np.int64)
+        if n:
+            trips = unique_pos[inverse.reshape(-1)]
+        sequences = _int_column(pd.Series(stop_sequences, dtype="object"), np.int64)
+
+        keys = (trips << 32) | (sequences & 0xFFFFFFFF)
+        pos = np.searchsorted(self._row_key, keys)
+        pos_clipped = np.minimum(pos, max(len(self._row_key) - 1, 0))
+        found = (trips >= 0) & (sequences >= 0) & (pos < len(self._row_key))
+        if len(self._row_key):
+            found &= self._row_key[pos_clipped] == keys
+        rows = np.where(found, pos, MISSING)
+
+        if stop_ids is not None:
+            for i in np.flatnonzero((trips >= 0) & (sequences < 0)):
+                code = self._stop_pos.get(stop_ids[i])
+                if code is None:
+                    continue
+                start, end = self.trip_start[trips[i]], self.trip_start[trips[i] + 1]
+                hits = np.flatnonzero(self.stop_code[start:end] == code)
+                if len(hits):
+                    rows[i] = start + hits[0]
+        return rows
+
+    def service_day_epochs(self, start_dates: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        Unix time of each service day's reference midnight ("noon minus 12h").
+
+        Scheduled seconds are relative to it, so it stays correct on days with
+        a DST change. Unparseable dates give NaN.
+        """
+        from zoneinfo import ZoneInfo
+
+        tz = ZoneInfo(self.timezone) if self.timezone else None
+        unique, inverse = np.unique(np.array([d or "" for d in start_dates], dtype=object), return_inverse=True)
+        epochs = np.full(len(unique), np.nan)
+        for i, day in enumerate(unique):
+            try:
+                noon = datetime.strptime(day, "%Y%m%d").replace(hour=12, tzinfo=tz)
+            except ValueError:
+                continue
+            # Naive datetimes use the local zone (the containers run in Asia/Tokyo).
+            epochs[i] = noon.timestamp() - 12 * 3600
+        return epochs[inverse.reshape(-1)] if len(start_dates) else epochs[:0]
+
+    def scheduled_times(
+        self,
+        trip_ids: Sequence[Optional[str]],
+        start_dates: Sequence[Optional[str]],
+        stop_sequences: Sequence[Optional[int]],
+        stop_ids: Optional[Sequence[Optional[str]]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Scheduled arrival and departure of each RT stop as Unix seconds.
+
+        Returns:
+            ``row`` (matched schedule row or ``MISSING``) plus ``arrival`` and
+            ``departure`` (NaN where the stop or its time is not scheduled)
+        """
+        rows = self.locate(trip_ids, stop_sequences, stop_ids)
+        base = self.service_day_epochs(start_dates)
+        matched = rows >= 0
+        result: Dict[str, np.ndarray] = {"row": rows}
+        for event, scheduled_column in (("arrival", self.arrival), ("departure", self.departure)):
+            scheduled = np.full(len(rows), np.nan)
+            scheduled[matched] = scheduled_column[rows[matched]]
+            scheduled[scheduled == MISSING] = np.nan
+            result[event] = base + scheduled
+        return result
+
+    def delays(self, stop_time_updates: Dict[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+        """
+        Arrival and departure delays of predicted stop times against the schedule.
+
+        Args:
+            stop_time_updates: Column mapping with ``trip_id``, ``start_date``,
+                ``stop_sequence``, ``stop_id``, ``arrival_time`` and
+                ``departure_time`` (Unix seconds) as produced by the RT parsers
+
+        Returns:
+            ``row`` (matched schedule row or ``MISSING``) plus ``arrival_delay``
+            and ``departure_delay`` in seconds (NaN where unknown)
+        """
+        scheduled = self.scheduled_times(
+            stop_time_updates["trip_id"],
+            stop_time_updates["start_date"],
+            stop_time_updates["stop_sequence"],
+            stop_time_updates.get("stop_id"),
+        )
+        result: Dict[str, np.ndarray] = {"row": scheduled["row"]}
+        for event in ("arrival", "departure"):
+            predicted = pd.to_numeric(
+                pd.Series(stop_time_updates[f"{event}_time"], dtype="object"), errors="coerce"
+            ).to_numpy(dtype=np.float64)
+            result[f"{event}_delay"] = predicted - scheduled[event]
+        return result
+
+    def save(self, directory: Union[str, Path]) -> Path:
+        """Write the index as Arrow IPC files (atomically replacing ``directory``)."""
+        directory = Path(directory)
+        tmp_dir = directory.with_name(f".{directory.name}.inprogress")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+        tables = {
+            "trips": pa.table({
+                "trip_id": pa.array(self.trip_ids.tolist(), pa.string()),
+                "start": pa.array(self.trip_start[:-1], pa.int64()),
+                "route": pa.array(self.trip_route, pa.int32()),
+                "service_id": pa.array(self.trip_service.tolist(), pa.string()),
+                "direction_id": pa.array(self.trip_direction, pa.int8()),
+            }),
+            "stop_times": pa.table({
+                "stop": pa.array(self.stop_code, pa.int32()),
+                "stop_sequence": pa.array(self.stop_sequence, pa.int32()),
+                "arrival": pa.array(self.arrival, pa.int32()),
+                "departure": pa.array(self.departure, pa.int32()),
+            }),
+            "routes": pa.table({"route_id": pa.array(self.route_ids.tolist(), pa.string())}),
+            "stops": pa.table({"stop_id": pa.array(self.stop_ids.tolist(), pa.string())}),
+        }
+        for name, table in tables.items():
+            feather.write_feather(table, tmp_dir / f"{name}.arrow", compression="uncompressed")
+        with open(tmp_dir / "index.json", "w", encoding="utf-8") as fh:
+            json.dump(dict(self.metadata, format=INDEX_FORMAT), fh, indent=2, ensure_ascii=False)
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+        return directory
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> "ScheduleIndex":
+        """Open an index written by ``save`` (arrays are memory-mapped where possible)."""
+        directory = Path(directory)
+        with open(directory / "index.json", "r", encoding="utf-8") as fh:
+            metadata = json.load(fh)
+        if metadata.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported schedule index format in {directory}: {metadata.get('format')}")
+
+        def read(name: str) -> pa.Table:
+            return ipc.open_file(pa.memory_map(str(directory / f"{name}.arrow"), "r")).read_all()
+
+        trips, stop_times = read("trips"), read("stop_times")
+        trip_start = np.append(trips.column("start").to_numpy(), stop_times.num_rows).astype(np.int64)
+        return cls(
+            trip_ids=np.array(trips.column("trip_id").to_pylist(), dtype=object),
+            trip_start=trip_start,
+            trip_route=trips.column("route").to_numpy(),
+            trip_service=np.array(trips.column("service_id").to_pylist(), dtype=object),
+            trip_direction=trips.column("direction_id").to_numpy(),
+            stop_code=stop_times.column("stop").to_numpy(),
+            stop_sequence=stop_times.column("stop_sequence").to_numpy(),
+            arrival=stop_times.column("arrival").to_numpy(),
+            departure=stop_times.column("departure").to_numpy(),
+            route_ids=np.array(read("routes").column("route_id").to_pylist(), dtype=object),
+            stop_ids=np.array(read("stops").column("stop_id").to_pylist(), dtype=object),
+            metadata=metadata,
+        )
+
+
+def build_schedule_index(version: StaticVersion) -> ScheduleIndex:
+    """
+    Build the schedule index of a materialised static version.
+
+    Args:
+        version: Static version with at least ``stop_times`` (``trips`` adds
+                 route, service and direction; ``agency`` the timezone)
+
+    Returns:
+        In-memory index (not yet cached; see ``load_schedule_index``)
+    """
+    stop_times = version.to_pandas(
+        "stop_times", columns=["trip_id", "stop_sequence", "stop_id", "arrival_time", "departure_time"]
+    )
+    trip_code, trip_ids = _codes(stop_times["trip_id"])
+    keep = trip_code >= 0
+    stop_times, trip_code = stop_times[keep], trip_code[keep]
+    sequence = _int_column(stop_times["stop_sequence"])
+    order = np.lexsort((sequence, trip_code))
+    trip_code, sequence = trip_code[order], sequence[order]
+    stop_times = stop_times.iloc[order]
+    stop_code, stop_ids = _codes(stop_times["stop_id"])
+    trip_start = np.searchsorted(trip_code, np.arange(len(trip_ids) + 1)).astype(np.int64)
+
+    trips = None
+    if version.has_table("trips"):
+        columns = [c for c in ("trip_id", "route_id", "service_id", "direction_id")
+                   if c in version.manifest["tables"]["trips"]["columns"]]
+        trips = version.to_pandas("trips", columns=columns)
+        trips = trips.assign(trip_id=trips["trip_id"].astype(str)).drop_duplicates("trip_id")
+        trips = trips.set_index("trip_id").reindex(trip_ids)
+    if trips is not None and "route_id" in trips.columns:
+        trip_route, route_ids = _codes(trips["route_id"])
+    else:
+        trip_route, route_ids = np.full(len(trip_ids), MISSING, dtype=np.int32), np.array([], dtype=object)
+    if trips is not None and "service_id" in trips.columns:
+        trip_service = trips["service_id"].astype(object).where(trips["service_id"].notna(), None)
+        trip_service = np.array([None if s is None else str(s) for s in trip_service], dtype=object)
+    else:
+        trip_service = np.full(len(trip_ids), None, dtype=object)
+    if trips is not None and "direction_id" in trips.columns:
+        trip_direction = _int_column(trips["direction_id"], np.int8)
+    else:
+        trip_direction = np.full(len(trip_ids), MISSING, dtype=np.int8)
+
+    metadata: Dict[str, Any] = {
+        "feed_name": version.manifest.get("feed_name"),
+        "version_id": version.manifest.get("version_id"),
+        "agency_timezone": None,
+    }
+    if version.has_table("agency") and "agency_timezone" in version.manifest["tables"]["agency"]["columns"]:
+        timezones = version.to_pandas("agency", columns=["agency_timezone"])["agency_timezone"].dropna()
+        if len(timezones):
+            metadata["agency_timezone"] = str(timezones.iloc[0]).strip()
+
+    return ScheduleIndex(
+        trip_ids=trip_ids,
+        trip_start=trip_start,
+        trip_route=trip_route,
+        trip_service=trip_service,
+        trip_direction=trip_direction,
+        stop_code=stop_code,
+        stop_sequence=sequence,
+        arrival=_int_column(stop_times["arrival_time"]),
+        departure=_int_column(stop_times["departure_time"]),
+        route_ids=route_ids,
+        stop_ids=stop_ids,
+        metadata=metadata,
+    )
+
+
+def load_schedule_index(version_dir: Union[str, Path], rebuild: bool = False) -> ScheduleIndex:
+    """
+    Open the cached schedule index of a static version, building it on first use.
+
+    Args:
+        version_dir: Static version directory (or its ``manifest.json``)
+        rebuild: Ignore an existing cache
+
+    Returns:
+        Schedule index of the version
+    """
+    path = Path(version_dir)
+    version_dir = path.parent if path.name == MANIFEST_NAME else path
+    index_dir = version_dir / INDEX_DIR_NAME
+    if not rebuild and (index_dir / "index.json").exists():
+        try:
+            return ScheduleIndex.load(index_dir)
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable schedule index {index_dir}: {e}")
+    index = build_schedule_index(StaticVersion(version_dir))
+    index.save(index_dir)
+    logger.info(
+        f"Schedule index built for {version_dir}: {len(index.trip_ids)} trips, {len(index)} stop times"
+    )
+    return index
+
+
+def fill_stop_time_delays(index: ScheduleIndex, stop_time_updates: Any) -> Any:
+    """
+    Fill null ``arrival_delay``/``departure_delay`` from predicted absolute times.
+
+    Args:
+        index: Schedule index of the feed's current static version
+        stop_time_updates: Column mapping or record batch as produced by the RT parsers
+
+    Returns:
+        The same kind of object with the delays filled where the schedule is known
+    """
+    is_batch = isinstance(stop_time_updates, pa.RecordBatch)
+    if is_batch:
+        columns: Dict[str, List[Any]] = {
+            name: stop_time_updates.column(name).to_pylist() for name in stop_time_updates.schema.names
+        }
+        # Timestamps come back as datetimes; delays are computed on Unix seconds.
+        for name in ("arrival_time", "departure_time"):
+            columns[name] = stop_time_updates.column(name).cast(pa.int64()).to_pylist()
+    else:
+        columns = stop_time_updates
+    if not columns.get("trip_id"):
+        return stop_time_updates
+
+    computed = index.delays(columns)
+    filled: Dict[str, List[Any]] = {}
+    for event in ("arrival", "departure"):
+        values = list(columns[f"{event}_delay"])
+        for i in np.flatnonzero(~np.isnan(computed[f"{event}_delay"])):
+            if values[i] is None:
+                values[i] = int(computed[f"{event}_delay"][i])
+        filled[f"{event}_delay"] = values
+
+    if not is_batch:
+        stop_time_updates.update(filled)
+        return stop_time_updates
+    arrays = [
+        pa.array(filled[name], type=field.type) if name in filled else stop_time_updates.column(name)
+        for name, field in zip(stop_time_updates.schema.names, stop_time_updates.schema)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=stop_time_updates.schema)
+
+
+class ScheduleIndexCache:
+    """
+    Schedule index and service calendar of one static version of each feed
+    (the current one unless a caller asks for another), loaded once per version.
+    """
+
+    def __init__(self, registry: StaticFeedRegistry):
+        """
+        Initialize the cache.
+
+        Args:
+            registry: Static feed registry; RT feeds map to the static feed of the same name
+        """
+        self.registry = registry
+        self._indexes: Dict[str, ScheduleIndex] = {}
+        self._calendars: Dict[str, "ServiceCalendar"] = {}
+        self._lock = threading.Lock()
+
+    def _cached(
+        self, cache: Dict[str, Any], feed_name: str, loader, version: Optional[StaticFeedVersion]
+    ) -> Optional[Any]:
+        if version is None:
+            version = self.registry.current(feed_name)
+        if version is None or not Path(version.artifact).exists():
+            return None
+        with self._lock:
+            value = cache.get(version.artifact)
+            if value is None:
+                value = loader(version.artifact)
+                # One version of a feed is kept in memory at a time (<feed_name>/<version>/manifest.json).
+                for artifact in [a for a in cache if Path(a).parent.parent.name == feed_name]:
+                    del cache[artifact]
+                cache[version.artifact] = value
+            return value
+
+    def get(self, feed_name: str, version: Optional[StaticFeedVersion] = None) -> Optional[ScheduleIndex]:
+        """Index of ``version`` (default: ``feed_name``'s current static version), or None if there is none."""
+        return self._cached(self._indexes, feed_name, load_schedule_index, version)
+
+    def calendar(
+        self, feed_name: str, version: Optional[StaticFeedVersion] = None
+    ) -> Optional["ServiceCalendar"]:
+        """Service calendar of ``version`` (default: ``feed_name``'s current static version), or None."""
+        from .service_calendar import load_service_calendar
+
+        return self._cached(self._calendars, feed_name, load_service_calendar, version)
@@ -0,0 +1,255 @@
+"""
+Service calendar of a GTFS Static version as a precomputed service x date bitset.
+
+``calendar.txt`` weekday flags and date ranges plus ``calendar_dates.txt``
+exceptions are evaluated once per static version for every day of the feed's
+validity window. The result is a boolean matrix ``active[service, day]``, so
+"which services run on this date", "which trips run today" and "is this RT
+trip scheduled on its start date" are array lookups instead of re-evaluating
+the calendar rules.
+
+The matrix is cached next to the version's tables, one bit per day:
+
+    silver/static/<feed_name>/<version_id>/service_calendar.arrow
+        service_id (string), active (binary, np.packbits of the day row)
+        schema metadata: first_date (YYYYMMDD), days
+"""
+
+import logging
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+
+from .static_store import MANIFEST_NAME, StaticVersion
+
+if TYPE_CHECKING:
+    from .schedule_index import ScheduleIndex
+
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_FILE_NAME = "service_calendar.arrow"
+
+_DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return datetime.strptime(str(value).strip(), "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+class ServiceCalendar:
+    """
+    Active services per day over a static version's validity window.
+    """
+
+    def __init__(self, service_ids: np.ndarray, first_date: Optional[date], active: np.ndarray):
+        """
+        Initialize the calendar.
+
+        Args:
+            service_ids: Sorted service ids (rows of ``active``)
+            first_date: Date of column 0 (None for a feed without calendar data)
+            active: Boolean matrix, one row per service and one column per day
+        """
+        self.service_ids = service_ids
+        self.first_date = first_date
+        self.active = active
+        self._service_pos = {service_id: i for i, service_id in enumerate(service_ids)}
+
+    @property
+    def days(self) -> int:
+        return self.active.shape[1]
+
+    @property
+    def last_date(self) -> Optional[date]:
+        if self.first_date is None or not self.days:
+            return None
+        return self.first_date + timedelta(days=self.days - 1)
+
+    def day_offset(self, day: Union[date, str]) -> Optional[int]:
+        """Column of ``day`` (date or YYYYMMDD), or None outside the validity window."""
+        if isinstance(day, str):
+            day = _parse_date(day)
+        if day is None or self.first_date is None:
+            return None
+        offset = (day - self.first_date).days
+        return offset if 0 <= offset < self.days else None
+
+    def is_active(self, service_id: str, day: Union[date, str]) -> bool:
+        """Whether ``service_id`` runs on ``day``."""
+        s = self._service_pos.get(service_id)
+        d = self.day_offset(day)
+        return s is not None and d is not None and bool(self.active[s, d])
+
+    def active_services(self, day: Union[date, str]) -> np.ndarray:
+        """service_ids running on ``day``."""
+        d = self.day_offset(day)
+        if d is None:
+            return self.service_ids[:0]
+        return self.service_ids[self.active[:, d]]
+
+    def active_mask(self, service_ids: Sequence[Optional[str]], days: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        Vectorised ``is_active`` over parallel arrays of service ids and YYYYMMDD days.
+
+        Unknown services and days outside the window are inactive.
+        """
+        n = len(service_ids)
+        if not n:
+            return np.zeros(0, dtype=bool)
+        unique_services, service_inverse = np.unique(
+            np.array([s or "" for s in service_ids], dtype=object), return_inverse=True
+        )
+        unique_days, day_inverse = np.unique(np.array([d or "" for d in days], dtype=object), return_inverse=True)
+        rows = np.array([self._service_pos.get(s, -1) for s in unique_services])[service_inverse.reshape(-1)]
+        offsets = [self.day_offset(d) for d in unique_days]
+        columns = np.array([-1 if offset is None else offset for offset in offsets])[day_inverse.reshape(-1)]
+        valid = (rows >= 0) & (columns >= 0)
+        mask = np.zeros(n, dtype=bool)
+        mask[valid] = self.active[rows[valid], columns[valid]]
+        return mask
+
+    def active_trips(self, index: "ScheduleIndex", day: Union[date, str]) -> np.ndarray:
+        """trip_ids of ``index`` whose service runs on ``day``."""
+        d = self.day_offset(day)
+        if d is None:
+            return index.trip_ids[:0]
+        running = {str(s) for s in self.active_services(day)}
+        return index.trip_ids[np.array([s in running for s in index.trip_service], dtype=bool)]
+
+    def scheduled_mask(
+        self,
+        index: "ScheduleIndex",
+        trip_ids: Sequence[Optional[str]],
+        start_dates: Sequence[Optional[str]],
+    ) -> np.ndarray:
+        """Whether each RT ``(trip_id, start_date)`` is a trip of ``index`` scheduled on that date."""
+        return self.active_mask(index.service_ids_of(trip_ids), start_dates)
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Write the calendar as one bit-packed Arrow IPC file (atomically)."""
+        path = Path(path)
+        packed = np.packbits(self.active, axis=1) if self.days else np.zeros((len(self.service_ids), 0), np.uint8)
+        table = pa.table({
+            "service_id": pa.array(self.service_ids.tolist(), pa.string()),
+            "active": pa.array([row.tobytes() for row in packed], pa.binary()),
+        }).replace_schema_metadata({
+            "first_date": self.first_date.strftime("%Y%m%d") if self.first_date else "",
+            "days": str(self.days),
+        })
+        tmp_path = path.with_name(f".{path.name}.inprogress")
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "ServiceCalendar":
+        """Open a calendar written by ``save``."""
+        table = ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+        metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+        days = int(metadata.get("days", 0))
+        first_date = _parse_date(metadata["first_date"]) if metadata.get("first_date") else None
+        rows = [np.frombuffer(value, dtype=np.uint8) for value in table.column("active").to_pylist()]
+        if rows:
+            active = np.unpackbits(np.vstack(rows), axis=1, count=days).astype(bool)
+        else:
+            active = np.zeros((0, days), dtype=bool)
+        return cls(np.array(table.column("service_id").to_pylist(), dtype=object), first_date, active)
+
+
+def build_service_calendar(version: StaticVersion) -> ServiceCalendar:
+    """
+    Evaluate ``calendar`` and ``calendar_dates`` of a static version for every day.
+
+    The window runs from the earliest to the latest date either table
+    mentions; ``calendar_dates`` exceptions (1 added, 2 removed) override the
+    weekly pattern.
+    """
+    calendar = version.to_pandas("calendar") if version.has_table("calendar") else pd.DataFrame()
+    exceptions = version.to_pandas("calendar_dates") if version.has_table("calendar_dates") else pd.DataFrame()
+
+    service_ids = set()
+    bounds = []
+    if len(calendar):
+        service_ids |= {str(s) for s in calendar["service_id"].dropna()}
+        starts = [_parse_date(d) for d in calendar["start_date"]]
+        ends = [_parse_date(d) for d in calendar["end_date"]]
+        bounds += [d for d in starts + ends if d is not None]
+    if len(exceptions):
+        service_ids |= {str(s) for s in exceptions["service_id"].dropna()}
+        exception_dates = [_parse_date(d) for d in exceptions["date"]]
+        bounds += [d for d in exception_dates if d is not None]
+    service_ids = np.array(sorted(service_ids), dtype=object)
+    if not bounds:
+        return ServiceCalendar(service_ids, None, np.zeros((len(service_ids), 0), dtype=bool))
+
+    first_date, last_date = min(bounds), max(bounds)
+    days = (last_date - first_date).days + 1
+    service_pos = {service_id: i for i, service_id in enumerate(service_ids)}
+    active = np.zeros((len(service_ids), days), dtype=bool)
+    day = np.arange(days)
+
+    if len(calendar):
+        weekday = (first_date.weekday() + day) % 7
+        flags = np.column_stack([
+            pd.to_numeric(calendar[name], errors="coerce").fillna(0).to_numpy() == 1
+            if name in calendar.columns else np.zeros(len(calendar), dtype=bool)
+            for name in _DAYS
+        ])
+        start = np.array([(d - first_date).days if d else days for d in starts])
+        end = np.array([(d - first_date).days if d else -1 for d in ends])
+        # rows x days: weekday flag and inside [start_date, end_date]
+        running = flags[:, weekday] & (day >= start[:, None]) & (day <= end[:, None])
+        rows = np.array([service_pos.get(str(s), -1) for s in calendar["service_id"]])
+        for row, pattern in zip(rows, running):
+            if row >= 0:
+                active[row] |= pattern
+
+    if len(exceptions):
+        rows = np.array([service_pos.get(str(s), -1) for s in exceptions["service_id"]])
+        columns = np.array([(d - first_date).days if d else -1 for d in exception_dates])
+        kind = pd.to_numeric(exceptions["exception_type"], errors="coerce").to_numpy()
+        valid = (rows >= 0) & (columns >= 0)
+        added, removed = valid & (kind == 1), valid & (kind == 2)
+        active[rows[added], columns[added]] = True
+        active[rows[removed], columns[removed]] = False
+
+    return ServiceCalendar(service_ids, first_date, active)
+
+
+def load_service_calendar(version_dir: Union[str, Path], rebuild: bool = False) -> ServiceCalendar:
+    """
+    Open the cached service calendar of a static version, building it on first use.
+
+    Args:
+        version_dir: Static version directory (or its ``manifest.json``)
+        rebuild: Ignore an existing cache
+
+    Returns:
+        Service calendar of the version
+    """
+    path = Path(version_dir)
+    version_dir = path.parent if path.name == MANIFEST_NAME else path
+    calendar_path = version_dir / CALENDAR_FILE_NAME
+    if not rebuild and calendar_path.exists():
+        try:
+            return ServiceCalendar.load(calendar_path)
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable service calendar {calendar_path}: {e}")
+    calendar = build_service_calendar(StaticVersion(version_dir))
+    calendar.save(calendar_path)
+    logger.info(
+        f"Service calendar built for {version_dir}: {len(calendar.service_ids)} services, "
+        f"{calendar.first_date} .. {calendar.last_date}"
+    )
+    return calendar
@@ -0,0 +1,362 @@
+"""
+Route shapes of a GTFS Static version with a grid index for bulk map-matching.
+
+``shapes.txt`` points are projected once per static version onto a local
+plane (equirectangular around the feed's centre; metres, accurate to well
+under a metre over a city) and kept as flat arrays sorted by
+``(shape, shape_pt_sequence)``:
+
+    shape_ids[s]                       shape_id of shape ``s`` (sorted)
+    shape_start[s]:shape_start[s + 1]  its points
+    x / y / dist                       projected point and metres along the shape
+
+Every segment between consecutive points is registered in the grid cells its
+bounding box, widened by the match ``radius``, overlaps. Cells are keyed by
+``(shape, cell x, cell y)``, so the candidates for a position on a known shape
+are one ``searchsorted`` away and only include that shape's nearby segments.
+``snap`` matches millions of positions at once: candidates are expanded into
+flat arrays, projected onto their segments and the nearest kept.
+
+The index is cached next to the version's tables:
+
+    silver/static/<feed_name>/<version_id>/shape_index/
+        index.json  shapes.arrow  points.arrow  trips.arrow
+"""
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+
+from .static_store import MANIFEST_NAME, StaticVersion
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR_NAME = "shape_index"
+INDEX_FORMAT = 1
+
+MISSING = -1
+
+_EARTH_RADIUS = 6_371_008.8
+# Cell coordinates are packed into 21 bits each around this offset.
+_CELL_OFFSET = 1 << 20
+_CELL_MASK = (1 << 21) - 1
+
+
+class ShapeIndex:
+    """
+    Projected route shapes with a per-shape grid over their segments.
+    """
+
+    def __init__(
+        self,
+        shape_ids: np.ndarray,
+        shape_start: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        trip_ids: np.ndarray,
+        trip_shape: np.ndarray,
+        metadata: Dict[str, Any],
+    ):
+        """
+        Initialize the index from its arrays (see ``build_shape_index``).
+
+        Args:
+            shape_ids: Sorted shape ids
+            shape_start: Point offsets per shape (len(shape_ids) + 1)
+            x, y: Projected point coordinates in metres
+            trip_ids: Sorted trip ids
+            trip_shape: Shape position per trip (``MISSING`` without a shape)
+            metadata: ``origin_lat``/``origin_lon`` of the projection,
+                      ``cell_size`` and ``radius`` in metres, version info
+        """
+        self.shape_ids = shape_ids
+        self.shape_start = shape_start
+        self.x = x
+        self.y = y
+        self.trip_ids = trip_ids
+        self.trip_shape = trip_shape
+        self.metadata = metadata
+        self.cell_size = float(metadata["cell_size"])
+        self.radius = float(metadata["radius"])
+        self._shape_pos = {shape_id: i for i, shape_id in enumerate(shape_ids)}
+        self._trip_pos = {trip_id: i for i, trip_id in enumerate(trip_ids)}
+
+        shape_of_point = np.repeat(np.arange(len(shape_ids), dtype=np.int64), np.diff(shape_start))
+        step = np.hypot(np.diff(x), np.diff(y)) if len(x) else np.zeros(0)
+        # A segment joins point i to i + 1 of the same shape.
+        same_shape = shape_of_point[1:] == shape_of_point[:-1] if len(x) else np.zeros(0, dtype=bool)
+        distance = np.concatenate([[0.0], np.cumsum(np.where(same_shape, step, 0.0))]) if len(x) else np.zeros(0)
+        # Metres along the shape: the running total restarted at each shape's first point.
+        self.dist = distance - distance[shape_start[:-1]].repeat(np.diff(shape_start)) if len(x) else distance
+        self.segment = np.flatnonzero(same_shape)
+        self.segment_shape = shape_of_point[self.segment]
+        self._build_grid()
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def _cell_keys(self, shape: np.ndarray, cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        return (
+            (shape.astype(np.int64) << 42)
+            | (((cx + _CELL_OFFSET) & _CELL_MASK) << 21)
+            | ((cy + _CELL_OFFSET) & _CELL_MASK)
+        )
+
+    def _build_grid(self) -> None:
+        a, b = self.segment, self.segment + 1
+        low_x = (np.minimum(self.x[a], self.x[b]) - self.radius) // self.cell_size
+        high_x = (np.maximum(self.x[a], self.x[b]) + self.radius) // self.cell_size
+        low_y = (np.minimum(self.y[a], self.y[b]) - self.radius) // self.cell_size
+        high_y = (np.maximum(self.y[a], self.y[b]) + self.radius) // self.cell_size
+        width = (high_x - low_x + 1).astype(np.int64)
+        cells = width * (high_y - low_y + 1).astype(np.int64)
+
+        # One entry per (segment, covered cell).
+        entry_segment = np.repeat(np.arange(len(a), dtype=np.int64), cells)
+        local = np.arange(int(cells.sum()), dtype=np.int64) - np.repeat(np.cumsum(cells) - cells, cells)
+        cx = low_x.astype(np.int64)[entry_segment] + local % width[entry_segment]
+        cy = low_y.astype(np.int64)[entry_segment] + local // width[entry_segment]
+        keys = self._cell_keys(self.segment_shape[entry_segment], cx, cy)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        self._cell_segments = entry_segment[order]
+        self._cell_keys_sorted, first = np.unique(keys, return_index=True)
+        self._cell_start = np.append(first, len(keys)).astype(np.int64)
+
+    def project(self, lat: Sequence[float], lon: Sequence[float]):
+        """Latitude/longitude to local ``(x, y)`` metres."""
+        lat0, lon0 = np.radians(self.metadata["origin_lat"]), np.radians(self.metadata["origin_lon"])
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        lon = np.radians(np.asarray(lon, dtype=np.float64))
+        return _EARTH_RADIUS * (lon - lon0) * np.cos(lat0), _EARTH_RADIUS * (lat - lat0)
+
+    def shapes_of(self, trip_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """Shape position per trip id (``MISSING`` for unknown trips or trips without a shape)."""
+        inverse, unique = pd.factorize(pd.Series(trip_ids, dtype=object))
+        positions = np.array([self._trip_pos.get(t, MISSING) for t in unique], dtype=np.int64)
+        shapes = np.where(positions >= 0, self.trip_shape[np.maximum(positions, 0)], MISSING)
+        # factorize marks nulls with -1, which picks the appended MISSING.
+        return np.append(shapes, MISSING)[inverse]
+
+    def shape_positions(self, shape_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """Shape position per shape id (``MISSING`` if unknown)."""
+        inverse, unique = pd.factorize(pd.Series(shape_ids, dtype=object))
+        positions = np.array([self._shape_pos.get(s, MISSING) for s in unique], dtype=np.int64)
+        return np.append(positions, MISSING)[inverse]
+
+    def snap(
+        self,
+        shapes: np.ndarray,
+        lat: Sequence[float],
+        lon: Sequence[float],
+        chunk_size: int = 1_000_000,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Snap positions onto their shapes.
+
+        Args:
+            shapes: Shape position per point (``shapes_of``/``shape_positions``)
+            lat, lon: Point coordinates
+            chunk_size: Points matched per pass (bounds the candidate arrays)
+
+        Returns:
+            ``dist`` (metres along the shape) and ``offset`` (metres from it)
+            of the nearest segment within ``radius``, NaN where there is none
+        """
+        shapes = np.asarray(shapes, dtype=np.int64)
+        x, y = self.project(lat, lon)
+        dist = np.full(len(shapes), np.nan)
+        offset = np.full(len(shapes), np.nan)
+        for start in range(0, len(shapes), chunk_size):
+            part = slice(start, start + chunk_size)
+            dist[part], offset[part] = self._snap(shapes[part], x[part], y[part])
+        return {"dist": dist, "offset": offset}
+
+    def _snap(self, shapes: np.ndarray, px: np.ndarray, py: np.ndarray):
+        n = len(shapes)
+        dist, offset = np.full(n, np.nan), np.full(n, np.nan)
+        valid = (shapes >= 0) & np.isfinite(px) & np.isfinite(py)
+        if not valid.any() or not len(self._cell_keys_sorted):
+            return dist, offset
+        points = np.flatnonzero(valid)
+        keys = self._cell_keys(
+            shapes[points],
+            np.floor(px[points] / self.cell_size).astype(np.int64),
+            np.floor(py[points] / self.cell_size).astype(np.int64),
+        )
+        cell = np.searchsorted(self._cell_keys_sorted, keys)
+        found = cell < len(self._cell_keys_sorted)
+        found[found] &= self._cell_keys_sorted[cell[found]] == keys[found]
+        points, cell = points[found], cell[found]
+        if not len(points):
+            return dist, offset
+        counts = self._cell_start[cell + 1] - self._cell_start[cell]
+
+        # Flat (point, candidate segment) pairs.
+        point = np.repeat(points, counts)
+        entry = np.repeat(self._cell_start[cell] - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        a = self.segment[self._cell_segments[entry]]
+        ax, ay = self.x[a], self.y[a]
+        dx, dy = self.x[a + 1] - ax, self.y[a + 1] - ay
+        length2 = dx * dx + dy * dy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.clip(((px[point] - ax) * dx + (py[point] - ay) * dy) / length2, 0.0, 1.0)
+        t = np.where(length2 > 0, t, 0.0)
+        d = np.hypot(ax + t * dx - px[point], ay + t * dy - py[point])
+
+        # Candidates are contiguous per point: take each point's first nearest one
+        # (cell entries are in segment order, so ties go to the earliest along the shape).
+        group_start = np.cumsum(counts) - counts
+        group_start = group_start[counts > 0]
+        nearest = np.repeat(np.minimum.reduceat(d, group_start), counts[counts > 0])
+        best = np.flatnonzero(d == nearest)
+        best = best[np.append(True, point[best][1:] != point[best][:-1])]
+        best = best[d[best] <= self.radius]
+        a, t = a[best], t[best]
+        dist[point[best]] = self.dist[a] + t * (self.dist[a + 1] - self.dist[a])
+        offset[point[best]] = d[best]
+        return dist, offset
+
+    def snap_trips(self, trip_ids: Sequence[Optional[str]], lat: Sequence[float], lon: Sequence[float]):
+        """``snap`` positions onto the shape of each position's trip."""
+        return self.snap(self.shapes_of(trip_ids), lat, lon)
+
+    def shape_length(self, shape_id: str) -> Optional[float]:
+        """Length of ``shape_id`` in metres."""
+        s = self._shape_pos.get(shape_id)
+        if s is None or self.shape_start[s + 1] == self.shape_start[s]:
+            return None
+        return float(self.dist[self.shape_start[s + 1] - 1])
+
+    def save(self, directory: Union[str, Path]) -> Path:
+        """Write the index as Arrow IPC files (atomically replacing ``directory``)."""
+        directory = Path(directory)
+        tmp_dir = directory.with_name(f".{directory.name}.inprogress")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+        tables = {
+            "shapes": pa.table({
+                "shape_id": pa.array(self.shape_ids.tolist(), pa.string()),
+                "start": pa.array(self.shape_start[:-1], pa.int64()),
+            }),
+            "points": pa.table({"x": pa.array(self.x, pa.float64()), "y": pa.array(self.y, pa.float64())}),
+            "trips": pa.table({
+                "trip_id": pa.array(self.trip_ids.tolist(), pa.string()),
+                "shape": pa.array(self.trip_shape, pa.int32()),
+            }),
+        }
+        for name, table in tables.items():
+            feather.write_feather(table, tmp_dir / f"{name}.arrow", compression="uncompressed")
+        with open(tmp_dir / "index.json", "w", encoding="utf-8") as fh:
+            json.dump(dict(self.metadata, format=INDEX_FORMAT), fh, indent=2, ensure_ascii=False)
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+        return directory
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> "ShapeIndex":
+        """Open an index written by ``save`` (the grid is rebuilt in memory)."""
+        directory = Path(directory)
+        with open(directory / "index.json", "r", encoding="utf-8") as fh:
+            metadata = json.load(fh)
+        if metadata.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported shape index format in {directory}: {metadata.get('format')}")
+
+        def read(name: str) -> pa.Table:
+            return ipc.open_file(pa.memory_map(str(directory / f"{name}.arrow"), "r")).read_all()
+
+        shapes, points, trips = read("shapes"), read("points"), read("trips")
+        return cls(
+            shape_ids=np.array(shapes.column("shape_id").to_pylist(), dtype=object),
+            shape_start=np.append(shapes.column("start").to_numpy(), points.num_rows).astype(np.int64),
+            x=points.column("x").to_numpy(),
+            y=points.column("y").to_numpy(),
+            trip_ids=np.array(trips.column("trip_id").to_pylist(), dtype=object),
+            trip_shape=trips.column("shape").to_numpy().astype(np.int64),
+            metadata=metadata,
+        )
+
+
+def build_shape_index(version: StaticVersion, cell_size: float = 50.0, radius: float = 50.0) -> ShapeIndex:
+    """
+    Build the shape index of a materialised static version.
+
+    Args:
+        version: Static version with ``shapes`` (``trips`` maps trips to shapes)
+        cell_size: Grid cell edge in metres
+        radius: Farthest distance in metres at which a position still matches
+
+    Returns:
+        In-memory index (not yet cached; see ``load_shape_index``)
+    """
+    points = version.to_pandas("shapes", columns=["shape_id", "shape_pt_lat", "shape_pt_lon", "shape_pt_sequence"])
+    points = points.dropna(subset=["shape_id", "shape_pt_lat", "shape_pt_lon"])
+    points = points.assign(shape_id=points["shape_id"].astype(str))
+    points = points.sort_values(["shape_id", "shape_pt_sequence"], kind="stable", ignore_index=True)
+    shape_ids, first = np.unique(points["shape_id"].to_numpy(dtype=object), return_index=True)
+    shape_start = np.append(first, len(points)).astype(np.int64)
+
+    lat = points["shape_pt_lat"].to_numpy(dtype=np.float64)
+    lon = points["shape_pt_lon"].to_numpy(dtype=np.float64)
+    metadata: Dict[str, Any] = {
+        "feed_name": version.manifest.get("feed_name"),
+        "version_id": version.manifest.get("version_id"),
+        "origin_lat": float(lat.mean()) if len(lat) else 0.0,
+        "origin_lon": float(lon.mean()) if len(lon) else 0.0,
+        "cell_size": cell_size,
+        "radius": radius,
+    }
+    lat0, lon0 = np.radians(metadata["origin_lat"]), np.radians(metadata["origin_lon"])
+    x = _EARTH_RADIUS * (np.radians(lon) - lon0) * np.cos(lat0)
+    y = _EARTH_RADIUS * (np.radians(lat) - lat0)
+
+    trip_ids, trip_shape = np.array([], dtype=object), np.array([], dtype=np.int64)
+    if version.has_table("trips") and "shape_id" in version.manifest["tables"]["trips"]["columns"]:
+        trips = version.to_pandas("trips", columns=["trip_id", "shape_id"]).dropna(subset=["trip_id"])
+        trips = trips.assign(trip_id=trips["trip_id"].astype(str)).drop_duplicates("trip_id").sort_values("trip_id")
+        shape_pos = {shape_id: i for i, shape_id in enumerate(shape_ids)}
+        trip_ids = trips["trip_id"].to_numpy(dtype=object)
+        trip_shape = np.array(
+            [shape_pos.get(str(s), MISSING) if pd.notna(s) else MISSING for s in trips["shape_id"]], dtype=np.int64
+        )
+
+    return ShapeIndex(shape_ids, shape_start, x, y, trip_ids, trip_shape, metadata)
+
+
+def load_shape_index(version_dir: Union[str, Path], rebuild: bool = False) -> ShapeIndex:
+    """
+    Open the cached shape index of a static version, building it on first use.
+
+    Args:
+        version_dir: Static version directory (or its ``manifest.json``)
+        rebuild: Ignore an existing cache
+
+    Returns:
+        Shape index of the version
+    """
+    path = Path(version_dir)
+    version_dir = path.parent if path.name == MANIFEST_NAME else path
+    index_dir = version_dir / INDEX_DIR_NAME
+    if not rebuild and (index_dir / "index.json").exists():
+        try:
+            return ShapeIndex.load(index_dir)
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable shape index {index_dir}: {e}")
+    index = build_shape_index(StaticVersion(version_dir))
+    index.save(index_dir)
+    logger.info(
+        f"Shape index built for {version_dir}: {len(index.shape_ids)} shapes, {len(index)} points"
+    )
+    return index
@@ -0,0 +1,366 @@
+"""
+Incremental silver layer built from the bronze GTFS-RT datasets.
+
+Each run reads only bronze Parquet files it has not processed yet and writes
+cleaned, typed rows to
+
+    silver/<dataset>/feed=<feed_name>/date=<YYYY-MM-DD>/part-<input digest>.parquet
+
+Per dataset and feed, ``state/silver.json`` keeps
+
+  * a watermark date: partitions before it are never listed again;
+  * the names of the bronze files already processed in partitions from the
+    watermark on (finalised bronze files are immutable, so a name is enough);
+  * the last observation time per entity (vehicle, trip, stop of a trip), so
+    a row repeated across polls, and across runs, is written once.
+
+Rows are deduplicated by ``(feed, entity, observation time)`` where the
+observation time is the entity ``timestamp``, else the feed header
+timestamp, else ``fetched_at``. Vehicle delta tombstones (``delta_kind`` 2)
+are dropped. Rows are then joined to the static version that was current
+when they were fetched (``static_registry``): ``static_version``, whether the
+trip is scheduled on its start date (``service_calendar``), the scheduled
+stop of a vehicle and the scheduled times of predicted stops, with missing
+stop time delays filled (``schedule_index``), and a vehicle's distance along
+its trip's shape (``shape_index``).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .config import GTFSConfig
+from .parquet_sink import RT_SCHEMAS
+from .schedule_index import ScheduleIndex, load_schedule_index
+from .service_calendar import ServiceCalendar, load_service_calendar
+from .shape_index import ShapeIndex, load_shape_index
+from .static_registry import StaticFeedRegistry, StaticFeedVersion
+from .static_store import StaticVersion
+
+
+_UTC_SECONDS = pa.timestamp("s", tz="UTC")
+
+# Columns identifying one real-world entity per dataset.
+ENTITY_KEYS: Dict[str, List[str]] = {
+    "trip_updates": ["trip_id", "start_date"],
+    "vehicle_positions": ["vehicle_id"],
+    "stop_time_updates": ["trip_id", "start_date", "stop_sequence", "stop_id"],
+}
+
+_JOIN_FIELDS: Dict[str, List[pa.Field]] = {
+    "trip_updates": [
+        pa.field("static_version", pa.string()),
+        pa.field("scheduled", pa.bool_()),
+    ],
+    "vehicle_positions": [
+        pa.field("static_version", pa.string()),
+        pa.field("scheduled", pa.bool_()),
+        pa.field("scheduled_stop_id", pa.string()),
+        # Metres along the trip's shape; null off-shape or without shapes.
+        pa.field("distance_along_shape", pa.float64()),
+    ],
+    "stop_time_updates": [
+        pa.field("static_version", pa.string()),
+        pa.field("scheduled", pa.bool_()),
+        pa.field("scheduled_arrival_time", _UTC_SECONDS),
+        pa.field("scheduled_departure_time", _UTC_SECONDS),
+    ],
+}
+
+SILVER_SCHEMAS: Dict[str, pa.Schema] = {
+    dataset: pa.schema([f for f in schema if f.name != "delta_kind"] + _JOIN_FIELDS[dataset])
+    for dataset, schema in RT_SCHEMAS.items()
+}
+
+# Days of per-entity observation times kept behind the watermark.
+_LAST_SEEN_DAYS = 2
+
+
+@dataclass
+class SilverReport:
+    """What one run read and wrote."""
+    files_read: int = 0
+    rows_read: int = 0
+    rows_written: int = 0
+    duplicates_dropped: int = 0
+    files_written: int = 0
+
+    def report(self) -> str:
+        """Human-readable summary."""
+        return (
+            f"Read {self.rows_read:,} rows from {self.files_read} new bronze files; "
+            f"wrote {self.rows_written:,} rows to {self.files_written} silver files "
+            f"({self.duplicates_dropped:,} duplicates dropped)"
+        )
+
+
+def _float_to_timestamps(values: np.ndarray) -> pa.Array:
+    missing = np.isnan(values)
+    seconds = pa.array(np.where(missing, 0, values).astype(np.int64), mask=missing)
+    return seconds.cast(_UTC_SECONDS)
+
+
+class SilverBuilder:
+    """
+    Turn new bronze RT rows into deduplicated, schedule-joined silver rows.
+    """
+
+    def __init__(self, config: GTFSConfig):
+        """
+        Args:
+            config: Supplies ``data_directory``
+        """
+        self.config = config
+        self.data_directory = Path(config.data_directory)
+        self.bronze_dir = self.data_directory / "bronze"
+        self.silver_dir = self.data_directory / "silver"
+        self.state_path = self.data_directory / "state" / "silver.json"
+        self.registry = StaticFeedRegistry.load(self.data_directory / "state" / "static_registry.json")
+        self.logger = logging.getLogger(__name__)
+        self.report = SilverReport()
+        self._static: Dict[str, Tuple[Optional[ScheduleIndex], Optional[ServiceCalendar], Optional[ShapeIndex]]] = {}
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable silver state {self.state_path}: {e}")
+            return {}
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        tmp_path.replace(self.state_path)
+
+    def reset(self) -> None:
+        """Forget all progress and delete the silver RT datasets (static versions are kept)."""
+        for dataset in RT_SCHEMAS:
+            if (self.silver_dir / dataset).is_dir():
+                shutil.rmtree(self.silver_dir / dataset)
+        self.state_path.unlink(missing_ok=True)
+
+    def run(self) -> SilverReport:
+        """Process every new bronze file and return the report."""
+        state = self._load_state()
+        for dataset in RT_SCHEMAS:
+            dataset_dir = self.bronze_dir / dataset
+            if not dataset_dir.is_dir():
+                continue
+            for feed_dir in sorted(dataset_dir.glob("feed=*")):
+                feed_name = feed_dir.name[len("feed="):]
+                feed_state = state.setdefault(dataset, {}).setdefault(
+                    feed_name, {"watermark": None, "files": {}, "last_seen": {}}
+                )
+                self._process_feed(dataset, feed_name, feed_dir, feed_state)
+                # Saved per feed: an interrupted run repeats at most one feed.
+                self._save_state(state)
+        return self.report
+
+    def _process_feed(self, dataset: str, feed_name: str, feed_dir: Path, feed_state: Dict[str, Any]) -> None:
+        watermark = feed_state["watermark"]
+        new_files: Dict[str, List[Path]] = {}
+        for partition in sorted(feed_dir.glob("date=*")):
+            day = partition.name[len("date="):]
+            if watermark is not None and day < watermark:
+                continue
+            done = set(feed_state["files"].get(day, []))
+            paths = [path for path in sorted(partition.glob("*.parquet")) if path.name not in done]
+            if paths:
+                new_files[day] = paths
+        if not new_files:
+            return
+
+        paths = [path for day_paths in new_files.values() for path in day_paths]
+        # The explicit schema reads files written before newer columns existed.
+        table = ds.dataset([str(p) for p in paths], schema=RT_SCHEMAS[dataset], format="parquet").to_table()
+        self.report.files_read += len(paths)
+        self.report.rows_read += table.num_rows
+
+        table = self._deduplicate(dataset, table, feed_state["last_seen"])
+        if table.num_rows:
+            table = self._join_static(dataset, feed_name, table)
+            # Named after its inputs, so rerunning an interrupted feed overwrites its files.
+            digest = hashlib.sha1("\n".join(str(p) for p in paths).encode("utf-8")).hexdigest()[:16]
+            self._write(dataset, feed_name, table, digest)
+
+        for day, day_paths in new_files.items():
+            feed_state["files"].setdefault(day, []).extend(path.name for path in day_paths)
+        self._advance_watermark(feed_state, max(new_files))
+        self.logger.info(f"Silver {dataset} ({feed_name}): {len(paths)} new bronze files processed")
+
+    def _deduplicate(self, dataset: str, table: pa.Table, last_seen: Dict[str, int]) -> pa.Table:
+        """Drop tombstones, repeated observations and observations already written."""
+        if "delta_kind" in table.column_names:
+            table = table.filter(pc.fill_null(pc.not_equal(table.column("delta_kind"), 2), True))
+        # Cast in Arrow so integer keys render the same whether or not a batch has nulls.
+        key = pc.binary_join_element_wise(
+            *[pc.fill_null(pc.cast(table.column(name), pa.string()), "") for name in ENTITY_KEYS[dataset]],
+            "\t",
+        ).to_pandas()
+
+        observed = pd.Series(pc.cast(table.column("timestamp"), pa.int64()).to_numpy(zero_copy_only=False))
+        header = pd.Series(pc.cast(table.column("feed_timestamp"), pa.int64()).to_numpy(zero_copy_only=False))
+        # fetched_at is local wall time; only used when the feed sent no timestamps at all.
+        fetched = pd.Series(
+            [value.timestamp() for value in table.column("fetched_at").to_pylist()], dtype="float64"
+        )
+        observed = observed.fillna(header).fillna(fetched).astype("int64")
+
+        frame = pd.DataFrame({"key": key.to_numpy(), "observed": observed.to_numpy()})
+        frame["row"] = np.arange(len(frame))
+        frame = frame.sort_values(["key", "observed", "row"], kind="stable")
+        frame = frame.drop_duplicates(["key", "observed"])
+        previous = frame["key"].map(last_seen).fillna(-np.inf)
+        frame = frame[frame["observed"] > previous]
+
+        for entity, seen in frame.groupby("key")["observed"].max().items():
+            last_seen[entity] = int(seen)
+        self.report.duplicates_dropped += table.num_rows - len(frame)
+        return table.take(pa.array(np.sort(frame["row"].to_numpy())))
+
+    def _version_for(self, feed_name: str, fetched: np.ndarray) -> Tuple[List[StaticFeedVersion], np.ndarray]:
+        """Static version current at each fetch time (-1 without any version)."""
+        versions = sorted(self.registry.versions(feed_name), key=lambda v: v.version_id)
+        if not versions:
+            return versions, np.full(len(fetched), -1)
+        starts = np.array([
+            datetime.strptime(v.version_id, "%Y%m%d_%H%M%S").replace(tzinfo=timezone.utc).timestamp()
+            for v in versions
+        ])
+        # Rows older than the first version use it rather than nothing.
+        return versions, np.maximum(np.searchsorted(starts, fetched, side="right") - 1, 0)
+
+    def _static_for(
+        self, version: StaticFeedVersion
+    ) -> Tuple[Optional[ScheduleIndex], Optional[ServiceCalendar], Optional[ShapeIndex]]:
+        if version.artifact not in self._static:
+            index = calendar = shapes = None
+            try:
+                index = load_schedule_index(version.artifact)
+                calendar = load_service_calendar(version.artifact)
+                if StaticVersion(version.artifact).has_table("shapes"):
+                    shapes = load_shape_index(version.artifact)
+            except Exception as e:
+                self.logger.warning(f"Static version {version.artifact} unavailable for silver join: {e}")
+            self._static[version.artifact] = (index, calendar, shapes)
+        return self._static[version.artifact]
+
+    def _join_static(self, dataset: str, feed_name: str, table: pa.Table) -> pa.Table:
+        n = table.num_rows
+        # Naive fetched_at cast to seconds, compared with version ids read the same way.
+        fetched = pc.cast(table.column("fetched_at"), pa.int64()).to_numpy(zero_copy_only=False)
+        versions, version_of_row = self._version_for(feed_name, fetched)
+
+        static_version = np.full(n, None, dtype=object)
+        scheduled = np.full(n, None, dtype=object)
+        stop_ids = np.full(n, None, dtype=object)
+        along = np.full(n, np.nan)
+        arrival = np.full(n, np.nan)
+        departure = np.full(n, np.nan)
+        trip_ids = table.column("trip_id").to_pylist()
+        start_dates = table.column("start_date").to_pylist()
+
+        for v in np.unique(version_of_row[version_of_row >= 0]):
+            rows = np.flatnonzero(version_of_row == v)
+            static_version[rows] = versions[v].version_id
+            index, calendar, shapes = self._static_for(versions[v])
+            if index is None:
+                continue
+            row_trips = [trip_ids[i] for i in rows]
+            row_dates = [start_dates[i] for i in rows]
+            if calendar is not None:
+                dated = np.array([bool(d) for d in row_dates], dtype=bool)
+                mask = calendar.scheduled_mask(index, row_trips, row_dates)
+                scheduled[rows[dated]] = mask[dated]
+            if dataset == "vehicle_positions":
+                sequences = table.column("current_stop_sequence").take(pa.array(rows)).to_pylist()
+                matched = index.locate(row_trips, sequences)
+                found = matched >= 0
+                stop_ids[rows[found]] = index.stop_ids[index.stop_code[matched[found]]]
+                if shapes is not None:
+                    along[rows] = shapes.snap_trips(
+                        row_trips,
+                        table.column("latitude").take(pa.array(rows)).to_numpy(zero_copy_only=False),
+                        table.column("longitude").take(pa.array(rows)).to_numpy(zero_copy_only=False),
+                    )["dist"]
+            elif dataset == "stop_time_updates":
+                times = index.scheduled_times(
+                    row_trips,
+                    row_dates,
+                    table.column("stop_sequence").take(pa.array(rows)).to_pylist(),
+                    table.column("stop_id").take(pa.array(rows)).to_pylist(),
+                )
+                arrival[rows], departure[rows] = times["arrival"], times["departure"]
+
+        table = table.select([name for name in table.column_names if name != "delta_kind"])
+        table = table.append_column(_JOIN_FIELDS[dataset][0], pa.array(static_version, pa.string()))
+        table = table.append_column(_JOIN_FIELDS[dataset][1], pa.array(scheduled, pa.bool_()))
+        if dataset == "vehicle_positions":
+            table = table.append_column(_JOIN_FIELDS[dataset][2], pa.array(stop_ids, pa.string()))
+            table = table.append_column(_JOIN_FIELDS[dataset][3], pa.array(along, pa.float64(), from_pandas=True))
+        elif dataset == "stop_time_updates":
+            scheduled_arrival, scheduled_departure = _float_to_timestamps(arrival), _float_to_timestamps(departure)
+            table = table.append_column(_JOIN_FIELDS[dataset][2], scheduled_arrival)
+            table = table.append_column(_JOIN_FIELDS[dataset][3], scheduled_departure)
+            for event, scheduled_time in (("arrival", scheduled_arrival), ("departure", scheduled_departure)):
+                predicted = pc.cast(table.column(f"{event}_time"), pa.int64())
+                computed = pc.cast(pc.subtract(predicted, pc.cast(scheduled_time, pa.int64())), pa.int32())
+                column = table.column(f"{event}_delay")
+                table = table.set_column(
+                    table.schema.get_field_index(f"{event}_delay"),
+                    table.schema.field(f"{event}_delay"),
+                    pc.coalesce(column, computed),
+                )
+        return table.cast(SILVER_SCHEMAS[dataset])
+
+    def _write(self, dataset: str, feed_name: str, table: pa.Table, name: str) -> None:
+        """Write one Parquet file per fetch date of ``table``."""
+        days = pc.strftime(table.column("fetched_at"), format="%Y-%m-%d")
+        for day in pc.unique(days).to_pylist():
+            part = table.filter(pc.equal(days, day))
+            directory = self.silver_dir / dataset / f"feed={feed_name}" / f"date={day}"
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"part-{name}.parquet"
+            # Hidden while being written, like bronze files.
+            tmp_path = path.with_name(f".{path.name}.inprogress")
+            pq.write_table(part, tmp_path, compression="zstd")
+            os.replace(tmp_path, path)
+            self.report.rows_written += part.num_rows
+            self.report.files_written += 1
+
+    @staticmethod
+    def _advance_watermark(feed_state: Dict[str, Any], newest_day: str) -> None:
+        """
+        Move the watermark to the day before the newest processed partition.
+
+        The bronze writer of the previous day is closed when the next day
+        starts, so its last file can still appear after the new day's first.
+        """
+        newest = datetime.strptime(newest_day, "%Y-%m-%d")
+        watermark = (newest - timedelta(days=1)).strftime("%Y-%m-%d")
+        if feed_state["watermark"] is not None and watermark <= feed_state["watermark"]:
+            return
+        feed_state["watermark"] = watermark
+        feed_state["files"] = {day: names for day, names in feed_state["files"].items() if day >= watermark}
+        horizon = (newest - timedelta(days=_LAST_SEEN_DAYS)).replace(tzinfo=timezone.utc).timestamp()
+        feed_state["last_seen"] = {
+            entity: seen for entity, seen in feed_state["last_seen"].items() if seen >= horizon
+        }
@@ -0,0 +1,196 @@
+"""
+Embedded SQLite sink for GTFS-RT snapshots and GTFS Static tables.
+
+For single-VM deployments: everything lands in one database file
+(``<data_directory>/gtfs.sqlite`` by default) that local analyses and the
+simulator can query directly. The database runs in WAL mode so readers are
+never blocked by the ingest writer.
+
+RT tables (``trip_updates``, ``stop_time_updates``, ``vehicle_positions``)
+have the columns of ``parquet_sink.RT_SCHEMAS`` plus ``feed_name``;
+``fetched_at`` is local time text (``YYYY-MM-DD HH:MM:SS``) and the UTC
+timestamps are Unix seconds. Rows are inserted with one prepared
+``executemany`` per dataset, and all snapshots of an ingestion cycle share a
+single transaction that ``commit`` ends.
+
+Static tables are stored as ``static_<table>`` with ``feed_name`` and
+``version_id`` columns; a new version of a feed replaces its previous rows.
+"""
+
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+import pyarrow as pa
+
+from .parquet_sink import RT_SCHEMAS, snapshot_tables
+
+if TYPE_CHECKING:  # pandas is only needed by callers storing static tables
+    import pandas as pd
+
+
+# Secondary indexes per table, created with the table.
+INDEXES: Dict[str, List[Tuple[str, ...]]] = {
+    "trip_updates": [("route_id", "trip_id", "timestamp"), ("feed_name", "fetched_at")],
+    "stop_time_updates": [("route_id", "trip_id", "timestamp"), ("stop_id", "fetched_at")],
+    "vehicle_positions": [("route_id", "trip_id", "timestamp"), ("vehicle_id", "fetched_at")],
+    "static_trips": [("feed_name", "route_id", "trip_id")],
+    "static_stop_times": [("feed_name", "trip_id", "stop_sequence")],
+    "static_stops": [("feed_name", "stop_id")],
+    "static_shapes": [("feed_name", "shape_id", "shape_pt_sequence")],
+}
+
+
+def _sqlite_type(field: pa.Field) -> str:
+    if pa.types.is_integer(field.type) or pa.types.is_timestamp(field.type):
+        return "INTEGER"
+    if pa.types.is_floating(field.type):
+        return "REAL"
+    return "TEXT"
+
+
+def _index_statements(table: str, available: Optional[Set[str]] = None) -> List[str]:
+    """Index statements for ``table``, limited to indexes whose columns are ``available``."""
+    return [
+        f"CREATE INDEX IF NOT EXISTS {table}_{'_'.join(columns)}_idx ON {table} ({', '.join(columns)})"
+        for columns in INDEXES.get(table, [])
+        if available is None or set(columns) <= available
+    ]
+
+
+class SQLiteSink:
+    """
+    Write GTFS-RT rows and GTFS Static tables into one SQLite file.
+
+    Not thread-safe; ``DatabaseManager`` calls it from its single I/O thread.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Initialize the sink and create the RT tables.
+
+        Args:
+            path: Database file
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are managed explicitly (BEGIN ... COMMIT per cycle).
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.pending_rows = 0
+        self._insert_sql: Dict[str, str] = {}
+        for dataset, schema in RT_SCHEMAS.items():
+            columns = ["feed_name TEXT NOT NULL"] + [f"{f.name} {_sqlite_type(f)}" for f in schema]
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {dataset} ({', '.join(columns)})")
+            known = {row[1] for row in self.conn.execute(f"PRAGMA table_info({dataset})")}
+            for f in schema:
+                if f.name not in known:  # column added to RT_SCHEMAS after the table was created
+                    self.conn.execute(f"ALTER TABLE {dataset} ADD COLUMN {f.name} {_sqlite_type(f)}")
+            for statement in _index_statements(dataset):
+                self.conn.execute(statement)
+            names = ["feed_name"] + schema.names
+            self._insert_sql[dataset] = (
+                f"INSERT INTO {dataset} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+            )
+
+    def _begin(self) -> None:
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+
+    def append_snapshot(self, data: Dict[str, Any], timestamp: str, feed_name: str) -> int:
+        """
+        Insert the rows of one parsed GTFS-RT snapshot into the open cycle transaction.
+
+        Args:
+            data: Parsed snapshot (records, column mapping or record batch per dataset)
+            timestamp: Cycle timestamp (YYYYMMDD_HHMMSS, local time)
+            feed_name: Feed label stored in every row
+
+        Returns:
+            Number of rows inserted across all datasets
+        """
+        fetched_at = datetime.strptime(timestamp, "%Y%m%d_%H%M%S")
+        fetched_text = fetched_at.strftime("%Y-%m-%d %H:%M:%S")
+        inserted = 0
+        self._begin()
+        # A failing snapshot is undone without discarding the rest of the cycle.
+        self.conn.execute("SAVEPOINT snapshot")
+        try:
+            for dataset, table in snapshot_tables(data, fetched_at).items():
+                columns = []
+                for field in table.schema:
+                    if field.name == "fetched_at":
+                        columns.append([fetched_text] * table.num_rows)
+                    elif pa.types.is_timestamp(field.type):
+                        columns.append(table.column(field.name).cast(pa.int64()).to_pylist())
+                    else:
+                        columns.append(table.column(field.name).to_pylist())
+                self.conn.executemany(
+                    self._insert_sql[dataset],
+                    ((feed_name,) + row for row in zip(*columns)),
+                )
+                inserted += table.num_rows
+        except Exception:
+            self.conn.execute("ROLLBACK TO snapshot")
+            raise
+        finally:
+            self.conn.execute("RELEASE snapshot")
+        self.pending_rows += inserted
+        return inserted
+
+    def replace_static(self, feed_name: str, version_id: str, data: Dict[str, "pd.DataFrame"]) -> int:
+        """
+        Replace a feed's static tables with a new version, in one transaction.
+
+        Returns:
+            Number of rows inserted
+        """
+        inserted = 0
+        self.commit()
+        self.conn.execute("BEGIN")
+        try:
+            for table_name, df in data.items():
+                table = f"static_{table_name}"
+                columns = [str(c) for c in df.columns]
+                declared = ["feed_name TEXT NOT NULL", "version_id TEXT NOT NULL"] + [f'"{c}"' for c in columns]
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(declared)})")
+                known = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+                for column in columns:
+                    if column not in known:  # optional GTFS columns appear in newer versions
+                        self.conn.execute(f'ALTER TABLE {table} ADD COLUMN "{column}"')
+                        known.add(column)
+                for statement in _index_statements(table, known):
+                    self.conn.execute(statement)
+                self.conn.execute(f"DELETE FROM {table} WHERE feed_name = ?", (feed_name,))
+                names = ", ".join(f'"{name}"' for name in ["feed_name", "version_id"] + columns)
+                sql = f"INSERT INTO {table} ({names}) VALUES ({', '.join('?' * (len(columns) + 2))})"
+                values = df.astype(object).where(df.notna(), None)
+                self.conn.executemany(
+                    sql, ((feed_name, version_id) + tuple(row) for row in values.itertuples(index=False))
+                )
+                inserted += len(df)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return inserted
+
+    def commit(self) -> int:
+        """
+        Commit the open cycle transaction.
+
+        Returns:
+            Number of RT rows committed
+        """
+        committed = self.pending_rows
+        if self.conn.in_transaction:
+            self.conn.execute("COMMIT")
+        self.pending_rows = 0
+        return committed
+
+    def close(self) -> None:
+        """Commit outstanding rows and close the database."""
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,248 @@
+"""
+Typed, streaming loader for GTFS Static ZIP bundles.
+
+Each member is decoded straight from the ZIP stream with an explicit schema:
+identifier columns become categoricals, enumerations and sequences use small
+nullable integer types, and ``HH:MM:SS`` times (which may exceed 24:00:00) are
+converted to seconds since midnight of the service day. ``stop_times`` can be
+read in chunks so peak memory stays close to the size of the typed result.
+"""
+
+import io
+import logging
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+logger = logging.getLogger(__name__)
+
+GTFS_STATIC_TABLES = [
+    'agency', 'stops', 'routes', 'trips', 'stop_times', 'calendar', 'calendar_dates', 'feed_info', 'shapes',
+]
+
+_DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Per table: pandas dtype for known columns. "time" marks HH:MM:SS columns.
+GTFS_SCHEMA: Dict[str, Dict[str, str]] = {
+    'agency': {
+        'agency_id': 'category',
+    },
+    'stops': {
+        'stop_id': 'category',
+        'stop_code': 'category',
+        'stop_lat': 'float64',
+        'stop_lon': 'float64',
+        'zone_id': 'category',
+        'location_type': 'Int8',
+        'parent_station': 'category',
+        'wheelchair_boarding': 'Int8',
+        'platform_code': 'category',
+    },
+    'routes': {
+        'route_id': 'category',
+        'agency_id': 'category',
+        'route_type': 'Int16',
+    },
+    'trips': {
+        'route_id': 'category',
+        'service_id': 'category',
+        'trip_id': 'category',
+        'direction_id': 'Int8',
+        'block_id': 'category',
+        'shape_id': 'category',
+        'wheelchair_accessible': 'Int8',
+        'bikes_allowed': 'Int8',
+    },
+    'stop_times': {
+        'trip_id': 'category',
+        'arrival_time': 'time',
+        'departure_time': 'time',
+        'stop_id': 'category',
+        'stop_sequence': 'Int32',
+        'pickup_type': 'Int8',
+        'drop_off_type': 'Int8',
+        'shape_dist_traveled': 'float64',
+        'timepoint': 'Int8',
+    },
+    'calendar': dict(
+        {'service_id': 'category', 'start_date': 'str', 'end_date': 'str'},
+        **{day: 'Int8' for day in _DAYS}
+    ),
+    'calendar_dates': {
+        'service_id': 'category',
+        'date': 'str',
+        'exception_type': 'Int8',
+    },
+    'feed_info': {
+        'feed_start_date': 'str',
+        'feed_end_date': 'str',
+        'feed_version': 'str',
+    },
+    'shapes': {
+        'shape_id': 'category',
+        'shape_pt_lat': 'float64',
+        'shape_pt_lon': 'float64',
+        'shape_pt_sequence': 'Int32',
+        'shape_dist_traveled': 'float64',
+    },
+}
+
+ZipSource = Union[bytes, str, Path, BinaryIO]
+
+
+def parse_gtfs_time(values: pd.Series) -> pd.Series:
+    """
+    Convert GTFS ``H:MM:SS`` strings to seconds since midnight (nullable Int32).
+
+    Hours beyond 23 are kept as-is, so trips running past midnight stay
+    monotonic within their service day.
+    """
+    # Malformed values (``1:2:3:4``, ``8h00``) become NA without affecting the rest of the column.
+    parts = values.astype('string').str.strip().str.extract(r'^(\d+):(\d{1,2}):(\d{1,2})$')
+    parts = parts.apply(pd.to_numeric, errors='coerce')
+    seconds = parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return seconds.astype('Int32')
+
+
+def format_gtfs_time(seconds: Union[int, np.integer]) -> str:
+    """Inverse of :func:`parse_gtfs_time` for a single value."""
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def _read_options(table: str) -> Dict[str, object]:
+    schema = GTFS_SCHEMA.get(table, {})
+    # Columns outside the schema stay text, so codes like route_short_name "010" keep their zeros.
+    dtype = defaultdict(lambda: 'str', {
+        column: ('str' if kind == 'time' else kind)
+        for column, kind in schema.items()
+    })
+    return {'dtype': dtype, 'encoding': 'utf-8-sig', 'skipinitialspace': True}
+
+
+def _finalise(table: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Apply conversions read_csv cannot express (GTFS times)."""
+    schema = GTFS_SCHEMA.get(table, {})
+    for column, kind in schema.items():
+        if column not in df.columns:
+            continue
+        if kind == 'time':
+            df[column] = parse_gtfs_time(df[column])
+    return df
+
+
+def _sort_categories(df: pd.DataFrame) -> pd.DataFrame:
+    # Lexically ordered categories make sorting by code equal to sorting by id.
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            if not categories.is_monotonic_increasing:
+                df[column] = series.cat.reorder_categories(categories.sort_values())
+    return df
+
+
+def concat_typed_chunks(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate chunks while keeping categorical columns categorical."""
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+
+    columns = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[column] = pd.Series(union_categoricals(parts, sort_categories=True))
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def _open_zip(source: ZipSource) -> zipfile.ZipFile:
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return zipfile.ZipFile(source)
+
+
+def iter_gtfs_table(
+    zip_file: zipfile.ZipFile,
+    table: str,
+    chunksize: int,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream one GTFS table from an open ZIP as typed DataFrame chunks.
+
+    Args:
+        zip_file: Open GTFS ZIP bundle
+        table: Table name without the ``.txt`` extension
+        chunksize: Rows per chunk
+
+    Yields:
+        Typed DataFrame chunks
+    """
+    with zip_file.open(f"{table}.txt") as member:
+        reader = pd.read_csv(member, chunksize=chunksize, **_read_options(table))
+        for chunk in reader:
+            yield _finalise(table, chunk)
+
+
+def read_gtfs_table(
+    zip_file: zipfile.ZipFile,
+    table: str,
+    chunksize: Optional[int] = None,
+) -> pd.DataFrame:
+    """Read one GTFS table from an open ZIP with the typed schema."""
+    if chunksize:
+        df = concat_typed_chunks(iter_gtfs_table(zip_file, table, chunksize))
+    else:
+        with zip_file.open(f"{table}.txt") as member:
+            df = _finalise(table, pd.read_csv(member, **_read_options(table)))
+    return _sort_categories(df)
+
+
+def load_gtfs_static(
+    source: ZipSource,
+    tables: Optional[List[str]] = None,
+    chunked_tables: Optional[Dict[str, int]] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Load GTFS Static tables from a ZIP bundle.
+
+    Args:
+        source: ZIP payload, path or binary file object
+        tables: Tables to load (defaults to ``GTFS_STATIC_TABLES``)
+        chunked_tables: Optional mapping of table name -> chunk size for tables
+                        that should be streamed in chunks (e.g. ``stop_times``)
+
+    Returns:
+        Dictionary mapping table name to typed DataFrame; missing or unreadable
+        members are skipped with a warning.
+    """
+    tables = tables or GTFS_STATIC_TABLES
+    chunked_tables = chunked_tables or {}
+    gtfs_data: Dict[str, pd.DataFrame] = {}
+
+    with _open_zip(source) as zip_file:
+        members = set(zip_file.namelist())
+        for table in tables:
+            if f"{table}.txt" not in members:
+                continue
+            try:
+                df = read_gtfs_table(zip_file, table, chunksize=chunked_tables.get(table))
+            except Exception as e:
+                logger.warning(f"Error reading {table}.txt: {e}")
+                continue
+            gtfs_data[table] = df
+            memory_mb = df.memory_usage(deep=True).sum() / 1e6
+            logger.info(f"Loaded {table}.txt: {len(df)} records ({memory_mb:.1f} MB in memory)")
+
+    return gtfs_data
@@ -0,0 +1,148 @@
+"""
+Registry of ingested GTFS Static feed versions.
+
+Every successfully materialised static bundle is recorded with a content
+digest, its ``feed_info`` version and the HTTP validators of the download, so
+later runs can recognise an unchanged bundle and reuse the stored tables
+instead of parsing and writing them again.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import zipfile
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+@dataclass
+class StaticFeedVersion:
+    """One materialised version of a GTFS Static feed."""
+    feed_name: str
+    feed_url: str
+    content_hash: str
+    version_id: str
+    artifact: str
+    feed_version: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def static_content_hash(zip_bytes: bytes) -> str:
+    """
+    Digest of a GTFS ZIP's member names, sizes and CRC-32s.
+
+    Only the central directory is read, and re-zipping identical tables (new
+    archive timestamps, different compression level) yields the same digest.
+    """
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zip_file:
+        for info in sorted(zip_file.infolist(), key=lambda i: i.filename):
+            digest.update(f"{info.filename}\0{info.file_size}\0{info.CRC:08x}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def read_feed_version(zip_bytes: bytes) -> Optional[str]:
+    """Return ``feed_info.feed_version`` without loading the other tables."""
+    try:
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zip_file:
+            if "feed_info.txt" not in zip_file.namelist():
+                return None
+            text = zip_file.read("feed_info.txt").decode("utf-8-sig")
+    except Exception:
+        return None
+    rows = list(csv.DictReader(io.StringIO(text)))
+    if not rows:
+        return None
+    return (rows[0].get("feed_version") or "").strip() or None
+
+
+@dataclass
+class StaticFeedRegistry:
+    """
+    JSON-backed history of static feed versions, newest last per feed.
+    """
+    path: Optional[Path] = None
+    feeds: Dict[str, List[StaticFeedVersion]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def load(cls, path: Path) -> "StaticFeedRegistry":
+        """Load the registry, starting empty when the file is missing or unreadable."""
+        registry = cls(path=Path(path))
+        try:
+            with open(registry.path, "r", encoding="utf-8") as fh:
+                stored = json.load(fh)
+            registry.feeds = {
+                name: [StaticFeedVersion(**version) for version in versions]
+                for name, versions in stored.items()
+            }
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            registry.logger.warning(f"Ignoring unreadable static registry {registry.path}: {e}")
+        return registry
+
+    def save(self) -> None:
+        """Persist the registry atomically."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(
+                {name: [asdict(v) for v in versions] for name, versions in self.feeds.items()},
+                fh,
+                indent=2,
+                ensure_ascii=False,
+            )
+        tmp_path.replace(self.path)
+
+    def current(self, feed_name: str) -> Optional[StaticFeedVersion]:
+        """Return the latest registered version of ``feed_name``."""
+        versions = self.feeds.get(feed_name)
+        return versions[-1] if versions else None
+
+    def versions(self, feed_name: str) -> List[StaticFeedVersion]:
+        """Return every registered version of ``feed_name``, oldest first."""
+        return list(self.feeds.get(feed_name, []))
+
+    def version_at(self, feed_name: str, timestamp: str) -> Optional[StaticFeedVersion]:
+        """
+        Return the version of ``feed_name`` current at ``timestamp`` (``YYYYMMDD_HHMMSS``).
+
+        Timestamps older than the first version get the first version rather than nothing.
+        """
+        versions = sorted(self.feeds.get(feed_name, []), key=lambda v: v.version_id)
+        if not versions:
+            return None
+        started = [v for v in versions if v.version_id <= timestamp]
+        return started[-1] if started else versions[0]
+
+    def find_unchanged(self, feed_name: str, content_hash: str) -> Optional[StaticFeedVersion]:
+        """
+        Return the current version if it has the same content and its artifact
+        still exists, otherwise None.
+        """
+        current = self.current(feed_name)
+        if current is None or current.content_hash != content_hash:
+            return None
+        if not Path(current.artifact).exists():
+            self.logger.info(f"Static artifact for '{feed_name}' is missing, re-materialising")
+            return None
+        return current
+
+    def register(self, version: StaticFeedVersion) -> None:
+        """Append a new version (or refresh validators of the current one) and save."""
+        versions = self.feeds.setdefault(version.feed_name, [])
+        if versions and versions[-1].content_hash == version.content_hash \
+                and versions[-1].artifact == version.artifact:
+            versions[-1] = version
+        else:
+            versions.append(version)
+        self.save()
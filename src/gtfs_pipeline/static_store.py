@@ -0,0 +1,152 @@
+"""
+Indexed columnar store for GTFS Static versions.
+
+Each ingested static version is materialised as one directory holding an
+uncompressed Arrow IPC (Feather v2) file per table, sorted by the table's key
+columns, plus a ``manifest.json`` describing the version:
+
+    silver/static/<feed_name>/<version_id>/
+        manifest.json
+        stop_times.arrow   (sorted by trip_id, stop_sequence)
+        trips.arrow        (sorted by trip_id)
+        ...
+
+Uncompressed IPC files can be memory-mapped, so opening a version and reading
+a handful of columns costs page faults on those columns only.
+"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+SORT_KEYS: Dict[str, List[str]] = {
+    'agency': ['agency_id'],
+    'stops': ['stop_id'],
+    'routes': ['route_id'],
+    'trips': ['trip_id'],
+    'stop_times': ['trip_id', 'stop_sequence'],
+    'calendar': ['service_id'],
+    'calendar_dates': ['service_id', 'date'],
+    'shapes': ['shape_id', 'shape_pt_sequence'],
+}
+
+
+def write_static_version(
+    directory: Union[str, Path],
+    tables: Dict[str, pd.DataFrame],
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Path:
+    """
+    Persist static tables as one sorted Arrow IPC file per table plus a manifest.
+
+    The version is written to a temporary sibling directory and renamed into
+    place, so a directory containing ``manifest.json`` is always complete.
+
+    Args:
+        directory: Target version directory
+        tables: Dictionary of typed DataFrames (see ``static_loader``)
+        metadata: Extra manifest fields (feed name, URL, feed_version, ...)
+
+    Returns:
+        Path of the written manifest
+    """
+    directory = Path(directory)
+    tmp_dir = directory.with_name(f".{directory.name}.inprogress")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    manifest: Dict[str, Any] = dict(metadata or {})
+    manifest['created_at'] = datetime.now().isoformat(timespec='seconds')
+    manifest['tables'] = {}
+
+    for table_name, df in tables.items():
+        sort_keys = [key for key in SORT_KEYS.get(table_name, []) if key in df.columns]
+        if sort_keys:
+            df = df.sort_values(sort_keys, kind='stable', ignore_index=True)
+        else:
+            df = df.reset_index(drop=True)
+        file_name = f"{table_name}.arrow"
+        # Uncompressed so readers can memory-map the columns without decoding.
+        feather.write_feather(df, tmp_dir / file_name, compression='uncompressed')
+        manifest['tables'][table_name] = {
+            'file': file_name,
+            'rows': int(len(df)),
+            'columns': [str(column) for column in df.columns],
+            'sort_keys': sort_keys,
+        }
+
+    with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2, ensure_ascii=False, default=str)
+
+    if directory.exists():
+        shutil.rmtree(directory)
+    os.replace(tmp_dir, directory)
+    return directory / MANIFEST_NAME
+
+
+class StaticVersion:
+    """
+    Read-only, memory-mapped view of one materialised static version.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        """
+        Open a static version directory.
+
+        Args:
+            directory: Version directory or path to its ``manifest.json``
+        """
+        path = Path(directory)
+        self.directory = path.parent if path.name == MANIFEST_NAME else path
+        with open(self.directory / MANIFEST_NAME, 'r', encoding='utf-8') as fh:
+            self.manifest: Dict[str, Any] = json.load(fh)
+
+    @property
+    def tables(self) -> List[str]:
+        """Names of the tables stored in this version."""
+        return list(self.manifest['tables'])
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self.manifest['tables']
+
+    def table(self, table_name: str, columns: Optional[List[str]] = None) -> pa.Table:
+        """
+        Return a table backed by a memory map of its IPC file.
+
+        Args:
+            table_name: Table to open
+            columns: Optional subset of columns to select
+
+        Returns:
+            Arrow table whose buffers point into the mapped file
+        """
+        entry = self.manifest['tables'][table_name]
+        source = pa.memory_map(str(self.directory / entry['file']), 'r')
+        table = ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        return table
+
+    def to_pandas(self, table_name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Return a table as a DataFrame (categoricals and nullable ints restored)."""
+        return self.table(table_name, columns=columns).to_pandas()
+
+
+def open_static_version(directory: Union[str, Path]) -> StaticVersion:
+    """Open a materialised static version (directory or manifest path)."""
+    return StaticVersion(directory)
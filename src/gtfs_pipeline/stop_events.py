@@ -0,0 +1,216 @@
+"""
+Stop-level arrival, departure, dwell and run times from vehicle positions.
+
+A vehicle reports its progress along a trip as ``current_stop_sequence`` and
+``current_status`` (0 INCOMING_AT, 1 STOPPED_AT, 2 IN_TRANSIT_TO). For every
+observation the last stop *reached* is the reported stop when the vehicle is
+stopped at it and the stop before it otherwise; the last stop *departed* is
+always the stop before the reported one. Both only move forward along a trip,
+so a stop's arrival (departure) is the first observation whose reached
+(departed) stop is at or past it. With observations sorted by
+``(vehicle, trip, start_date, time)`` and stops numbered in the same order,
+that is one ``searchsorted`` over all vehicles, trips and days at once.
+
+An event happens between two polls: its time is the midpoint of the two
+observations and ``*_uncertainty`` is half the gap. Events before a trip's
+first observation or after its last are unknown (NaN). Only stops that some
+observation reports get a row; stops passed between two polls without ever
+being reported are part of the run time to the next reported stop.
+
+    from gtfs_pipeline.stop_events import extract_stop_events, read_vehicle_positions
+
+    positions = read_vehicle_positions("data", "chitetsu_tram", "2025-11-01", "2025-11-30")
+    events = extract_stop_events(positions)
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from .parquet_sink import RT_SCHEMAS
+from .schedule_index import ScheduleIndex
+from .silver import SILVER_SCHEMAS
+
+
+STOPPED_AT = 1
+
+# Columns read from bronze/silver; everything else is ignored.
+_COLUMNS = [
+    "fetched_at", "feed_timestamp", "vehicle_id", "trip_id", "route_id", "direction_id",
+    "start_date", "current_stop_sequence", "current_status", "timestamp",
+]
+_GROUP_KEYS = ["vehicle_id", "trip_id", "start_date"]
+
+
+def read_vehicle_positions(
+    data_directory: Union[str, Path],
+    feed_name: str,
+    first_day: str,
+    last_day: str,
+    layer: str = "silver",
+) -> pa.Table:
+    """
+    Read the vehicle positions of one feed over a range of days.
+
+    Only the columns needed by ``extract_stop_events`` and the ``date=``
+    partitions in range are read.
+
+    Args:
+        data_directory: Pipeline data directory
+        feed_name: Feed label (``feed=`` partition)
+        first_day: First day (YYYY-MM-DD, inclusive)
+        last_day: Last day (YYYY-MM-DD, inclusive)
+        layer: ``silver`` (deduplicated) or ``bronze``
+
+    Returns:
+        Vehicle position rows
+    """
+    root = Path(data_directory) / layer / "vehicle_positions"
+    partition_schema = pa.schema([("feed", pa.string()), ("date", pa.string())])
+    # The explicit schema reads files written before newer columns existed.
+    schema = (RT_SCHEMAS if layer == "bronze" else SILVER_SCHEMAS)["vehicle_positions"]
+    dataset = ds.dataset(
+        str(root),
+        schema=pa.unify_schemas([schema, partition_schema]),
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+    )
+    columns = [name for name in _COLUMNS + ["delta_kind"] if name in dataset.schema.names]
+    date = ds.field("date")
+    return dataset.to_table(
+        columns=columns,
+        filter=(ds.field("feed") == feed_name) & (date >= first_day) & (date <= last_day),
+    )
+
+
+def _seconds(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    # Parquet has no second unit and pandas uses ns, so normalise before taking the integer value.
+    return pc.cast(pc.cast(column, pa.timestamp("s", tz=column.type.tz)), pa.int64())
+
+
+def _observed_seconds(table: pa.Table) -> np.ndarray:
+    """Entity timestamp, else header timestamp, else fetched_at, as Unix seconds (NaN if none)."""
+    observed = _seconds(table.column("timestamp"))
+    if "feed_timestamp" in table.column_names:
+        observed = pc.coalesce(observed, _seconds(table.column("feed_timestamp")))
+    if "fetched_at" in table.column_names:
+        # fetched_at is naive local time; the containers' zone has no DST.
+        offset = int(datetime.now().astimezone().utcoffset().total_seconds())
+        fetched = pc.subtract(_seconds(table.column("fetched_at")), offset)
+        observed = pc.coalesce(observed, fetched)
+    return observed.to_numpy(zero_copy_only=False).astype(np.float64)
+
+
+def _event_times(obs_time: np.ndarray, obs_group: np.ndarray, group_first: np.ndarray,
+                 progress: np.ndarray, stop_code: np.ndarray, stop_group: np.ndarray):
+    """
+    Time and uncertainty of the first observation whose ``progress`` reaches each stop.
+
+    ``progress`` must be non-decreasing over all observations.
+    """
+    n = len(obs_time)
+    i = np.searchsorted(progress, stop_code, side="left")
+    valid = i < n
+    valid[valid] &= obs_group[i[valid]] == stop_group[valid]
+    # Already reached at the group's first observation: the event is not observed.
+    valid[valid] &= i[valid] > group_first[stop_group[valid]]
+    before, after = obs_time[np.maximum(i - 1, 0)], obs_time[np.minimum(i, n - 1)]
+    time = np.where(valid, (before + after) / 2, np.nan)
+    uncertainty = np.where(valid, (after - before) / 2, np.nan)
+    return time, uncertainty
+
+
+def extract_stop_events(
+    positions: Union[pa.Table, pd.DataFrame],
+    index: Optional[ScheduleIndex] = None,
+) -> pd.DataFrame:
+    """
+    Arrival, departure, dwell and run time per vehicle, trip and reported stop.
+
+    Args:
+        positions: ``vehicle_positions`` rows (bronze, silver or parser columns),
+            any number of vehicles, trips and days
+        index: Schedule index to add the scheduled ``stop_id`` of each stop
+
+    Returns:
+        One row per ``(vehicle_id, trip_id, start_date, stop_sequence)`` with
+        ``route_id``, ``direction_id``, ``stopped`` (seen STOPPED_AT),
+        ``arrival_time``/``departure_time`` (UTC), their ``*_uncertainty`` and
+        ``dwell_time`` (stopped stops only), plus ``next_stop_sequence`` and
+        ``run_time`` from this stop's departure to the next stop's arrival;
+        durations in seconds
+    """
+    table = positions if isinstance(positions, pa.Table) else pa.Table.from_pandas(positions, preserve_index=False)
+    if "delta_kind" in table.column_names:
+        table = table.filter(pc.fill_null(pc.not_equal(table.column("delta_kind"), 2), True))
+    keep = pc.and_(
+        pc.and_(pc.is_valid(table.column("current_stop_sequence")), pc.is_valid(table.column("vehicle_id"))),
+        pc.and_(pc.not_equal(table.column("vehicle_id"), ""), pc.not_equal(table.column("trip_id"), "")),
+    )
+    table = table.filter(pc.fill_null(keep, False))
+
+    observed = _observed_seconds(table)
+    frame = pd.DataFrame({
+        name: table.column(name).to_pandas() for name in _GROUP_KEYS + ["route_id", "direction_id"]
+        if name in table.column_names
+    })
+    frame["start_date"] = frame["start_date"].fillna("") if "start_date" in frame else ""
+    group = frame.groupby(_GROUP_KEYS, sort=True).ngroup().to_numpy()
+    sequence = table.column("current_stop_sequence").to_numpy(zero_copy_only=False).astype(np.int64)
+    status = pc.fill_null(table.column("current_status"), 2).to_numpy(zero_copy_only=False)
+
+    # Sort by (group, time); of several rows for the same instant keep the last stored.
+    valid = ~np.isnan(observed)
+    order = np.flatnonzero(valid)[np.lexsort((observed[valid], group[valid]))]
+    group, observed, sequence, stopped = group[order], observed[order], sequence[order], status[order] == STOPPED_AT
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (group[1:] != group[:-1]) | (observed[1:] != observed[:-1])
+    order, group, observed, sequence, stopped = order[last], group[last], observed[last], sequence[last], stopped[last]
+
+    # Stops numbered in (group, stop_sequence) order, so progress is monotone across groups too.
+    stop_keys, code = np.unique((group << 32) | (sequence & 0xFFFFFFFF), return_inverse=True)
+    code = code.reshape(-1)
+    stop_group = stop_keys >> 32
+    # Groupwise running maximum: every group's values are above the previous group's.
+    reached = np.maximum.accumulate(np.where(stopped, code, code - 1))
+    departed = np.maximum.accumulate(code - 1)
+    group_first = np.full(int(group.max()) + 1 if len(group) else 0, -1, dtype=np.int64)
+    group_first[group[::-1]] = np.arange(len(group) - 1, -1, -1)
+
+    stops = np.arange(len(stop_keys))
+    arrival, arrival_uncertainty = _event_times(observed, group, group_first, reached, stops, stop_group)
+    departure, departure_uncertainty = _event_times(observed, group, group_first, departed, stops, stop_group)
+    was_stopped = np.zeros(len(stop_keys), dtype=bool)
+    was_stopped[code[stopped]] = True
+
+    has_next = np.zeros(len(stop_keys), dtype=bool)
+    has_next[:-1] = stop_group[1:] == stop_group[:-1]
+    next_arrival = np.full(len(stop_keys), np.nan)
+    next_arrival[:-1] = arrival[1:]
+    next_sequence = np.full(len(stop_keys), np.nan)
+    next_sequence[:-1] = stop_keys[1:] & 0xFFFFFFFF
+
+    # Attributes of each stop's group from its first observation.
+    first_row = order[group_first[stop_group]]
+    events = frame.iloc[first_row].reset_index(drop=True)
+    events["stop_sequence"] = (stop_keys & 0xFFFFFFFF).astype(np.int64)
+    if index is not None:
+        rows = index.locate(events["trip_id"].tolist(), events["stop_sequence"].tolist())
+        stop_ids = np.full(len(rows), None, dtype=object)
+        stop_ids[rows >= 0] = index.stop_ids[index.stop_code[rows[rows >= 0]]]
+        events["stop_id"] = stop_ids
+    events["stopped"] = was_stopped
+    events["arrival_time"] = pd.to_datetime(arrival, unit="s", utc=True)
+    events["arrival_uncertainty"] = arrival_uncertainty
+    events["departure_time"] = pd.to_datetime(departure, unit="s", utc=True)
+    events["departure_uncertainty"] = departure_uncertainty
+    events["dwell_time"] = np.where(was_stopped, departure - arrival, np.nan)
+    events["next_stop_sequence"] = pd.array(np.where(has_next, next_sequence, np.nan), dtype="Int64")
+    events["run_time"] = np.where(has_next, next_arrival - departure, np.nan)
+    return events
@@ -0,0 +1,288 @@
+"""
+Delta encoding of GTFS-RT vehicle positions.
+
+Between consecutive polls most trams are stationary and report exactly what
+they reported a minute earlier. In delta mode ``VehicleDeltaEncoder`` keeps
+the last stored state of every vehicle per feed and lets only vehicles whose
+trip, position, stop sequence, status or timestamp changed through to
+storage. Vehicles are keyed by ``vehicle_id``, or by ``(trip_id, start_date)``
+when the feed leaves ``vehicle_id`` empty; vehicles with neither are stored
+on every poll. Every stored ``vehicle_positions`` row carries a ``delta_kind``:
+
+    0 (KEYFRAME)  full snapshot row; the poll replaces all previous state
+    1 (CHANGED)   vehicle added or changed since the previous stored poll
+    2 (REMOVED)   vehicle no longer in the feed (only its key columns are set)
+
+Rows written without delta mode have a null ``delta_kind`` and are treated
+as keyframes. A keyframe is forced every ``keyframe_interval`` seconds and
+whenever the previous state is unknown, so a reader never needs more than
+one interval of history. The state is saved to ``state/vehicle_delta.json``
+on a clean exit, so cron-launched ``--once`` runs continue each other's
+deltas; the file is consumed on load, so a run that crashed leaves no state
+behind and the next poll is a keyframe. ``reconstruct_snapshots`` turns stored rows back into full
+per-poll snapshots.
+
+Raw payload archiving (``GTFS_RT_SAVE_PROTO``) is unaffected: raw snapshots
+are always complete.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+
+
+KEYFRAME = 0
+CHANGED = 1
+REMOVED = 2
+
+# Fields whose change makes a vehicle worth storing again.
+_SIGNATURE_FIELDS = (
+    "trip_id", "current_stop_sequence", "current_status", "timestamp",
+    "latitude", "longitude", "bearing", "speed",
+)
+_POSITION_FIELDS = ("latitude", "longitude", "bearing", "speed")
+
+
+def entity_key(vehicle_id: Optional[str], trip_id: Optional[str], start_date: Optional[str]) -> Optional[str]:
+    """Identity of a vehicle across polls: ``vehicle_id``, else its dated trip, else None."""
+    if vehicle_id:
+        return vehicle_id
+    if trip_id:
+        # A leading tab cannot collide with a vehicle_id.
+        return f"\t{trip_id}\t{start_date or ''}"
+    return None
+
+
+def _key_columns(key: str) -> Dict[str, Optional[str]]:
+    """Columns of a tombstone row for ``key``."""
+    if key.startswith("\t"):
+        _, trip_id, start_date = key.split("\t")
+        return {"vehicle_id": None, "trip_id": trip_id, "start_date": start_date or None}
+    return {"vehicle_id": key, "trip_id": None, "start_date": None}
+
+
+def _record_signature(record: Dict[str, Any]) -> Tuple:
+    position = record.get("position") or {}
+    return tuple(
+        position.get(name) if name in _POSITION_FIELDS else record.get(name)
+        for name in _SIGNATURE_FIELDS
+    )
+
+
+class VehicleDeltaEncoder:
+    """
+    Reduce parsed ``vehicle_positions`` snapshots to the vehicles that changed.
+
+    State is kept per feed key; ``load``/``save`` carry it across processes.
+    """
+
+    def __init__(self, keyframe_interval: float = 600.0, path: Optional[Path] = None):
+        """
+        Initialize the encoder.
+
+        Args:
+            keyframe_interval: Seconds between forced keyframes per feed
+            path: State file written by ``save``
+        """
+        self.keyframe_interval = keyframe_interval
+        self.path = Path(path) if path is not None else None
+        self.logger = logging.getLogger(__name__)
+        self._state: Dict[str, Dict[str, Tuple]] = {}
+        self._last_keyframe: Dict[str, float] = {}
+
+    @classmethod
+    def load(cls, path: Path, keyframe_interval: float = 600.0) -> "VehicleDeltaEncoder":
+        """Load and consume the state saved by the previous run, starting empty when there is none."""
+        encoder = cls(keyframe_interval, path=path)
+        try:
+            with open(encoder.path, "r", encoding="utf-8") as fh:
+                stored = json.load(fh)
+            # Until save() rewrites it, a crash must not let the next run trust this state.
+            encoder.path.unlink()
+            for feed_key, feed in stored.items():
+                encoder._state[feed_key] = {key: tuple(signature) for key, signature in feed["vehicles"].items()}
+                encoder._last_keyframe[feed_key] = float(feed["last_keyframe"])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            encoder._state, encoder._last_keyframe = {}, {}
+            encoder.logger.warning(f"Ignoring unreadable vehicle delta state {encoder.path}: {e}")
+        return encoder
+
+    def save(self) -> None:
+        """Persist the state so the next cron-launched run continues the deltas."""
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({
+                    feed_key: {"last_keyframe": self._last_keyframe[feed_key], "vehicles": vehicles}
+                    for feed_key, vehicles in self._state.items()
+                    if feed_key in self._last_keyframe
+                }, fh)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            self.logger.warning(f"Could not save vehicle delta state {self.path}: {e}")
+
+    def reset(self, feed_key: str) -> None:
+        """Forget the state of ``feed_key`` so its next poll is a keyframe (e.g. after a failed store)."""
+        self._state.pop(feed_key, None)
+        self._last_keyframe.pop(feed_key, None)
+
+    def encode(self, feed_key: str, data: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Replace ``data['vehicle_positions']`` with its delta against the previous poll.
+
+        Args:
+            feed_key: Identity of the feed (``<feed_type>:<feed_url>``)
+            data: Parsed snapshot (records or record batch, see ``GTFSIngest``)
+            now: Unix time of the poll (defaults to now)
+
+        Returns:
+            ``data`` with the delta rows and a ``delta`` summary
+            (``keyframe``, ``changed``, ``removed``, ``unchanged``)
+        """
+        vehicles = data.get("vehicle_positions")
+        if vehicles is None:
+            return data
+        now = time.time() if now is None else now
+        previous = self._state.get(feed_key)
+        keyframe = (
+            previous is None
+            or now - self._last_keyframe.get(feed_key, now) >= self.keyframe_interval
+        )
+
+        if isinstance(vehicles, pa.RecordBatch):
+            keys, signatures = self._batch_signatures(vehicles)
+        else:
+            keys = [
+                entity_key(record.get("vehicle_id"), record.get("trip_id"), record.get("start_date"))
+                for record in vehicles
+            ]
+            signatures = [_record_signature(record) for record in vehicles]
+
+        # Vehicles without a key cannot be compared across polls and are always stored.
+        current = {key: signature for key, signature in zip(keys, signatures) if key is not None}
+        previous = previous or {}
+        keep = [
+            keyframe or key is None or previous.get(key) != signature
+            for key, signature in zip(keys, signatures)
+        ]
+        removed = [key for key in previous if key not in current]
+        kind = KEYFRAME if keyframe else CHANGED
+
+        if isinstance(vehicles, pa.RecordBatch):
+            data["vehicle_positions"] = self._batch_delta(vehicles, keep, kind, removed)
+        else:
+            delta = [dict(record, delta_kind=kind) for record, kept in zip(vehicles, keep) if kept]
+            delta.extend(dict(_key_columns(key), delta_kind=REMOVED) for key in removed)
+            data["vehicle_positions"] = delta
+
+        self._state[feed_key] = current
+        if keyframe:
+            self._last_keyframe[feed_key] = now
+        changed = sum(keep)
+        data["delta"] = {
+            "keyframe": keyframe,
+            "changed": changed,
+            "removed": len(removed),
+            "unchanged": len(keys) - changed,
+        }
+        self.logger.debug(f"Vehicle delta {feed_key}: {data['delta']}")
+        return data
+
+    @staticmethod
+    def _batch_signatures(batch: pa.RecordBatch) -> Tuple[List[Optional[str]], List[Tuple]]:
+        keys = [
+            entity_key(vehicle_id, trip_id, start_date)
+            for vehicle_id, trip_id, start_date in zip(*(
+                batch.column(name).to_pylist() for name in ("vehicle_id", "trip_id", "start_date")
+            ))
+        ]
+        # Integer seconds, as in parsed records, so signatures compare and serialise the same.
+        columns = [
+            batch.column(name).cast(pa.int64()).to_pylist() if name == "timestamp"
+            else batch.column(name).to_pylist()
+            for name in _SIGNATURE_FIELDS
+        ]
+        return keys, list(zip(*columns))
+
+    @staticmethod
+    def _batch_delta(batch: pa.RecordBatch, keep: List[bool], kind: int, removed: List[str]) -> pa.RecordBatch:
+        kept = batch.filter(pa.array(keep, type=pa.bool_()))
+        schema = batch.schema
+        if "delta_kind" in schema.names:
+            schema = schema.remove(schema.get_field_index("delta_kind"))
+        columns = [kept.column(name) for name in schema.names]
+        key_columns = [_key_columns(key) for key in removed]
+        tombstones = {
+            name: pa.array([columns.get(name) for columns in key_columns], type=schema.field(name).type)
+            for name in schema.names
+        }
+        arrays = [
+            pa.concat_arrays([column, tombstones[name]]) for name, column in zip(schema.names, columns)
+        ]
+        arrays.append(pa.array([kind] * kept.num_rows + [REMOVED] * len(removed), type=pa.int8()))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema.append(pa.field("delta_kind", pa.int8())))
+
+
+def reconstruct_snapshots(rows: pa.Table) -> Iterator[Tuple[datetime, pa.Table]]:
+    """
+    Rebuild full vehicle snapshots from stored ``vehicle_positions`` rows of one feed.
+
+    Rows are grouped by ``fetched_at``; a group containing a keyframe (or a
+    row without ``delta_kind``) replaces the state, other groups upsert
+    changed vehicles and drop removed ones. Groups before the first keyframe
+    are skipped because the state they apply to is unknown. Polls in which
+    nothing changed stored no rows; their snapshot equals the previous one.
+
+    Args:
+        rows: ``vehicle_positions`` rows with at least ``fetched_at``,
+              ``vehicle_id`` and ``delta_kind`` (e.g. one bronze ``feed=`` partition)
+
+    Returns:
+        Iterator of ``(fetched_at, snapshot)`` in time order; snapshot rows
+        carry the poll's ``fetched_at``/``feed_timestamp`` and ``delta_kind`` 0
+    """
+    if "delta_kind" not in rows.column_names:
+        rows = rows.append_column("delta_kind", pa.nulls(rows.num_rows, pa.int8()))
+    rows = rows.sort_by("fetched_at")
+    schema = rows.schema
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for record in rows.to_pylist():
+        groups.setdefault(record["fetched_at"], []).append(record)
+
+    state: Optional[Dict[str, Dict[str, Any]]] = None
+    for fetched_at, group in groups.items():
+        if any(record["delta_kind"] in (None, KEYFRAME) for record in group):
+            state = {}
+        if state is None:
+            continue
+        feed_timestamp = next(
+            (record.get("feed_timestamp") for record in group if record.get("feed_timestamp") is not None),
+            None,
+        )
+        unkeyed = []
+        for record in group:
+            key = entity_key(record.get("vehicle_id"), record.get("trip_id"), record.get("start_date"))
+            if key is None:
+                # Stored on every poll it appears in; not carried to the next one.
+                unkeyed.append(record)
+            elif record["delta_kind"] == REMOVED:
+                state.pop(key, None)
+            else:
+                state[key] = record
+        snapshot = [
+            dict(record, fetched_at=fetched_at, delta_kind=KEYFRAME, **(
+                {"feed_timestamp": feed_timestamp} if "feed_timestamp" in record else {}
+            ))
+            for record in list(state.values()) + unkeyed
+        ]
+        yield fetched_at, pa.Table.from_pylist(snapshot, schema=schema)
@@ -0,0 +1,235 @@
+"""
+Write-behind buffer between ingestion and storage.
+
+``GTFSIngest.ingest_feed`` hands parsed snapshots to the buffer instead of
+storing them itself. A background task flushes them to
+``DatabaseManager.store_gtfs_rt_batch`` when ``max_batch`` snapshots are
+waiting, when the oldest one is ``max_age`` seconds old, or on close, so the
+sinks see one flush for many polls instead of one write per feed per poll.
+
+Backpressure: once ``max_pending`` snapshots are waiting, ``put`` blocks until
+a flush makes room, which slows ingestion down to what the sink sustains
+instead of growing memory. Snapshots of a failed flush are retried on the
+next flush, up to ``max_attempts`` flushes, and are then dropped with an
+error that names their row counts; ``close`` keeps flushing until the buffer
+is empty, so a drained shutdown (SIGTERM) loses nothing that was accepted.
+Errors of a single snapshot's callbacks are logged and do not stop
+the flusher; should it stop anyway, ``put`` raises instead of blocking.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .database import DatabaseManager
+
+_DATASETS = ("trip_updates", "stop_time_updates", "vehicle_positions")
+
+
+def _row_counts(data: Dict[str, Any]) -> Dict[str, int]:
+    """Rows per dataset of a parsed snapshot (records, column mapping or record batch)."""
+    counts: Dict[str, int] = {}
+    for dataset in _DATASETS:
+        rows = data.get(dataset)
+        if rows is None:
+            continue
+        if hasattr(rows, 'num_rows'):
+            counts[dataset] = rows.num_rows
+        elif isinstance(rows, dict):
+            counts[dataset] = len(next(iter(rows.values()), []))
+        else:
+            counts[dataset] = len(rows)
+    return counts
+
+
+@dataclass
+class PendingSnapshot:
+    """One snapshot waiting to be stored."""
+    store_kwargs: Dict[str, Any]  # keyword arguments of ``store_gtfs_rt_data``
+    on_stored: Optional[Callable[[], None]] = None
+    on_failed: Optional[Callable[[], None]] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class WriteBehindBuffer:
+    """
+    Accumulate parsed snapshots in memory and store them in batches.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        max_batch: int = 500,
+        max_age: float = 60.0,
+        max_pending: int = 2000,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0,
+    ):
+        """
+        Initialize the buffer; call ``start`` inside the running event loop.
+
+        Args:
+            db_manager: Storage the buffer flushes into
+            max_batch: Snapshots per flush (a full batch is flushed immediately)
+            max_age: Seconds the oldest snapshot may wait before a flush
+            max_pending: Waiting snapshots at which ``put`` blocks
+            max_attempts: Flushes a snapshot is tried in before it is dropped
+            retry_delay: Seconds to wait after a flush with failures
+        """
+        self.db_manager = db_manager
+        self.max_batch = max(1, max_batch)
+        self.max_age = max_age
+        self.max_pending = max(self.max_batch, max_pending)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.logger = logging.getLogger(__name__)
+        self.stored = 0
+        self.dropped = 0
+        self.dropped_rows = 0
+        self.flushes = 0
+        self._items: Deque[PendingSnapshot] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._items)
+
+    def start(self) -> None:
+        """Start the background flusher."""
+        # Created inside the running loop (required on Python < 3.10).
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        self._task.add_done_callback(self._flusher_done)
+
+    def _flusher_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(
+                f"Write-behind flusher stopped: {task.exception()!r}; {len(self._items)} snapshots not stored"
+            )
+        # Release producers blocked on backpressure; put() then sees the flusher is gone.
+        self._space.set()
+
+    async def put(self, snapshot: PendingSnapshot) -> None:
+        """Queue a snapshot, waiting while ``max_pending`` snapshots are already queued."""
+        if self._task is None or self._task.done() or self._closing:
+            raise RuntimeError("WriteBehindBuffer is not running")
+        while len(self._items) >= self.max_pending:
+            self._space.clear()
+            self._wakeup.set()
+            await self._space.wait()
+            if self._task is None or self._task.done():
+                raise RuntimeError("WriteBehindBuffer flusher is not running")
+        self._items.append(snapshot)
+        if len(self._items) >= self.max_batch:
+            self._wakeup.set()
+
+    async def close(self) -> None:
+        """Flush everything still queued and stop the flusher."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await self._task
+        except Exception:
+            # Already logged by _flusher_done.
+            pass
+        self._task = None
+        self.logger.info(
+            f"Write-behind buffer closed: {self.stored} snapshots stored in {self.flushes} flushes, "
+            f"{self.dropped} dropped ({self.dropped_rows} rows)"
+        )
+
+    def _flush_due(self) -> bool:
+        if not self._items:
+            return False
+        if self._closing or len(self._items) >= self.max_batch:
+            return True
+        return time.monotonic() - self._items[0].enqueued_at >= self.max_age
+
+    async def _run(self) -> None:
+        while True:
+            if not self._flush_due():
+                if self._closing:
+                    return
+                timeout = None
+                if self._items:
+                    timeout = self._items[0].enqueued_at + self.max_age - time.monotonic()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            batch = [self._items.popleft() for _ in range(min(self.max_batch, len(self._items)))]
+            self._space.set()
+            try:
+                failed = await self._flush(batch)
+            except Exception as e:
+                # Never let one bad batch stop the flusher: retry it like a failed store.
+                self.logger.error(f"Write-behind flush raised: {e!r}")
+                failed = self._settle(batch, [False] * len(batch))
+            if failed:
+                # Keep queue order: retried snapshots go back to the front.
+                self._items.extendleft(reversed(failed))
+                await asyncio.sleep(self.retry_delay)
+
+    async def _flush(self, batch: List[PendingSnapshot]) -> List[PendingSnapshot]:
+        """Store ``batch``; returns the snapshots to retry."""
+        self.flushes += 1
+        try:
+            results = await self.db_manager.store_gtfs_rt_batch([item.store_kwargs for item in batch])
+        except Exception as e:
+            self.logger.error(f"Write-behind flush of {len(batch)} snapshots failed: {e}")
+            results = [False] * len(batch)
+        retry = self._settle(batch, results)
+        self.logger.info(
+            f"Write-behind flush: {len(batch) - len(retry)} of {len(batch)} snapshots done, "
+            f"{len(self._items)} still queued"
+        )
+        return retry
+
+    def _settle(self, batch: List[PendingSnapshot], results: List[bool]) -> List[PendingSnapshot]:
+        """Run the callbacks of a flushed batch; returns the snapshots to retry."""
+        retry: List[PendingSnapshot] = []
+        for item, success in zip(batch, results):
+            item.attempts += 1
+            # The raw payload was archived by the first attempt.
+            item.store_kwargs['raw_bytes'] = None
+            if success:
+                self.stored += 1
+                self._callback(item.on_stored, item)
+            elif item.attempts < self.max_attempts:
+                retry.append(item)
+            else:
+                self.dropped += 1
+                counts = _row_counts(item.store_kwargs.get('data') or {})
+                self.dropped_rows += sum(counts.values())
+                rows = ", ".join(f"{n} {dataset}" for dataset, n in counts.items()) or "no"
+                self.logger.error(
+                    f"Dropping {item.store_kwargs.get('feed_name') or item.store_kwargs['feed_url']} "
+                    f"snapshot {item.store_kwargs.get('timestamp')} ({rows} rows) "
+                    f"after {item.attempts} failed flushes"
+                )
+                self._callback(item.on_failed, item)
+        return retry
+
+    def _callback(self, callback: Optional[Callable[[], None]], item: PendingSnapshot) -> None:
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            self.logger.error(
+                f"Write-behind callback for {item.store_kwargs.get('feed_name') or item.store_kwargs['feed_url']} "
+                f"snapshot {item.store_kwargs.get('timestamp')} failed: {e!r}"
+            )
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+gtfs_realtime_pb2 = pytest.importorskip("google.transit.gtfs_realtime_pb2")
+pytest.importorskip("aiohttp")
+
+from gtfs_pipeline.gtfs_ingest import decode_rt_payload
+from gtfs_pipeline.parquet_sink import snapshot_tables
+
+FETCHED_AT = datetime(2025, 11, 1, 8, 0, 0)
+
+
+def _feed():
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = 1761955200
+
+    entity = feed.entity.add(id="tu1")
+    update = entity.trip_update
+    update.trip.trip_id, update.trip.route_id, update.trip.start_date = "t1", "r1", "20251101"
+    update.trip.direction_id = 1
+    update.vehicle.id = "v1"
+    update.timestamp = 1761955190
+    update.delay = 45
+    first = update.stop_time_update.add(stop_sequence=1, stop_id="s1")
+    first.arrival.delay = 30
+    first.departure.time = 1761955260
+    update.stop_time_update.add(stop_id="s2")  # no sequence, no events
+
+    # No vehicle, delay or timestamp (protobuf 0) on this trip.
+    bare = feed.entity.add(id="tu2").trip_update
+    bare.trip.trip_id = "t2"
+    bare.stop_time_update.add(stop_sequence=3).arrival.time = 1761955500
+
+    vehicle = feed.entity.add(id="vp1").vehicle
+    vehicle.vehicle.id, vehicle.trip.trip_id, vehicle.trip.route_id = "v1", "t1", "r1"
+    vehicle.current_stop_sequence, vehicle.current_status, vehicle.timestamp = 2, 1, 1761955195
+    vehicle.position.latitude, vehicle.position.longitude = 36.70, 137.21
+    vehicle.position.bearing, vehicle.position.speed = 90.0, 8.5
+    parked = feed.entity.add(id="vp2").vehicle
+    parked.vehicle.id = "v2"  # no trip, position or timestamp
+    return feed.SerializeToString()
+
+
+@pytest.mark.parametrize("feed_type", ["trip_updates", "vehicle_positions"])
+def test_columnar_decode_stores_the_same_rows_as_the_dict_path(feed_type):
+    payload = _feed()
+    from_dicts = snapshot_tables(decode_rt_payload(payload, feed_type), FETCHED_AT)
+    from_batches = snapshot_tables(decode_rt_payload(payload, feed_type, columnar=True), FETCHED_AT)
+
+    assert sorted(from_batches) == sorted(from_dicts)
+    for dataset, table in from_dicts.items():
+        assert from_batches[dataset].schema == table.schema
+        assert from_batches[dataset].to_pylist() == table.to_pylist()
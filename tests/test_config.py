@@ -0,0 +1,13 @@
+import warnings
+
+import pytest
+
+from gtfs_pipeline.config import GTFSConfig
+
+
+def test_request_delay_is_deprecated():
+    with pytest.warns(DeprecationWarning, match="per_host_request_spacing"):
+        GTFSConfig(request_delay=20.0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert GTFSConfig().per_host_request_spacing == 0.0
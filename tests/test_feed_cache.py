@@ -0,0 +1,70 @@
+from gtfs_pipeline.feed_cache import FeedValidatorCache, SnapshotDeduplicator
+
+URL = "https://example.invalid/VehiclePositions.pb"
+
+
+def test_validators_become_conditional_headers_and_survive_a_restart(tmp_path):
+    cache = FeedValidatorCache.load(tmp_path / "rt_validators.json")
+    assert cache.request_headers(URL) == {}
+
+    assert cache.record_response(URL, {"ETag": '"v1"', "Last-Modified": "Sat, 01 Nov 2025 08:00:00 GMT"}, b"a")
+    # A response without validators keeps the ones already known.
+    assert cache.record_response(URL, {}, b"b")
+    cache.save()
+
+    restarted = FeedValidatorCache.load(tmp_path / "rt_validators.json")
+    assert restarted.request_headers(URL) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Sat, 01 Nov 2025 08:00:00 GMT",
+    }
+
+
+def test_identical_body_and_304_are_counted_as_hits():
+    cache = FeedValidatorCache()
+    assert cache.record_response(URL, {"ETag": '"v1"'}, b"payload")
+    assert not cache.record_response(URL, {"ETag": '"v1"'}, b"payload")
+    cache.record_not_modified(URL)
+    assert cache.stats()[URL] == {"not_modified_hits": 1, "identical_body_hits": 1, "misses": 1}
+
+
+def test_invalidate_forces_the_next_poll_through():
+    cache = FeedValidatorCache()
+    cache.record_response(URL, {"ETag": '"v1"'}, b"payload")
+    cache.invalidate(URL)
+    assert cache.request_headers(URL) == {}
+    assert cache.record_response(URL, {}, b"payload")  # same bytes are processed again
+
+
+def test_unreadable_cache_file_starts_empty(tmp_path):
+    path = tmp_path / "rt_validators.json"
+    path.write_text("{not json")
+    assert FeedValidatorCache.load(path).feeds == {}
+
+
+def test_snapshot_seen_a_few_polls_ago_is_a_duplicate():
+    dedup = SnapshotDeduplicator()
+    key = f"vehicle_positions:{URL}"
+    first, second = SnapshotDeduplicator.digest(b"a"), SnapshotDeduplicator.digest(b"b")
+    dedup.remember(key, first, 1761955200)
+    dedup.remember(key, second, 1761955220)
+
+    assert dedup.is_duplicate(key, first, 1761955200)  # A -> B -> A flapping
+    # Different bytes re-served with a known header timestamp.
+    assert dedup.is_duplicate(key, SnapshotDeduplicator.digest(b"c"), 1761955220)
+    # A zero header timestamp never matches by timestamp.
+    dedup.remember(key, SnapshotDeduplicator.digest(b"d"), 0)
+    assert not dedup.is_duplicate(key, SnapshotDeduplicator.digest(b"e"), 0)
+    assert not dedup.is_duplicate(f"trip_updates:{URL}", first, 1761955200)
+
+
+def test_lru_evicts_the_least_recently_seen_snapshot(tmp_path):
+    dedup = SnapshotDeduplicator.load(tmp_path / "rt_snapshots.json", capacity=2)
+    dedup.remember("feed", "a", 1)
+    dedup.remember("feed", "b", 2)
+    assert dedup.is_duplicate("feed", "a", 1)  # refreshes "a"
+    dedup.remember("feed", "c", 3)
+    dedup.save()
+
+    restarted = SnapshotDeduplicator.load(tmp_path / "rt_snapshots.json", capacity=2)
+    assert restarted.is_duplicate("feed", "a", 1) and restarted.is_duplicate("feed", "c", 3)
+    assert not restarted.is_duplicate("feed", "b", 2)
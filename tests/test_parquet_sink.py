@@ -0,0 +1,54 @@
+import pyarrow.dataset as ds
+
+from gtfs_pipeline.parquet_sink import ParquetRTSink
+
+
+def _snapshot(vehicle_ids):
+    return {"vehicle_positions": [{"vehicle_id": v, "trip_id": f"t{v}", "timestamp": 1761955200} for v in vehicle_ids]}
+
+
+def test_each_flush_window_is_a_finished_file(tmp_path):
+    sink = ParquetRTSink(tmp_path, row_group_rows=3, flush_interval=3600)
+    partition = tmp_path / "vehicle_positions" / "feed=tram" / "date=2025-11-01"
+
+    sink.append_snapshot(_snapshot(["1", "2"]), "20251101_080000", "tram")
+    assert not list(partition.iterdir())  # buffered only, nothing on disk to lose a footer from
+    sink.append_snapshot(_snapshot(["3", "4"]), "20251101_080020", "tram")
+    sink.append_snapshot(_snapshot(["5", "6", "7"]), "20251101_080040", "tram")
+    # Two bounds crossed within the same second: two finished files, no partial file.
+    assert len(list(partition.glob("part-*.parquet"))) == 2
+    assert not list(partition.glob(".*"))
+
+    sink.append_snapshot(_snapshot(["8"]), "20251101_080100", "tram")
+    sink.close()
+    files = sorted(partition.glob("part-*.parquet"))
+    assert len(files) == 3
+    assert ds.dataset([str(f) for f in files]).to_table().num_rows == 8
+
+
+def test_new_service_day_flushes_the_previous_one(tmp_path):
+    sink = ParquetRTSink(tmp_path)
+    sink.append_snapshot(_snapshot(["1"]), "20251101_235940", "tram")
+    sink.append_snapshot(_snapshot(["1"]), "20251102_000000", "tram")
+    feed = tmp_path / "vehicle_positions" / "feed=tram"
+    assert len(list((feed / "date=2025-11-01").glob("part-*.parquet"))) == 1
+    assert not list((feed / "date=2025-11-02").iterdir())
+    sink.close()
+
+
+def test_idle_partition_is_flushed_by_age_at_cycle_end(tmp_path):
+    sink = ParquetRTSink(tmp_path, flush_interval=300)
+    partition = tmp_path / "vehicle_positions" / "feed=tram" / "date=2025-11-01"
+    sink.append_snapshot(_snapshot(["1"]), "20251101_080000", "tram")
+
+    sink.flush_aged()
+    assert not list(partition.glob("part-*.parquet"))  # younger than flush_interval
+
+    # No further rows arrive for this partition; the cycle-end check alone writes it.
+    for writer in sink._writers.values():
+        writer.last_flush -= 300
+    sink.flush_aged()
+    assert len(list(partition.glob("part-*.parquet"))) == 1
+    sink.flush_aged()
+    assert len(list(partition.glob("part-*.parquet"))) == 1
+    sink.close()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+from gtfs_pipeline.config import DatabaseConfig
+from gtfs_pipeline.database import DatabaseManager
+from gtfs_pipeline.parquet_sink import RT_SCHEMAS
+from gtfs_pipeline.postgres_sink import PostgresRTSink
+
+
+class _Connection:
+    """In-process stand-in for an asyncpg connection: DDL is recorded, COPYs commit with the transaction."""
+
+    def __init__(self, fail_copy=None, existing_partitions=()):
+        self.statements = []
+        self.committed = {}
+        self.fail_copy = fail_copy
+        self.existing_partitions = set(existing_partitions)
+        self._pending = None
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        for name in self.existing_partitions:
+            if f"CREATE TABLE IF NOT EXISTS gtfs_rt.{name} " in statement:
+                raise asyncpg.exceptions.DuplicateTableError(f'relation "{name}" already exists')
+
+    @asynccontextmanager
+    async def transaction(self):
+        self._pending = {}
+        try:
+            yield
+        except BaseException:
+            self._pending = None
+            raise
+        for table, rows in self._pending.items():
+            self.committed.setdefault(table, []).extend(rows)
+        self._pending = None
+
+    async def copy_records_to_table(self, table, schema_name, columns, records):
+        if table == self.fail_copy:
+            raise asyncpg.exceptions.PostgresError(f"copy into {table} failed")
+        self._pending.setdefault(f"{schema_name}.{table}", []).extend(
+            dict(zip(columns, record)) for record in records
+        )
+
+
+class _Pool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+def _sink(conn):
+    sink = PostgresRTSink(DatabaseConfig())
+    sink.pool = _Pool(conn)
+    return sink
+
+
+def _snapshot(*vehicle_ids, stop_times=True):
+    data = {"vehicle_positions": [{"vehicle_id": v, "trip_id": f"t{v}", "timestamp": 1761955200} for v in vehicle_ids]}
+    if stop_times:
+        data["stop_time_updates"] = [{"trip_id": "t1", "stop_sequence": 1, "stop_id": "s1", "arrival_delay": 30}]
+    return data
+
+
+def test_batch_is_copied_in_one_transaction_into_daily_partitions():
+    conn = _Connection()
+    sink = _sink(conn)
+
+    rows = asyncio.run(sink.append_snapshots([
+        (_snapshot("1", "2"), "20251101_235940", "tram"),
+        (_snapshot("3", stop_times=False), "20251102_000000", "tram"),
+    ]))
+
+    assert rows == 4
+    vehicles = conn.committed["gtfs_rt.vehicle_positions"]
+    assert [row["vehicle_id"] for row in vehicles] == ["1", "2", "3"]
+    assert {row["feed_name"] for row in vehicles} == {"tram"}
+    assert set(vehicles[0]) == {"feed_name", *RT_SCHEMAS["vehicle_positions"].names}
+    assert len(conn.committed["gtfs_rt.stop_time_updates"]) == 1
+
+    partitions = [s for s in conn.statements if "PARTITION OF" in s]
+    assert sorted(partitions) == [
+        "CREATE TABLE IF NOT EXISTS gtfs_rt.stop_time_updates_20251101 PARTITION OF gtfs_rt.stop_time_updates "
+        "FOR VALUES FROM ('2025-11-01') TO ('2025-11-02')",
+        "CREATE TABLE IF NOT EXISTS gtfs_rt.vehicle_positions_20251101 PARTITION OF gtfs_rt.vehicle_positions "
+        "FOR VALUES FROM ('2025-11-01') TO ('2025-11-02')",
+        "CREATE TABLE IF NOT EXISTS gtfs_rt.vehicle_positions_20251102 PARTITION OF gtfs_rt.vehicle_positions "
+        "FOR VALUES FROM ('2025-11-02') TO ('2025-11-03')",
+    ]
+
+    # Known partitions are not created again.
+    asyncio.run(sink.append_snapshot(_snapshot("4"), "20251101_235959", "tram"))
+    assert len([s for s in conn.statements if "PARTITION OF" in s]) == 3
+
+
+def test_partition_created_by_another_writer_is_used():
+    conn = _Connection(existing_partitions={"vehicle_positions_20251101"})
+    sink = _sink(conn)
+
+    assert asyncio.run(sink.append_snapshot(_snapshot("1", stop_times=False), "20251101_080000", "tram")) == 1
+    assert len(conn.committed["gtfs_rt.vehicle_positions"]) == 1
+    asyncio.run(sink.append_snapshot(_snapshot("2", stop_times=False), "20251101_080020", "tram"))
+    assert len([s for s in conn.statements if "PARTITION OF" in s]) == 1
+
+
+def test_failed_copy_rolls_back_the_batch_and_fails_every_snapshot(tmp_path):
+    conn = _Connection(fail_copy="stop_time_updates")
+    manager = DatabaseManager(DatabaseConfig(), data_directory=str(tmp_path))
+    manager.postgres_sink = _sink(conn)
+
+    results = asyncio.run(manager.store_gtfs_rt_batch([
+        {"data": _snapshot("1"), "feed_url": "https://example.invalid/vp", "timestamp": "20251101_080000", "feed_name": "tram"},
+        {"data": _snapshot("2"), "feed_url": "https://example.invalid/vp", "timestamp": "20251101_080020", "feed_name": "tram"},
+    ]))
+
+    assert results == [False, False]
+    assert conn.committed == {}  # vehicle rows copied before the failure were rolled back too
+
+
+def test_append_before_open_raises():
+    with pytest.raises(RuntimeError):
+        asyncio.run(PostgresRTSink(DatabaseConfig()).append_snapshot(_snapshot("1"), "20251101_080000", "tram"))
+
+
+@pytest.mark.skipif(not os.getenv("GTFS_PG_TEST_DSN"), reason="set GTFS_PG_TEST_DSN to run against PostgreSQL")
+def test_round_trip_against_postgres():
+    schema_name = f"gtfs_rt_test_{uuid.uuid4().hex[:8]}"
+
+    async def main():
+        sink = PostgresRTSink(DatabaseConfig(), dsn=os.environ["GTFS_PG_TEST_DSN"], schema_name=schema_name)
+        await sink.open()
+        try:
+            assert await sink.append_snapshot(_snapshot("1", "2"), "20251101_080000", "tram") == 3
+            async with sink.pool.acquire() as conn:
+                count = await conn.fetchval(f"SELECT count(*) FROM {schema_name}.vehicle_positions_20251101")
+                await conn.execute(f"DROP SCHEMA {schema_name} CASCADE")
+            return count
+        finally:
+            await sink.close()
+
+    assert asyncio.run(main()) == 2
@@ -0,0 +1,28 @@
+from gtfs_pipeline.raw_archive import _INDEX_ENTRY, SegmentArchive, read_index, read_record
+
+
+def test_append_after_torn_record_recovery(tmp_path):
+    archive = SegmentArchive(tmp_path)
+    path = archive.append("vehicle_positions", "tram", "20251101_080000", b"first")
+    archive.append("vehicle_positions", "tram", "20251101_080020", b"second")
+    archive.close()
+
+    # Crash mid-write: half a record after the last complete one, missing from the index.
+    with open(path, "ab") as fh:
+        fh.write(b"GRT1" + b"torn")
+
+    archive = SegmentArchive(tmp_path)
+    archive.append("vehicle_positions", "tram", "20251101_080040", b"third")
+    archive.close()
+
+    entries = read_index(path)
+    # The sidecar index itself points at the recovered record, not past the torn bytes.
+    written = [offset for _, offset in _INDEX_ENTRY.iter_unpack(path.with_suffix(".idx").read_bytes())]
+    assert written == [e.offset for e in entries]
+    assert [e.timestamp for e in entries] == ["20251101_080000", "20251101_080020", "20251101_080040"]
+    assert [read_record(path, e.offset) for e in entries] == [b"first", b"second", b"third"]
+    assert list(SegmentArchive(tmp_path).read("vehicle_positions", "tram")) == [
+        ("20251101_080000", b"first"),
+        ("20251101_080020", b"second"),
+        ("20251101_080040", b"third"),
+    ]
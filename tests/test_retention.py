@@ -0,0 +1,93 @@
+import json
+
+from gtfs_pipeline.config import GTFSConfig
+from gtfs_pipeline.retention import RetentionJob
+
+
+def _touch(path, data=b"x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_run_expires_raw_and_date_partitions(tmp_path):
+    config = GTFSConfig(data_directory=str(tmp_path), raw_data_retention_days=7, processed_data_retention_days=30)
+    raw = tmp_path / "raw"
+    old_segment = _touch(raw / "segments" / "vehicle_positions" / "tram" / "20251001.seg")
+    new_segment = _touch(raw / "segments" / "vehicle_positions" / "tram" / "20251130.seg")
+    old_marker = _touch(raw / "markers" / "seen_again_20251001.jsonl")
+    old_bronze = _touch(tmp_path / "bronze" / "vehicle_positions" / "feed=tram" / "date=2025-10-01" / "part-a.parquet")
+    new_bronze = _touch(tmp_path / "bronze" / "vehicle_positions" / "feed=tram" / "date=2025-11-30" / "part-b.parquet")
+    old_silver = _touch(tmp_path / "silver" / "trip_updates" / "feed=tram" / "date=2025-10-01" / "part-c.parquet")
+    static_version = _touch(tmp_path / "silver" / "static" / "tram" / "20251001_050000" / "manifest.json")
+
+    report = RetentionJob(config, today="20251201").run()
+
+    assert not old_segment.exists() and new_segment.exists()
+    assert not old_marker.exists()
+    assert not old_bronze.parent.exists() and new_bronze.exists()
+    assert not old_silver.parent.exists()
+    assert static_version.exists()
+    assert report.deleted_files == 4
+    state = json.loads((tmp_path / "state" / "retention.json").read_text())
+    assert state == {"raw_expired_before": "20251124", "processed_expired_before": "20251101"}
+
+    # Same cutoffs: partition sweeps are skipped.
+    assert RetentionJob(config, today="20251201").run().deleted_files == 0
+
+
+def test_dry_run_keeps_files(tmp_path):
+    config = GTFSConfig(data_directory=str(tmp_path))
+    old_bronze = _touch(tmp_path / "bronze" / "trip_updates" / "feed=tram" / "date=2025-01-01" / "part-a.parquet")
+
+    report = RetentionJob(config, today="20251201", dry_run=True).run()
+
+    assert report.deleted_files == 1
+    assert old_bronze.exists()
+    assert not (tmp_path / "state" / "retention.json").exists()
+
+
+def _bronze_file(tmp_path, day, name, vehicle_ids):
+    from gtfs_pipeline.parquet_sink import ParquetRTSink
+
+    sink = ParquetRTSink(tmp_path / "scratch")
+    sink.append_snapshot(
+        {"vehicle_positions": [{"vehicle_id": v, "timestamp": 1761955200} for v in vehicle_ids]},
+        f"{day.replace('-', '')}_080000",
+        "tram",
+    )
+    sink.close()
+    (written,) = (tmp_path / "scratch").rglob("*.parquet")
+    target = tmp_path / "bronze" / "vehicle_positions" / "feed=tram" / f"date={day}" / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    written.replace(target)
+    return target
+
+
+def test_compacts_closed_bronze_partitions(tmp_path):
+    import pyarrow.parquet as pq
+
+    config = GTFSConfig(data_directory=str(tmp_path))
+    closed = [_bronze_file(tmp_path, "2025-11-30", f"part-{i}.parquet", [str(i), str(i + 10)]) for i in range(3)]
+    tracked = [_bronze_file(tmp_path, "2025-11-29", f"part-{i}.parquet", [str(i)]) for i in range(2)]
+    open_day = [_bronze_file(tmp_path, "2025-12-01", f"part-{i}.parquet", [str(i)]) for i in range(2)]
+    silver_state = {"vehicle_positions": {"tram": {
+        "watermark": "2025-11-28", "files": {"2025-11-29": ["part-0.parquet"]}, "last_seen": {},
+    }}}
+    (tmp_path / "state").mkdir()
+    (tmp_path / "state" / "silver.json").write_text(json.dumps(silver_state))
+
+    report = RetentionJob(config, today="20251201").run()
+
+    merged = list(closed[0].parent.glob("*.parquet"))
+    assert len(merged) == 1 and not any(p.exists() for p in closed)
+    assert pq.read_table(merged[0]).num_rows == 6
+    assert report.compacted_files == 3
+    # Silver still tracks 2025-11-29 by file name, and today is still being written.
+    assert all(p.exists() for p in tracked + open_day)
+
+    # A crash before the inputs were deleted: the rerun drops them instead of merging them twice.
+    leftover = _bronze_file(tmp_path, "2025-11-30", "part-1.parquet", ["1", "11"])
+    RetentionJob(config, today="20251201").run()
+    assert not leftover.exists()
+    assert [p.name for p in closed[0].parent.glob("*.parquet")] == [merged[0].name]
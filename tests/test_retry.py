@@ -0,0 +1,23 @@
+import asyncio
+import time
+
+import pytest
+
+from gtfs_pipeline.retry import RetryBudget, RetryPolicy, retry_async
+
+
+def test_retry_past_the_deadline_keeps_the_budget():
+    budget = RetryBudget(2)
+
+    async def failing(remaining):
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(retry_async(
+            failing,
+            RetryPolicy(max_retries=3, base_delay=5.0, jitter=0.0),
+            (ConnectionError,),
+            deadline=time.monotonic() + 1.0,
+            budget=budget,
+        ))
+    assert budget.remaining == 2
@@ -0,0 +1,53 @@
+import io
+import zipfile
+
+from gtfs_pipeline.service_calendar import CALENDAR_FILE_NAME, load_service_calendar
+from gtfs_pipeline.static_loader import load_gtfs_static
+from gtfs_pipeline.static_store import write_static_version
+
+
+def _version(tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        zip_file.writestr("calendar.txt", (
+            "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date\n"
+            "weekday,1,1,1,1,1,0,0,20251101,20251130\n"
+            "weekend,0,0,0,0,0,1,1,20251101,20251130\n"
+        ))
+        # 2025-11-03 (a Monday) is a public holiday: weekday service off, weekend service on,
+        # plus a service that only exists as calendar_dates exceptions.
+        zip_file.writestr("calendar_dates.txt", (
+            "service_id,date,exception_type\n"
+            "weekday,20251103,2\n"
+            "weekend,20251103,1\n"
+            "festival,20251103,1\n"
+        ))
+    directory = tmp_path / "tram" / "20251101_050000"
+    write_static_version(directory, load_gtfs_static(buffer.getvalue()))
+    return directory
+
+
+def test_calendar_dates_exceptions_override_the_weekday_flags(tmp_path):
+    calendar = load_service_calendar(_version(tmp_path))
+
+    assert str(calendar.first_date) == "2025-11-01" and str(calendar.last_date) == "2025-11-30"
+    assert list(calendar.active_services("20251101")) == ["weekend"]  # Saturday
+    assert sorted(calendar.active_services("20251103")) == ["festival", "weekend"]
+    assert list(calendar.active_services("20251104")) == ["weekday"]
+    assert not calendar.is_active("weekday", "20251103")
+    assert not calendar.is_active("weekday", "20251201")  # outside the window
+    assert calendar.active_mask(
+        ["weekday", "weekday", "festival", "unknown", None],
+        ["20251103", "20251104", "20251104", "20251104", "20251104"],
+    ).tolist() == [False, True, False, False, False]
+
+
+def test_cached_calendar_matches_the_built_one(tmp_path):
+    directory = _version(tmp_path)
+    built = load_service_calendar(directory)
+    assert (directory / CALENDAR_FILE_NAME).exists()
+
+    cached = load_service_calendar(directory)
+    assert list(cached.service_ids) == list(built.service_ids)
+    assert cached.first_date == built.first_date
+    assert (cached.active == built.active).all()
@@ -0,0 +1,70 @@
+import io
+import math
+import zipfile
+
+import pytest
+
+from gtfs_pipeline.shape_index import MISSING, load_shape_index
+from gtfs_pipeline.static_loader import load_gtfs_static
+from gtfs_pipeline.static_store import write_static_version
+
+LAT = 36.70
+METRES_PER_DEGREE_LAT = 6_371_008.8 * math.pi / 180
+
+
+def _version(tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        # "east" runs west to east along LAT; "north" crosses it at lon 137.205 (points out of order on purpose).
+        zip_file.writestr("shapes.txt", (
+            "shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n"
+            f"east,{LAT},137.210,3\n"
+            f"east,{LAT},137.200,1\n"
+            f"east,{LAT},137.205,2\n"
+            f"north,{LAT - 0.005},137.205,1\n"
+            f"north,{LAT + 0.005},137.205,2\n"
+        ))
+        zip_file.writestr("trips.txt", (
+            "route_id,service_id,trip_id,shape_id\n"
+            "r1,weekday,t_east,east\n"
+            "r2,weekday,t_north,north\n"
+            "r3,weekday,t_unshaped,\n"
+        ))
+    directory = tmp_path / "tram" / "20251101_050000"
+    write_static_version(directory, load_gtfs_static(buffer.getvalue()))
+    return directory
+
+
+def test_positions_snap_onto_their_own_trip_shape(tmp_path):
+    index = load_shape_index(_version(tmp_path))
+    x0, _ = index.project([LAT], [137.200])
+    x_mid, _ = index.project([LAT], [137.2075])
+    length = index.shape_length("east")
+    assert length == pytest.approx(float(index.project([LAT], [137.210])[0][0] - x0[0]))
+
+    ten_metres = 10 / METRES_PER_DEGREE_LAT
+    result = index.snap_trips(
+        ["t_east", "t_east", "t_north", "t_unshaped", "unknown", None, "t_east"],
+        [LAT + ten_metres, LAT, LAT, LAT, LAT, LAT, LAT + 0.01],
+        [137.2075, 137.1996, 137.2075, 137.2075, 137.2075, 137.2075, 137.2075],
+    )
+
+    assert result["dist"][0] == pytest.approx(float(x_mid[0] - x0[0]), abs=1e-6)
+    assert result["offset"][0] == pytest.approx(10.0, abs=1e-6)
+    # ~36 m before the first point, within the radius: clamped to the start of the shape.
+    assert result["dist"][1] == pytest.approx(0.0, abs=1e-6)
+    # "north" is ~220 m away: no match although "east" passes right under the position.
+    assert math.isnan(result["dist"][2])
+    # No shape, unknown trip, null trip, and a position ~1.1 km off its shape.
+    assert all(math.isnan(d) for d in result["dist"][3:])
+
+
+def test_cached_index_matches_the_built_one(tmp_path):
+    directory = _version(tmp_path)
+    built = load_shape_index(directory)
+    cached = load_shape_index(directory)
+
+    assert list(cached.shapes_of(["t_east", "t_north", "t_unshaped", "unknown"])) == [0, 1, MISSING, MISSING]
+    assert cached.shape_length("east") == pytest.approx(built.shape_length("east"))
+    point = dict(trip_ids=["t_north"], lat=[LAT + 0.001], lon=[137.2051])
+    assert cached.snap_trips(**point)["dist"][0] == pytest.approx(built.snap_trips(**point)["dist"][0])
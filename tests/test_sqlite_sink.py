@@ -0,0 +1,79 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from gtfs_pipeline.sqlite_sink import SQLiteSink
+
+
+def _snapshot(trip_id, vehicle_id="v1"):
+    return {
+        "timestamp": 1761955200,
+        "trip_updates": [{"trip_id": trip_id, "route_id": "r1", "start_date": "20251101", "delay": 30}],
+        "vehicle_positions": [{"vehicle_id": vehicle_id, "trip_id": trip_id, "latitude": 36.7, "longitude": 137.2}],
+    }
+
+
+def _count(path, table):
+    with sqlite3.connect(str(path)) as reader:
+        return reader.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def test_database_is_in_wal_mode_with_indexes(tmp_path):
+    sink = SQLiteSink(tmp_path / "gtfs.sqlite")
+    assert sink.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = {row[0] for row in sink.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {
+        "trip_updates_route_id_trip_id_timestamp_idx",
+        "stop_time_updates_stop_id_fetched_at_idx",
+        "vehicle_positions_vehicle_id_fetched_at_idx",
+    } <= indexes
+    sink.close()
+
+
+def test_cycle_is_visible_to_readers_only_after_commit(tmp_path):
+    path = tmp_path / "gtfs.sqlite"
+    sink = SQLiteSink(path)
+    assert sink.append_snapshot(_snapshot("t1"), "20251101_080000", "tram") == 2
+    assert _count(path, "vehicle_positions") == 0  # WAL: the reader sees the last commit, without blocking
+    assert sink.commit() == 2
+    assert _count(path, "vehicle_positions") == 1
+
+    row = sink.conn.execute("SELECT feed_name, fetched_at, trip_id, delay FROM trip_updates").fetchone()
+    assert row == ("tram", "2025-11-01 08:00:00", "t1", 30)
+    sink.close()
+
+
+def test_failing_snapshot_is_rolled_back_without_losing_the_cycle(tmp_path):
+    sink = SQLiteSink(tmp_path / "gtfs.sqlite")
+    sink.append_snapshot(_snapshot("t1"), "20251101_080000", "tram")
+    # vehicle_positions is inserted after trip_updates, so the failure hits a half-written snapshot.
+    sink._insert_sql["vehicle_positions"] = "INSERT INTO missing_table VALUES (?)"
+    with pytest.raises(sqlite3.OperationalError):
+        sink.append_snapshot(_snapshot("t2", "v2"), "20251101_080020", "tram")
+
+    assert sink.commit() == 2
+    assert [r[0] for r in sink.conn.execute("SELECT trip_id FROM trip_updates")] == ["t1"]
+    assert _count(tmp_path / "gtfs.sqlite", "vehicle_positions") == 1
+    sink.close()
+
+
+def test_new_static_version_replaces_the_feed_rows(tmp_path):
+    sink = SQLiteSink(tmp_path / "gtfs.sqlite")
+    stops = pd.DataFrame({"stop_id": ["s1", "s2"], "stop_name": ["Dentetsu-Toyama", None], "stop_lat": [36.7, 36.8]})
+    assert sink.replace_static("tram", "20251001_050000", {"stops": stops}) == 2
+    sink.replace_static("bus", "20251001_050000", {"stops": stops.head(1)})
+
+    newer = pd.DataFrame({"stop_id": ["s3"], "stop_name": ["Toyama-Ekimae"], "stop_lat": [36.70], "platform_code": ["1"]})
+    assert sink.replace_static("tram", "20251101_050000", {"stops": newer}) == 1
+
+    rows = sink.conn.execute(
+        "SELECT feed_name, version_id, stop_id, stop_name, platform_code FROM static_stops ORDER BY feed_name"
+    ).fetchall()
+    assert rows == [
+        ("bus", "20251001_050000", "s1", "Dentetsu-Toyama", None),
+        ("tram", "20251101_050000", "s3", "Toyama-Ekimae", "1"),
+    ]
+    indexes = {row[0] for row in sink.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "static_stops_feed_name_stop_id_idx" in indexes
+    sink.close()
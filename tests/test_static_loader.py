@@ -0,0 +1,35 @@
+import io
+import zipfile
+
+import pandas as pd
+
+from gtfs_pipeline.static_loader import load_gtfs_static, parse_gtfs_time
+
+
+def _zip(**tables):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name, text in tables.items():
+            zip_file.writestr(f"{name}.txt", text)
+    return buffer.getvalue()
+
+
+def test_malformed_time_only_nulls_itself():
+    seconds = parse_gtfs_time(pd.Series(["08:00:00", "1:2:3:4", " 25:10:00", None, "8h00", "7:05:09"]))
+    assert seconds.tolist() == [28800, pd.NA, 90600, pd.NA, pd.NA, 25509]
+    assert str(seconds.dtype) == "Int32"
+
+
+def test_columns_outside_the_schema_are_read_as_text():
+    tables = load_gtfs_static(_zip(
+        routes="route_id,agency_id,route_short_name,route_type,route_color\nr1,a,010,0,000080\n",
+        stop_times="trip_id,arrival_time,departure_time,stop_id,stop_sequence,stop_headsign\n"
+                   "t1,08:00:00,1:2:3:4,s1,1,007\n",
+    ))
+
+    route = tables["routes"].iloc[0]
+    assert route["route_short_name"] == "010" and route["route_color"] == "000080"
+    assert route["route_type"] == 0
+    stop_time = tables["stop_times"].iloc[0]
+    assert stop_time["stop_headsign"] == "007"
+    assert stop_time["arrival_time"] == 28800 and pd.isna(stop_time["departure_time"])
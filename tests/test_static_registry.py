@@ -0,0 +1,25 @@
+from gtfs_pipeline.static_registry import StaticFeedRegistry, StaticFeedVersion
+
+
+def _version(version_id, content_hash):
+    return StaticFeedVersion(
+        feed_name="tram",
+        feed_url="https://example.invalid/feed.zip",
+        content_hash=content_hash,
+        version_id=version_id,
+        artifact=f"silver/static/tram/{version_id}",
+    )
+
+
+def test_version_at_picks_version_current_at_timestamp(tmp_path):
+    registry = StaticFeedRegistry(path=tmp_path / "static_registry.json")
+    registry.register(_version("20251001_050000", "a"))
+    registry.register(_version("20251101_050000", "b"))
+
+    assert registry.version_at("tram", "20251015_120000").content_hash == "a"
+    assert registry.version_at("tram", "20251101_050000").content_hash == "b"
+    assert registry.version_at("tram", "20251201_000000").content_hash == "b"
+    # Polls older than every version get the first one.
+    assert registry.version_at("tram", "20250901_000000").content_hash == "a"
+    assert registry.version_at("bus", "20251015_120000") is None
+    assert StaticFeedRegistry.load(registry.path).version_at("tram", "20251015_120000").content_hash == "a"
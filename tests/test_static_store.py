@@ -0,0 +1,49 @@
+import io
+import zipfile
+
+import pandas as pd
+
+from gtfs_pipeline.static_loader import load_gtfs_static
+from gtfs_pipeline.static_store import open_static_version, write_static_version
+
+
+def _tables():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        zip_file.writestr("stop_times.txt", (
+            "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+            "t2,09:00:00,09:00:00,s1,1\n"
+            "t1,08:05:00,08:05:30,s2,2\n"
+            "t1,08:00:00,,s1,1\n"
+        ))
+        zip_file.writestr("trips.txt", "route_id,service_id,trip_id\nr1,weekday,t2\nr1,weekday,t1\n")
+    return load_gtfs_static(buffer.getvalue())
+
+
+def test_version_round_trips_sorted_and_typed(tmp_path):
+    directory = tmp_path / "tram" / "20251101_050000"
+    manifest = write_static_version(directory, _tables(), metadata={"feed_name": "tram"})
+
+    version = open_static_version(manifest)
+    assert version.directory == directory
+    assert sorted(version.tables) == ["stop_times", "trips"]
+    entry = version.manifest["tables"]["stop_times"]
+    assert entry["rows"] == 3 and entry["sort_keys"] == ["trip_id", "stop_sequence"]
+    assert version.manifest["feed_name"] == "tram"
+
+    stop_times = version.to_pandas("stop_times")
+    assert list(zip(stop_times["trip_id"], stop_times["stop_sequence"])) == [("t1", 1), ("t1", 2), ("t2", 1)]
+    assert isinstance(stop_times["trip_id"].dtype, pd.CategoricalDtype)
+    assert str(stop_times["departure_time"].dtype) == "Int32"
+    assert pd.isna(stop_times["departure_time"].iloc[0])
+    assert version.table("trips", columns=["trip_id"]).column_names == ["trip_id"]
+
+
+def test_rewriting_a_version_replaces_it_without_leftovers(tmp_path):
+    directory = tmp_path / "tram" / "20251101_050000"
+    write_static_version(directory, _tables())
+    write_static_version(directory, {"trips": _tables()["trips"]})
+
+    assert open_static_version(directory).tables == ["trips"]
+    assert not (directory / "stop_times.arrow").exists()
+    assert [p.name for p in directory.parent.iterdir()] == ["20251101_050000"]
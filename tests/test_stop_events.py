@@ -0,0 +1,59 @@
+import math
+
+import pandas as pd
+import pyarrow as pa
+
+from gtfs_pipeline.stop_events import extract_stop_events
+
+T0 = 1761984000
+INCOMING, STOPPED, IN_TRANSIT = 0, 1, 2
+
+
+def _positions(rows):
+    vehicle_id, trip_id, sequence, status, offset, delta_kind = zip(*rows)
+    return pa.table({
+        "vehicle_id": list(vehicle_id),
+        "trip_id": list(trip_id),
+        "route_id": ["r1"] * len(rows),
+        "direction_id": [0] * len(rows),
+        "start_date": ["20251101"] * len(rows),
+        "current_stop_sequence": pa.array(sequence, pa.int32()),
+        "current_status": pa.array(status, pa.int8()),
+        "timestamp": pa.array([T0 + o for o in offset], pa.timestamp("s", tz="UTC")),
+        "delta_kind": pa.array(delta_kind, pa.int8()),
+    })
+
+
+def test_events_are_interpolated_between_polls_per_vehicle_trip():
+    events = extract_stop_events(_positions([
+        ("v1", "t1", 1, IN_TRANSIT, 0, None),
+        ("v1", "t1", 1, STOPPED, 20, None),
+        ("v1", "t1", 1, STOPPED, 40, None),
+        ("v1", "t1", 2, IN_TRANSIT, 60, None),
+        ("v1", "t1", 2, STOPPED, 80, None),
+        ("v1", "t1", 3, INCOMING, 100, None),
+        ("v1", "t1", 9, IN_TRANSIT, 120, 2),  # delta tombstone: not an observation
+        ("v2", "t2", 5, STOPPED, 0, None),
+        ("v2", "t2", 6, STOPPED, 30, None),
+    ])).set_index(["vehicle_id", "stop_sequence"])
+
+    assert sorted(events.index) == [("v1", 1), ("v1", 2), ("v1", 3), ("v2", 5), ("v2", 6)]
+
+    first = events.loc[("v1", 1)]
+    assert first["stopped"]
+    assert first["arrival_time"].timestamp() == T0 + 10 and first["arrival_uncertainty"] == 10
+    assert first["departure_time"].timestamp() == T0 + 50 and first["dwell_time"] == 40
+    assert first["next_stop_sequence"] == 2 and first["run_time"] == 20
+
+    second = events.loc[("v1", 2)]
+    assert second["arrival_time"].timestamp() == T0 + 70 and second["dwell_time"] == 20
+    assert math.isnan(second["run_time"])  # the next stop's arrival was never observed
+
+    last = events.loc[("v1", 3)]
+    assert not last["stopped"] and math.isnan(last["dwell_time"])
+    assert pd.isna(last["arrival_time"]) and pd.isna(last["departure_time"])
+
+    # Already stopped at the first observation: the arrival happened before it and is unknown.
+    assert math.isnan(events.loc[("v2", 5)]["arrival_uncertainty"])
+    assert events.loc[("v2", 5)]["departure_time"].timestamp() == T0 + 15
+    assert events.loc[("v2", 6)]["arrival_time"].timestamp() == T0 + 15
@@ -0,0 +1,59 @@
+import pyarrow as pa
+
+from gtfs_pipeline.vehicle_delta import CHANGED, KEYFRAME, REMOVED, VehicleDeltaEncoder, reconstruct_snapshots
+
+FEED = "vehicle_positions:https://example.com/vp"
+
+
+def _poll(*vehicles):
+    return {"vehicle_positions": [
+        {"vehicle_id": vehicle_id, "trip_id": trip_id, "start_date": "20251101", "timestamp": ts}
+        for vehicle_id, trip_id, ts in vehicles
+    ]}
+
+
+def test_state_carries_across_runs_until_a_crash(tmp_path):
+    path = tmp_path / "state" / "vehicle_delta.json"
+    first = VehicleDeltaEncoder.load(path, keyframe_interval=600)
+    assert first.encode(FEED, _poll(("1", "a", 100), ("2", "b", 100)), now=1000)["delta"]["keyframe"]
+    first.save()
+
+    # The next cron run only stores what changed.
+    second = VehicleDeltaEncoder.load(path, keyframe_interval=600)
+    data = second.encode(FEED, _poll(("1", "a", 100), ("2", "b", 160)), now=1060)
+    assert data["delta"] == {"keyframe": False, "changed": 1, "removed": 0, "unchanged": 1}
+    assert [r["vehicle_id"] for r in data["vehicle_positions"]] == ["2"]
+
+    # second never saved (crashed): its state was consumed, so the next run starts with a keyframe.
+    third = VehicleDeltaEncoder.load(path, keyframe_interval=600)
+    assert third.encode(FEED, _poll(("1", "a", 100)), now=1120)["delta"]["keyframe"]
+
+
+def test_vehicles_without_vehicle_id_are_keyed_by_trip():
+    encoder = VehicleDeltaEncoder()
+    encoder.encode(FEED, _poll(("", "a", 100), ("", "b", 100)), now=0)
+    data = encoder.encode(FEED, _poll(("", "a", 160)), now=60)
+    rows = data["vehicle_positions"]
+    assert [(r["trip_id"], r["delta_kind"]) for r in rows] == [("a", CHANGED), ("b", REMOVED)]
+    assert rows[1]["vehicle_id"] is None and rows[1]["start_date"] == "20251101"
+
+
+def test_reconstruct_round_trip_without_vehicle_ids():
+    encoder = VehicleDeltaEncoder()
+    polls = [
+        _poll(("", "a", 100), ("", "b", 100), ("v", "c", 100)),
+        _poll(("", "a", 160), ("v", "c", 100)),
+        _poll(("", "a", 160), ("", "d", 220), ("v", "c", 220)),
+    ]
+    expected = [sorted((r["trip_id"], r["timestamp"]) for r in poll["vehicle_positions"]) for poll in polls]
+    rows = []
+    for minute, poll in enumerate(polls):
+        for record in encoder.encode(FEED, poll, now=minute * 60)["vehicle_positions"]:
+            rows.append(dict(record, fetched_at=minute))
+    table = pa.Table.from_pylist(rows)
+    snapshots = [
+        sorted((r["trip_id"], r["timestamp"]) for r in snapshot.to_pylist())
+        for _, snapshot in reconstruct_snapshots(table)
+    ]
+    assert snapshots == expected
+    assert all(r["delta_kind"] == KEYFRAME for _, s in reconstruct_snapshots(table) for r in s.to_pylist())
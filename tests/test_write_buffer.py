@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from gtfs_pipeline.write_buffer import PendingSnapshot, WriteBehindBuffer
+
+
+class _Storage:
+    def __init__(self):
+        self.stored = []
+
+    async def store_gtfs_rt_batch(self, batch):
+        self.stored.extend(kwargs["timestamp"] for kwargs in batch)
+        return [True] * len(batch)
+
+
+def _snapshot(timestamp, **callbacks):
+    return PendingSnapshot({"feed_url": "u", "timestamp": timestamp, "raw_bytes": b""}, **callbacks)
+
+
+def test_failing_callback_does_not_stop_the_flusher():
+    storage = _Storage()
+
+    def broken():
+        raise ValueError("boom")
+
+    async def main():
+        buffer = WriteBehindBuffer(storage, max_batch=1, max_pending=1)
+        buffer.start()
+        await buffer.put(_snapshot("1", on_stored=broken))
+        await buffer.put(_snapshot("2"))
+        await buffer.put(_snapshot("3"))
+        await buffer.close()
+        return buffer
+
+    buffer = asyncio.run(main())
+    assert storage.stored == ["1", "2", "3"] and buffer.stored == 3
+
+
+def test_put_raises_once_the_flusher_is_gone():
+    async def main():
+        buffer = WriteBehindBuffer(_Storage(), max_batch=1, max_pending=1)
+        buffer.start()
+        buffer._task.cancel()
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            await buffer.put(_snapshot("1"))
+
+    asyncio.run(main())
+
+
+def test_blocked_put_raises_when_the_flusher_dies():
+    class _Stuck(_Storage):
+        async def store_gtfs_rt_batch(self, batch):
+            await asyncio.Event().wait()
+
+    async def main():
+        buffer = WriteBehindBuffer(_Stuck(), max_batch=1, max_pending=1)
+        buffer.start()
+        await buffer.put(_snapshot("1"))
+        await asyncio.sleep(0)  # the flusher takes "1" and hangs in storage
+        await buffer.put(_snapshot("2"))
+        blocked = asyncio.ensure_future(buffer.put(_snapshot("3")))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        buffer._task.cancel()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(blocked, 1)
+
+    asyncio.run(main())
+
+
+def test_dropped_snapshot_is_logged_with_its_row_counts(caplog):
+    class _Failing(_Storage):
+        async def store_gtfs_rt_batch(self, batch):
+            return [False] * len(batch)
+
+    failed = []
+    snapshot = _snapshot("20251101_080000", on_failed=lambda: failed.append(True))
+    snapshot.store_kwargs.update(feed_name="tram", data={
+        "trip_updates": [{"trip_id": "t1"}, {"trip_id": "t2"}],
+        "stop_time_updates": {"trip_id": ["t1", "t1", "t2"], "stop_sequence": [1, 2, 1]},
+    })
+
+    async def main():
+        buffer = WriteBehindBuffer(_Failing(), max_batch=1, max_attempts=2, retry_delay=0)
+        buffer.start()
+        await buffer.put(snapshot)
+        await buffer.close()
+        return buffer
+
+    with caplog.at_level("ERROR", logger="gtfs_pipeline.write_buffer"):
+        buffer = asyncio.run(main())
+
+    assert failed == [True]
+    assert buffer.dropped == 1 and buffer.dropped_rows == 5
+    assert "Dropping tram snapshot 20251101_080000 (2 trip_updates, 3 stop_time_updates rows) after 2 failed flushes" \
+        in caplog.text